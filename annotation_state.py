@@ -0,0 +1,240 @@
+import bisect
+import threading
+import uuid
+
+from annotation_store import AnnotationStore
+
+# Helpers for the per-item annotation state shared by both apps.
+#
+# Every item carries a version number that is bumped on each write. Clients
+# send the version their edit is based on, and a write based on an older
+# version is rejected as a conflict instead of overwriting newer work.
+#
+# Writes are serialized per item, not globally: items are spread over
+# LOCK_STRIPES locks, so annotators working on different items never wait
+# for each other. Annotations live in an AnnotationStore (see
+# annotation_store.py), which also records the status of every item, so the
+# completed/skipped totals are counted over its status array.
+#
+# Every write also appends the item index to a change log. A checkpoint token
+# names a position in that log, so the items changed since a checkpoint are
+# found by reading the end of the log, whatever the size of the dataset.
+# The log keeps at most CHANGE_LOG_LIMIT writes: past that, its older half is
+# dropped, and tokens from before what is left have expired, so the client
+# needs a full export (which gives a fresh token) instead of a delta.
+#
+# Writes also keep a RowIndex up to date: the sorted item indices in each
+# overview filter, so the overview page can read any window of a filter
+# without scanning the dataset.
+
+LOCK_STRIPES = 64
+
+# Most writes kept in the change log. A checkpoint stays usable for at least
+# CHANGE_LOG_LIMIT // 2 writes after it was taken.
+CHANGE_LOG_LIMIT = 200_000
+
+
+OVERVIEW_FILTERS = ('todo', 'completed', 'skipped', 'commented')
+
+
+class RowIndex:
+    # Sorted item indices per overview filter. An item is in exactly one of
+    # 'todo', 'completed' and 'skipped', and in 'commented' if it has a
+    # comment.
+    def __init__(self, n):
+        self.lock = threading.Lock()
+        self.rows = {key: [] for key in OVERVIEW_FILTERS}
+        self.rows['todo'] = list(range(n))
+
+    def update(self, idx, old_keys, new_keys):
+        if old_keys == new_keys:
+            return
+        with self.lock:
+            for key in old_keys - new_keys:
+                rows = self.rows[key]
+                pos = bisect.bisect_left(rows, idx)
+                if pos < len(rows) and rows[pos] == idx:
+                    del rows[pos]
+            for key in new_keys - old_keys:
+                bisect.insort(self.rows[key], idx)
+
+    def window(self, key, start, count):
+        # Returns (number of items in the filter, their indices from start).
+        with self.lock:
+            rows = self.rows[key]
+            return len(rows), rows[start:start + count]
+
+    def totals(self):
+        with self.lock:
+            return {key: len(rows) for key, rows in self.rows.items()}
+
+
+def overview_keys(status, ann):
+    # The overview filters an item with this status and annotation is in.
+    keys = {status or 'todo'}
+    if ann.get('Comments'):
+        keys.add('commented')
+    return keys
+
+
+def reset_items(state, rows, page_config, filename=None, annotation_status=None):
+    # Initializes the session for a freshly loaded dataset. page_config gives
+    # the criteria and flags annotations are made of, and annotation_status
+    # maps an annotation dict to 'completed', 'skipped' or None.
+    state['annotations'] = AnnotationStore(len(rows), page_config)
+    # LLM judge suggestions, see judge.py
+    state['suggestions'] = [None] * len(rows)
+    state['versions'] = [0] * len(rows)
+    state['item_locks'] = [threading.Lock() for _ in range(LOCK_STRIPES)]
+    state['row_index'] = RowIndex(len(rows))
+    state['annotation_status'] = annotation_status or (lambda ann: None)
+    state['navigation_lock'] = threading.Lock()
+    state['current_index'] = 0
+    state['total_rows'] = len(rows)
+    state['filename'] = filename
+    state['dataset_id'] = uuid.uuid4().hex
+    state['queue'] = None
+    state['queue_positions'] = None
+    state['label_copies'] = {}
+    state['duplicate_cluster'] = None
+    state['change_log'] = []
+    # Log position of change_log[0], once older writes have been dropped
+    state['change_log_start'] = 0
+    state['change_lock'] = threading.Lock()
+    state['last_save_checkpoint'] = None
+    # Last, as pages take a non-empty data_rows to mean a session is ready
+    state['data_rows'] = rows
+
+
+def set_queue(state, order):
+    # Restricts and orders navigation to the given item indices. Items left
+    # out are never shown, e.g. near-duplicates that get copied labels.
+    positions = [-1] * state['total_rows']
+    for pos, idx in enumerate(order):
+        positions[idx] = pos
+    with state['navigation_lock']:
+        state['queue'] = list(order)
+        state['queue_positions'] = positions
+        state['current_index'] = order[0] if order else 0
+
+
+def set_label_copies(state, copies):
+    # copies maps an item index to the items that receive a copy of its
+    # annotation whenever it is written.
+    state['label_copies'] = copies
+
+
+def apply_annotation(state, idx, ann, base_version=None):
+    # Stores ann for item idx and returns (status, version). status is 'ok',
+    # 'conflict' when base_version is given and differs from the stored
+    # version, or 'invalid' for an index outside the dataset or a value
+    # that is not one of the criterion's options.
+    store = state['annotations']
+    if not isinstance(idx, int) or not 0 <= idx < len(store):
+        return 'invalid', None
+    try:
+        encoded = store.encode(ann)
+    except ValueError:
+        return 'invalid', None
+    with state['item_locks'][idx % LOCK_STRIPES]:
+        versions = state['versions']
+        if base_version is not None and base_version != versions[idx]:
+            return 'conflict', versions[idx]
+        status_of = state['annotation_status']
+        old_ann = store[idx]
+        old_status, new_status = status_of(old_ann), status_of(ann)
+        state['row_index'].update(idx, overview_keys(old_status, old_ann), overview_keys(new_status, ann))
+        store.write(idx, encoded, new_status)
+        versions[idx] += 1
+        version = versions[idx]
+        with state['change_lock']:
+            log = state['change_log']
+            log.append(idx)
+            if len(log) > CHANGE_LOG_LIMIT:
+                drop = len(log) // 2
+                del log[:drop]
+                state['change_log_start'] += drop
+    # Outside the lock: copies live in other stripes
+    for other in state.get('label_copies', {}).get(idx, ()):
+        apply_annotation(state, other, dict(ann))
+    return 'ok', version
+
+
+def checkpoint_token(state):
+    # Token for the current position of the change log, tied to the dataset.
+    with state['change_lock']:
+        return f"{state['dataset_id']}-{state['change_log_start'] + len(state['change_log'])}"
+
+
+def changes_since(state, token=None):
+    # Returns (sorted indices of the items written after the checkpoint,
+    # token of the new checkpoint). No token means since the start. Raises
+    # ValueError for a malformed token, one from another dataset or one older
+    # than the change log reaches.
+    position = 0
+    if token:
+        dataset_id, _, position = token.rpartition('-')
+        if dataset_id != state['dataset_id'] or not position.isdigit():
+            raise ValueError('This checkpoint belongs to another dataset; make a full export first.')
+        position = int(position)
+    with state['change_lock']:
+        start = state['change_log_start']
+        end = start + len(state['change_log'])
+        if position > end:
+            raise ValueError('Unknown checkpoint.')
+        if position < start:
+            raise ValueError('This checkpoint has expired; make a full export first.')
+        changed = sorted(set(state['change_log'][position - start:]))
+    return changed, f"{state['dataset_id']}-{end}"
+
+
+def status_total(state, status):
+    # Number of items currently in the given status.
+    store = state.get('annotations')
+    return store.count(status) if isinstance(store, AnnotationStore) else 0
+
+
+def navigate(state, direction, from_index=None):
+    # Moves current_index one step and returns the new index. When
+    # from_index is given, the move only happens if the client was looking at
+    # the current item, so a delayed or repeated request cannot skip items.
+    if not state.get('total_rows'):
+        return state.get('current_index', 0)
+    with state['navigation_lock']:
+        idx = state['current_index']
+        if from_index is not None and from_index != idx:
+            return idx
+        queue = state.get('queue')
+        if queue is not None:
+            if not queue:
+                return idx
+            pos = state['queue_positions'][idx]
+            if pos < 0:
+                state['current_index'] = queue[0]
+            elif direction == 'next' and pos < len(queue) - 1:
+                state['current_index'] = queue[pos + 1]
+            elif direction == 'previous' and pos > 0:
+                state['current_index'] = queue[pos - 1]
+        elif direction == 'next' and idx < state['total_rows'] - 1:
+            state['current_index'] = idx + 1
+        elif direction == 'previous' and idx > 0:
+            state['current_index'] = idx - 1
+        return state['current_index']
+
+
+def go_to(state, idx):
+    # Makes idx the current item, e.g. when picked on the overview page.
+    # Returns False for an index outside the dataset.
+    if not isinstance(idx, int) or not 0 <= idx < state.get('total_rows', 0):
+        return False
+    with state['navigation_lock']:
+        state['current_index'] = idx
+    return True
+
+
+def is_first_in_queue(state, idx):
+    # Whether idx is the first item annotators see (no 'Previous' button).
+    queue = state.get('queue')
+    if queue is None:
+        return idx == 0
+    return not queue or queue[0] == idx
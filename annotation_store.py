@@ -0,0 +1,152 @@
+# Integer-coded storage for the annotations of a session.
+#
+# An annotation dict repeats the same keys on every row and holds short
+# strings or booleans, at about a kilobyte per annotated row. The store keeps
+# the same information in fixed-width arrays instead:
+#
+#   codes         one uint8 per criterion and row: 0 for no value, else the
+#                 position of the value in the criterion's options plus one
+#   flag_bits     one bit per flag (e.g. COMMON_ISSUES) in an unsigned int
+#   status        0 for items never submitted, else STATUS_CODES[status]
+#   texts         free text such as Comments, in a dict per field holding
+#                 only the rows where it is not empty
+#
+# which is under 10 bytes per row plus the comments. The criteria and flags
+# come from the app's OFFLINE_PAGE_CONFIG. store[idx] decodes one row to the
+# same dict the app built, so pages keep working with dicts, while exports,
+# progress counts and review statistics work on whole columns at once.
+#
+# Rows are written by annotation_state.apply_annotation under the item's
+# lock; numpy is imported by the methods that need it, not at start-up.
+
+TEXT_FIELDS = ('Comments',)
+STATUS_CODES = {'completed': 1, 'skipped': 2}
+
+
+class AnnotationStore:
+    def __init__(self, n, page_config, text_fields=TEXT_FIELDS):
+        import numpy as np
+        self.choice_keys = [choice['key'] for choice in page_config['choices']]
+        # Decoded values per criterion, '' (no value) first
+        self.choice_values = [[''] + [o['value'] for o in choice['options']] for choice in page_config['choices']]
+        self.choice_codes = [{value: code for code, value in enumerate(values)} for values in self.choice_values]
+        self.flag_keys = [flag['key'] for flag in page_config.get('flags', [])]
+        self.text_keys = list(text_fields)
+        if len(self.flag_keys) > 64:
+            raise ValueError('At most 64 flags can be stored.')
+        flag_dtype = next(dtype for dtype in (np.uint8, np.uint16, np.uint32, np.uint64)
+                          if np.iinfo(dtype).bits >= len(self.flag_keys))
+        self.codes = np.zeros((n, len(self.choice_keys)), dtype=np.uint8)
+        self.flag_bits = np.zeros(n, dtype=flag_dtype)
+        self.status = np.zeros(n, dtype=np.uint8)
+        self.texts = {key: {} for key in self.text_keys}
+        self._positions = {key: pos for pos, key in enumerate(self.choice_keys)}
+        self._bits = {key: bit for bit, key in enumerate(self.flag_keys)}
+
+    def __len__(self):
+        return len(self.status)
+
+    def __getitem__(self, idx):
+        # The annotation of one row as a dict; {} if it was never submitted.
+        if not self.status[idx]:
+            return {}
+        ann = {key: values[code] for key, values, code in zip(self.choice_keys, self.choice_values, self.codes[idx].tolist())}
+        bits = int(self.flag_bits[idx])
+        ann.update({key: bool(bits >> bit & 1) for bit, key in enumerate(self.flag_keys)})
+        ann.update({key: texts.get(idx, '') for key, texts in self.texts.items()})
+        return ann
+
+    def encode(self, ann):
+        # Returns (choice codes, flag bits, texts) for an annotation dict.
+        # Raises ValueError for unknown keys or values outside the options.
+        codes = [0] * len(self.choice_keys)
+        bits = 0
+        texts = {}
+        for key, value in ann.items():
+            if key in self._positions:
+                pos = self._positions[key]
+                code = self.choice_codes[pos].get('' if value is None else value) if isinstance(value, (str, type(None))) else None
+                if code is None:
+                    raise ValueError(f'Invalid value {value!r} for {key}')
+                codes[pos] = code
+            elif key in self._bits:
+                bits |= bool(value) << self._bits[key]
+            elif key in self.texts:
+                texts[key] = value if isinstance(value, str) else ''
+            else:
+                raise ValueError(f'Unknown annotation field {key!r}')
+        return codes, bits, texts
+
+    def write(self, idx, encoded, status):
+        # Writes the encode()d annotation of a row with its status ('completed',
+        # 'skipped', or None for a row that counts as never submitted).
+        codes, bits, texts = encoded
+        self.codes[idx] = codes
+        self.flag_bits[idx] = bits
+        for key, values in self.texts.items():
+            if texts.get(key):
+                values[idx] = texts[key]
+            else:
+                values.pop(idx, None)
+        self.status[idx] = STATUS_CODES.get(status, 0)
+
+    def count(self, status):
+        # Number of rows in the given status.
+        import numpy as np
+        return int(np.count_nonzero(self.status == STATUS_CODES[status]))
+
+    def in_status(self, status):
+        # Boolean array, True for the rows in the given status.
+        return self.status == STATUS_CODES[status]
+
+    def submitted(self):
+        # Boolean array, True for the rows with an annotation.
+        return self.status != 0
+
+    def flag(self, key):
+        # Boolean array with one flag of every row.
+        return ((self.flag_bits >> self._bits[key]) & 1).astype(bool)
+
+    def value_counts(self, key):
+        # {value: number of rows with it} for one criterion.
+        import numpy as np
+        pos = self._positions[key]
+        counts = np.bincount(self.codes[:, pos], minlength=len(self.choice_values[pos]))
+        return dict(zip(self.choice_values[pos][1:], counts[1:].tolist()))
+
+    def copy(self):
+        # A snapshot that later writes do not change, e.g. for an export.
+        import copy
+        snapshot = copy.copy(self)
+        snapshot.codes, snapshot.flag_bits, snapshot.status = self.codes.copy(), self.flag_bits.copy(), self.status.copy()
+        snapshot.texts = {key: dict(values) for key, values in self.texts.items()}
+        return snapshot
+
+    def columns(self, keys, indices=None):
+        # Decodes whole columns: {key: values for every row, or for the rows
+        # in indices}. Rows never submitted get '' (an empty CSV field, as a
+        # missing dict key gave), and so do keys outside the store.
+        import numpy as np
+        rows = slice(None) if indices is None else np.asarray(indices, dtype=np.int64)
+        submitted = self.status[rows] != 0
+        n = len(submitted)
+        columns = {}
+        for key in keys:
+            if key in self._positions:
+                pos = self._positions[key]
+                columns[key] = np.array(self.choice_values[pos], dtype=object)[self.codes[rows, pos]]
+            elif key in self._bits:
+                bits = (self.flag_bits[rows] >> self._bits[key]) & 1
+                columns[key] = np.array(['', False, True], dtype=object)[np.where(submitted, 1 + bits.astype(np.int64), 0)]
+            elif key in self.texts:
+                texts = self.texts[key]
+                if indices is None:
+                    values = np.full(n, '', dtype=object)
+                    if texts:
+                        values[np.fromiter(texts, dtype=np.int64, count=len(texts))] = list(texts.values())
+                else:
+                    values = np.array([texts.get(idx, '') for idx in rows.tolist()], dtype=object)
+                columns[key] = values
+            else:
+                columns[key] = np.full(n, '', dtype=object)
+        return columns
@@ -0,0 +1,116 @@
+import difflib
+import html
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Word-level differences between the two answers of a pairwise item, so that
+# annotators can see at a glance where two long, mostly identical answers
+# differ.
+#
+# Answers are first compared sentence by sentence, and only sentences that
+# were replaced are compared word by word; long answers that share most of
+# their text therefore cost little. Diffs are computed in a process pool
+# right after upload and kept per row, so /annotate only looks them up. A row
+# that is not ready yet is diffed on demand through /api/diff, also in the
+# pool, never on the event loop.
+
+DIFF_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+DIFF_BATCH_ROWS = 200
+MAX_PENDING_BATCHES = 2 * DIFF_WORKERS
+
+_SENTENCE = re.compile(r'[^.!?\n]+[.!?]*\s*|\n+|[.!?]+\s*')
+_WORD = re.compile(r'\S+\s*|\s+')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # The pool is started on first use. 'spawn' keeps worker processes
+    # independent of the server's threads.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=DIFF_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _segments(tokens_a, tokens_b, split=None):
+    # Diffs two token lists and returns the (text, changed) segments of each
+    # side. With split, replaced runs are diffed again at that finer level.
+    out_a, out_b = [], []
+    matcher = difflib.SequenceMatcher(None, [t.strip() for t in tokens_a], [t.strip() for t in tokens_b], autojunk=False)
+    for op, a0, a1, b0, b1 in matcher.get_opcodes():
+        text_a, text_b = ''.join(tokens_a[a0:a1]), ''.join(tokens_b[b0:b1])
+        if op == 'equal':
+            out_a.append((text_a, False))
+            out_b.append((text_b, False))
+        elif op == 'replace' and split is not None:
+            sub_a, sub_b = _segments(split(text_a), split(text_b))
+            out_a.extend(sub_a)
+            out_b.extend(sub_b)
+        else:
+            if text_a:
+                out_a.append((text_a, True))
+            if text_b:
+                out_b.append((text_b, True))
+    return out_a, out_b
+
+
+def diff_answers(answer_a, answer_b):
+    # Returns the (text, changed) segments of both answers.
+    answer_a = answer_a if isinstance(answer_a, str) else ''
+    answer_b = answer_b if isinstance(answer_b, str) else ''
+    return _segments(_SENTENCE.findall(answer_a), _SENTENCE.findall(answer_b), split=_WORD.findall)
+
+
+def render_segments(segments):
+    # Escaped text with changed segments highlighted, for a whitespace-pre-wrap block.
+    parts = []
+    for text, changed in segments:
+        text = html.escape(text)
+        parts.append(f"<mark class='bg-yellow-200 rounded'>{text}</mark>" if changed and text.strip() else text)
+    return ''.join(parts)
+
+
+def render_diff(answer_a, answer_b):
+    # Returns the highlighted HTML of both answers.
+    segments_a, segments_b = diff_answers(answer_a, answer_b)
+    return render_segments(segments_a), render_segments(segments_b)
+
+
+def diff_batch(items):
+    # Worker function: [(idx, answer_a, answer_b)] -> [(idx, (html_a, html_b))].
+    return [(idx, render_diff(a, b)) for idx, a, b in items]
+
+
+def precompute_diffs(rows, store, column_a='ModelAnswer1', column_b='ModelAnswer2'):
+    # Diffs every row in the background and fills store (a dict of row index
+    # to (html_a, html_b)). A feeder thread keeps a bounded number of batches
+    # in flight, so the answers are never all copied into the pool's queue.
+    def feed():
+        slots = threading.Semaphore(MAX_PENDING_BATCHES)
+        pool = get_pool()
+
+        def done(future):
+            slots.release()
+            if not future.exception():
+                store.update(future.result())
+
+        batch = []
+        for idx, row in enumerate(rows):
+            if idx in store:
+                continue
+            batch.append((idx, row.get(column_a), row.get(column_b)))
+            if len(batch) == DIFF_BATCH_ROWS:
+                slots.acquire()
+                pool.submit(diff_batch, batch).add_done_callback(done)
+                batch = []
+        if batch:
+            slots.acquire()
+            pool.submit(diff_batch, batch).add_done_callback(done)
+
+    threading.Thread(target=feed, name='diff-feeder', daemon=True).start()
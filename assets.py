@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import zlib
+from functools import lru_cache
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses fall back to gzip
+    brotli = None
+
+# Static asset serving and response compression shared by both apps.
+#
+# Assets under static/ are linked with a content hash in the URL
+# (/static/app.css?v=1a2b3c4d), so browsers may cache them for a year and a
+# new deploy is still picked up immediately. HTML, JSON, CSS, JS and CSV
+# responses are compressed with brotli when the client and server support
+# it, otherwise with gzip.
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+# Sent uncompressed: the compressors hold data back until they have enough,
+# and each Server-Sent Event must reach the browser as soon as it is written
+UNCOMPRESSED_TYPES = ('text/event-stream',)
+MINIMUM_COMPRESS_SIZE = 500
+
+
+@lru_cache(maxsize=None)
+def asset_url(name):
+    # Returns the cache-busting URL for a file in static/.
+    with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f'/static/{name}?v={digest}'
+
+
+class CachedStaticFiles(StaticFiles):
+    # StaticFiles that marks versioned requests as immutable.
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if b'v=' in scope.get('query_string', b''):
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+class _GzipStream:
+    def __init__(self):
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=5)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+def choose_encoding(accept_encoding):
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+class CompressionMiddleware:
+    # ASGI middleware compressing text responses with brotli or gzip.
+    # Single-message responses below MINIMUM_COMPRESS_SIZE are sent as-is;
+    # streamed responses are compressed incrementally as chunks arrive.
+    def __init__(self, app, minimum_size=MINIMUM_COMPRESS_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if encoding is None or scope.get('method') == 'HEAD':
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        stream = None
+
+        async def send_compressed(message):
+            nonlocal start_message, stream
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message['headers'])
+                content_type = headers.get('content-type', '')
+                compressible = (
+                    message['status'] not in (204, 206, 304)
+                    and 'content-encoding' not in headers
+                    and content_type.startswith(COMPRESSIBLE_TYPES)
+                    and not content_type.startswith(UNCOMPRESSED_TYPES)
+                )
+                if not compressible:
+                    start_message = False
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message['type'] != 'http.response.body' or start_message is False:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if stream is None:
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start_message)
+                    await send(message)
+                    start_message = False
+                    return
+                stream = _BrotliStream() if encoding == 'br' else _GzipStream()
+                headers = MutableHeaders(raw=start_message['headers'])
+                del headers['content-length']
+                headers['content-encoding'] = encoding
+                headers.add_vary_header('Accept-Encoding')
+                await send(start_message)
+
+            chunk = stream.compress(body)
+            if not more_body:
+                chunk += stream.flush()
+            if chunk or not more_body:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def setup_assets(app):
+    # Mounts /static and enables response compression on a FastAPI app.
+    app.mount('/static', CachedStaticFiles(directory=STATIC_DIR), name='static')
+    app.add_middleware(CompressionMiddleware)
+
+
+def json_script(value):
+    # Serializes value for embedding in a <script type='application/json'> tag.
+    return json.dumps(value).replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import itertools
+import math
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Builds pairwise datasets for main_pairs.py from single-answer files, one file
+# per model or prompt variant, joined on UniqueUserReference + QueryID
+# (or any --key columns).
+#
+#   python build_pairs.py usa_p1=answers/usa_p1.csv usa_p2=answers/usa_p2.csv -o pairs.csv
+#   python build_pairs.py a.csv b.csv c.csv --pair a:c --key QueryID --seed 7
+#
+# Which variant ends up as LLM 1 is decided per row by a seeded hash of the
+# row key and the pair, so the left/right order is random with respect to
+# the model (controls position bias) but identical on every rerun. The
+# Variant1/Variant2 columns record the mapping for each row.
+#
+# Inputs are first hash-partitioned on the key into temporary files, then
+# each partition is joined with vectorized pandas merges and appended to the
+# output. Memory is bounded by the partition size, not the input size.
+
+PARTITION_BYTES = 64 * 2 ** 20
+
+
+def parse_source(value):
+    # Accepts NAME=PATH or PATH (the variant name is then the file stem).
+    name, sep, path = value.partition('=')
+    if not sep:
+        path = value
+        name = os.path.splitext(os.path.basename(value))[0]
+    return name, path
+
+
+def parse_pair(value):
+    left, sep, right = value.partition(':')
+    if not sep or not left or not right:
+        raise argparse.ArgumentTypeError(f'Expected VARIANT1:VARIANT2, got {value!r}')
+    return left, right
+
+
+def key_hashes(df, key_cols):
+    return pd.util.hash_pandas_object(df[key_cols], index=False).to_numpy()
+
+
+def side_swaps(hashes, seed, pair):
+    # Returns a boolean array, True where the pair's second variant should be
+    # shown as LLM 1. Mixes the key hashes with a salt derived from the seed
+    # and the pair, then takes the top bit of a splitmix64 finalizer.
+    salt = int.from_bytes(hashlib.sha256(f'{seed}:{pair[0]}:{pair[1]}'.encode('utf-8')).digest()[:8], 'little')
+    x = hashes ^ np.uint64(salt)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(63)).astype(bool)
+
+
+def partition_sources(sources, key_cols, answer_col, question_col, work_dir, n_partitions, chunksize):
+    # Splits every source into n_partitions CSV files by key hash so that
+    # matching keys of all variants land in the same partition number.
+    row_counts = {}
+    for name, path in sources.items():
+        header = pd.read_csv(path, nrows=0).columns
+        missing = [c for c in key_cols + [answer_col] if c not in header]
+        if missing:
+            raise ValueError(f'{path} is missing required columns: {", ".join(missing)}')
+        usecols = key_cols + [answer_col] + ([question_col] if question_col in header else [])
+        started = set()
+        row_counts[name] = 0
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=str, keep_default_na=False, chunksize=chunksize):
+            row_counts[name] += len(chunk)
+            parts = key_hashes(chunk, key_cols) % np.uint64(n_partitions)
+            for part, group in chunk.groupby(parts):
+                group.to_csv(os.path.join(work_dir, f'{name}.{part}.csv'), mode='a', header=part not in started, index=False)
+                started.add(part)
+    return row_counts
+
+
+def read_partition(work_dir, name, part, key_cols):
+    path = os.path.join(work_dir, f'{name}.{part}.csv')
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return df.drop_duplicates(subset=key_cols, keep='first')
+
+
+def join_pair(left, right, pair, key_cols, answer_col, question_col, seed):
+    # Vectorized join of one partition of two variants into pairwise rows.
+    merged = left.merge(right, on=key_cols, how='inner', suffixes=('_a', '_b'))
+    swap = side_swaps(key_hashes(merged, key_cols), seed, pair)
+    out = merged[key_cols].copy()
+    if f'{question_col}_a' in merged:
+        out['UserQuestion'] = merged[f'{question_col}_a'].where(merged[f'{question_col}_a'] != '', merged.get(f'{question_col}_b', ''))
+    elif question_col in merged:
+        out['UserQuestion'] = merged[question_col]
+    else:
+        out['UserQuestion'] = ''
+    out['Variant1'] = np.where(swap, pair[1], pair[0])
+    out['Variant2'] = np.where(swap, pair[0], pair[1])
+    out['ModelAnswer1'] = np.where(swap, merged[f'{answer_col}_b'], merged[f'{answer_col}_a'])
+    out['ModelAnswer2'] = np.where(swap, merged[f'{answer_col}_a'], merged[f'{answer_col}_b'])
+    return out
+
+
+def build_pairs(sources, out_path, pairs=None, key_cols=('UniqueUserReference', 'QueryID'), seed=0,
+                answer_col='ModelAnswer', question_col='UserQuestion', n_partitions=None, chunksize=100_000):
+    # Writes the pairwise dataset for the given {variant: path} sources to
+    # out_path and returns a summary of row counts per pair.
+    key_cols = list(key_cols)
+    pairs = pairs or list(itertools.combinations(sources, 2))
+    unknown = sorted({v for pair in pairs for v in pair} - set(sources))
+    if unknown:
+        raise ValueError(f'Unknown variants in pairs: {", ".join(unknown)}. Known: {", ".join(sources)}')
+    if n_partitions is None:
+        total_bytes = sum(os.path.getsize(path) for path in sources.values())
+        n_partitions = max(1, math.ceil(total_bytes / PARTITION_BYTES))
+
+    summary = {'seed': seed, 'pairs': {}}
+    with tempfile.TemporaryDirectory(prefix='build_pairs_') as work_dir:
+        summary['rows'] = partition_sources(sources, key_cols, answer_col, question_col, work_dir, n_partitions, chunksize)
+        header = True
+        with open(out_path, 'w', newline='', encoding='utf-8') as out:
+            for pair in pairs:
+                counts = {'rows': 0, 'swapped': 0}
+                for part in range(n_partitions):
+                    left = read_partition(work_dir, pair[0], part, key_cols)
+                    right = read_partition(work_dir, pair[1], part, key_cols)
+                    if left is None or right is None:
+                        continue
+                    rows = join_pair(left, right, pair, key_cols, answer_col, question_col, seed)
+                    rows.to_csv(out, header=header, index=False)
+                    header = False
+                    counts['rows'] += len(rows)
+                    counts['swapped'] += int((rows['Variant1'] == pair[1]).sum())
+                summary['pairs'][f'{pair[0]}:{pair[1]}'] = counts
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build pairwise annotation CSVs from single-answer files.')
+    parser.add_argument('sources', nargs='+', type=parse_source, help='NAME=PATH or PATH of a single-answer CSV')
+    parser.add_argument('-o', '--out', required=True, help='Output pairwise CSV')
+    parser.add_argument('--pair', dest='pairs', action='append', type=parse_pair,
+                        help='VARIANT1:VARIANT2 pair to build (repeatable, default: all pairs)')
+    parser.add_argument('--key', nargs='+', default=['UniqueUserReference', 'QueryID'],
+                        help='Column(s) identifying the same question across files')
+    parser.add_argument('--answer-col', default='ModelAnswer')
+    parser.add_argument('--question-col', default='UserQuestion')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the left/right side assignment')
+    parser.add_argument('--partitions', type=int, default=None, help='Number of hash partitions (default: from input size)')
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    sources = dict(args.sources)
+    if len(sources) != len(args.sources):
+        raise SystemExit('Variant names must be unique; use NAME=PATH to disambiguate.')
+    try:
+        summary = build_pairs(sources, args.out, pairs=args.pairs, key_cols=args.key, seed=args.seed,
+                              answer_col=args.answer_col, question_col=args.question_col,
+                              n_partitions=args.partitions, chunksize=args.chunksize)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    for pair, counts in summary['pairs'].items():
+        print(f'{pair}: {counts["rows"]} rows ({counts["swapped"]} with sides swapped)')
+    print(f'Wrote {args.out} (seed {args.seed}).')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
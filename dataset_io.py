@@ -0,0 +1,144 @@
+import csv
+import io
+import itertools
+import os
+
+# Reading (CSV, or Parquet when pyarrow is installed) and CSV writing for
+# uploads and exports. Both run in background jobs and report progress (rows
+# and bytes) while they work.
+#
+# CSV files are read and written with the standard csv module, so the apps
+# never import pandas. Every value is read as text and empty fields are read
+# as '', which is also how missing Parquet values are returned. Column names
+# follow the pandas conventions the exports always had: blank headers become
+# 'Unnamed: <position>' and repeated ones get a '.1', '.2', ... suffix.
+
+PARSE_CHUNK_ROWS = 50_000
+EXPORT_CHUNK_ROWS = 20_000
+MAX_FIELD_CHARS = 2 ** 24
+
+csv.field_size_limit(max(csv.field_size_limit(), MAX_FIELD_CHARS))
+
+
+class DatasetError(Exception):
+    # Raised for problems with an uploaded file; the message is shown to the user.
+    pass
+
+
+def header_columns(header):
+    # Unique column names for a CSV header row.
+    columns = []
+    seen = {}
+    for i, name in enumerate(header):
+        name = name.strip() or f'Unnamed: {i}'
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        seen.setdefault(name, 0)
+        columns.append(name)
+    return columns
+
+
+def iter_csv_chunks(path, progress=None, chunk_rows=PARSE_CHUNK_ROWS):
+    # Yields (columns, rows as dicts) chunks of a CSV file. progress, if
+    # given, is a dict updated with 'rows', 'bytes' and 'total_bytes' as
+    # parsing goes.
+    progress = progress if progress is not None else {}
+    progress.update(rows=0, bytes=0, total_bytes=os.path.getsize(path))
+    with open(path, 'rb') as raw:
+        reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+        try:
+            columns = header_columns(next(reader))
+            n_columns = len(columns)
+            rows = []
+            for record in reader:
+                if not record:
+                    continue
+                if len(record) != n_columns:
+                    if len(record) > n_columns:
+                        raise DatasetError(f'Invalid CSV file: line {reader.line_num} has {len(record)} fields, expected {n_columns}.')
+                    record += [''] * (n_columns - len(record))
+                rows.append(dict(zip(columns, record)))
+                if len(rows) == chunk_rows:
+                    progress['rows'] += len(rows)
+                    progress['bytes'] = raw.tell()
+                    yield columns, rows
+                    rows = []
+        except StopIteration:
+            raise DatasetError('CSV file is empty. Please upload a file with data.')
+        except (csv.Error, UnicodeDecodeError):
+            raise DatasetError('Invalid CSV file. Please check the file format.')
+    progress['rows'] += len(rows)
+    progress['bytes'] = progress['total_bytes']
+    yield columns, rows
+
+
+def iter_parquet_chunks(path, progress=None, chunk_rows=PARSE_CHUNK_ROWS):
+    # Yields the (columns, rows as dicts) chunks of a Parquet file; bytes
+    # are estimated from the share of rows read.
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise DatasetError('Reading Parquet files requires pyarrow (pip install pyarrow).')
+    progress = progress if progress is not None else {}
+    total_bytes = os.path.getsize(path)
+    progress.update(rows=0, bytes=0, total_bytes=total_bytes)
+    try:
+        parquet = pq.ParquetFile(path)
+    except Exception:
+        raise DatasetError('Invalid Parquet file. Please check the file format.')
+    columns = parquet.schema_arrow.names
+    total_rows = max(parquet.metadata.num_rows, 1)
+    for batch in parquet.iter_batches(batch_size=chunk_rows):
+        rows = [{k: '' if v is None else v for k, v in row.items()} for row in batch.to_pylist()]
+        progress['rows'] += len(rows)
+        progress['bytes'] = total_bytes * progress['rows'] // total_rows
+        yield columns, rows
+    progress['bytes'] = total_bytes
+
+
+def iter_chunks(path, progress=None, chunk_rows=PARSE_CHUNK_ROWS):
+    # Yields (columns, rows) chunks of a CSV or Parquet file, by file extension.
+    if path.lower().endswith('.parquet'):
+        return iter_parquet_chunks(path, progress, chunk_rows)
+    return iter_csv_chunks(path, progress, chunk_rows)
+
+
+def read_records(path, progress=None, chunk_rows=PARSE_CHUNK_ROWS):
+    # Parses a file in chunks and returns (columns, rows as dicts).
+    rows = []
+    columns = []
+    for columns, chunk in iter_chunks(path, progress, chunk_rows):
+        rows.extend(chunk)
+    return columns, rows
+
+
+def write_records(path, columns, rows):
+    # Writes rows as dicts to a CSV file, e.g. a sample of a larger file.
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows([row.get(col) for col in columns] for row in rows)
+
+
+def write_csv_export(path, rows, data_columns, columns, progress=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Writes data rows chunk by chunk, followed by the columns given as
+    # {name: per-row values}, e.g. decoded annotations and review columns.
+    # progress, if given, is updated with 'rows', 'total_rows' and 'bytes'.
+    progress = progress if progress is not None else {}
+    progress.update(rows=0, total_rows=len(rows), bytes=0)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(list(data_columns) + list(columns))
+        for start in range(0, len(rows), chunk_rows):
+            end = min(len(rows), start + chunk_rows)
+            chunk = [values[start:end] for values in columns.values()]
+            chunk = [values.tolist() if hasattr(values, 'tolist') else values for values in chunk]
+            writer.writerows(
+                [row.get(col) for col in data_columns] + list(values)
+                for row, values in zip(rows[start:end], zip(*chunk) if chunk else itertools.repeat(()))
+            )
+            progress['rows'] = end
+            progress['bytes'] = f.tell()
+    progress['bytes'] = os.path.getsize(path)
+    return progress['bytes']
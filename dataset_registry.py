@@ -0,0 +1,325 @@
+import glob
+import hashlib
+import html
+import json
+import os
+import tempfile
+import zipfile
+
+from dataset_io import DatasetError, read_records
+
+# Server-side datasets, opened without an upload.
+#
+# Every CSV or Parquet file in DATA_DIR is parsed once into a binary columnar cache file
+# in CACHE_DIR: numeric columns are stored as raw arrays, text columns as one
+# UTF-8 blob with an offsets array and a missing-value mask. Opening a cached
+# dataset memory-maps that file and builds array views over it, so it takes
+# milliseconds whatever the size, and all workers share the same pages from
+# the OS page cache. Rows are decoded only when they are accessed.
+#
+# A cache file is used while the source has the size and mtime recorded when
+# it was built. If the mtime changed, the source is hashed and the cache is
+# kept when the content is identical (e.g. after a checkout or a copy).
+#
+# Columns the apps derive from all rows (near-duplicate clusters, suggested
+# issue flags) are stored next to the cache file by cached_arrays, so they
+# are computed once per cache file rather than on every open.
+#
+# numpy is only imported to build or map a cache, so listing the datasets on
+# the upload page keeps the apps' start-up light.
+
+DATA_DIR = os.environ.get('ANNOTATION_DATA_DIR', 'data')
+CACHE_DIR = os.environ.get('ANNOTATION_CACHE_DIR', os.path.join('.cache', 'datasets'))
+
+CACHE_FORMAT = 2
+MAGIC = b'ANNCOLS1'
+ALIGN = 8
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StringColumn:
+    def __init__(self, missing, offsets, blob):
+        self.missing = missing
+        self.offsets = offsets
+        self.blob = blob
+
+    def __getitem__(self, i):
+        if self.missing[i]:
+            return ''
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+
+class NumericColumn:
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, i):
+        value = self.values[i].item()
+        return '' if value != value else value
+
+
+class MappedRows:
+    # Read-only sequence of row dicts decoded on access from a memory-mapped
+    # cache file. Supports len(), indexing, slicing and iteration, which is
+    # all the apps need from session_state['data_rows'].
+    def __init__(self, n_rows, columns, cache_path=None):
+        self.n_rows = n_rows
+        self.columns = columns
+        # The cache file the rows are mapped from
+        self.cache_path = cache_path
+
+    def __len__(self):
+        return self.n_rows
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.row(i) for i in range(*idx.indices(self.n_rows))]
+        if idx < 0:
+            idx += self.n_rows
+        if not 0 <= idx < self.n_rows:
+            raise IndexError('row index out of range')
+        return self.row(idx)
+
+    def __iter__(self):
+        for i in range(self.n_rows):
+            yield self.row(i)
+
+    def row(self, i):
+        return {name: column[i] for name, column in self.columns}
+
+
+def write_cache(columns, rows, path):
+    # Writes rows as a columnar cache file at path and returns the column
+    # layout (name, kind, dtype and byte offsets) to store in the metadata.
+    # Columns of only ints or floats (from Parquet) are stored as numbers,
+    # all others as text.
+    import numpy as np
+    layout = []
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+
+        def write_array(arr):
+            pad = -f.tell() % ALIGN
+            f.write(b'\0' * pad)
+            offset = f.tell()
+            f.write(np.ascontiguousarray(arr).tobytes())
+            return {'offset': offset, 'dtype': arr.dtype.str, 'count': len(arr)}
+
+        for name in columns:
+            values = [row.get(name) for row in rows]
+            present = [v for v in values if v != '' and v is not None]
+            if present and all(type(v) in (int, float) for v in present):
+                # Missing numbers are stored as NaN and read back as ''
+                if len(present) < len(values):
+                    values = [float('nan') if v == '' or v is None else v for v in values]
+                layout.append({'name': name, 'kind': 'numeric', 'values': write_array(np.array(values))})
+                continue
+            missing = np.array([v is None or v == '' for v in values], dtype=bool)
+            encoded = [(v if isinstance(v, str) else '' if v is None else str(v)).encode('utf-8') for v in values]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            layout.append({
+                'name': name,
+                'kind': 'string',
+                'missing': write_array(missing.astype(np.uint8)),
+                'offsets': write_array(offsets),
+                'blob': write_array(np.frombuffer(b''.join(encoded), dtype=np.uint8)),
+            })
+    return layout
+
+
+def map_cache(path, meta):
+    # Memory-maps a cache file and returns (columns, MappedRows) without
+    # copying any data.
+    import numpy as np
+    mm = np.memmap(path, dtype=np.uint8, mode='r')
+    if bytes(mm[:len(MAGIC)]) != MAGIC:
+        raise DatasetError('Dataset cache file is corrupted.')
+
+    def view(spec):
+        return np.frombuffer(mm, dtype=np.dtype(spec['dtype']), count=spec['count'], offset=spec['offset'])
+
+    columns = []
+    for spec in meta['columns']:
+        if spec['kind'] == 'numeric':
+            column = NumericColumn(view(spec['values']))
+        else:
+            column = StringColumn(view(spec['missing']), view(spec['offsets']), view(spec['blob']))
+        columns.append((spec['name'], column))
+    return [name for name, _ in columns], MappedRows(meta['n_rows'], columns, cache_path=path)
+
+
+def cached_arrays(rows, kind, settings, compute):
+    # Returns compute(), a dict of numpy arrays derived from rows. For the
+    # MappedRows of a server-side dataset the arrays are saved next to its
+    # cache file, keyed by kind and settings (a JSON-serializable value that
+    # must change whenever the result would), and loaded on later opens.
+    # Other rows, e.g. from an upload, are computed every time.
+    cache_path = getattr(rows, 'cache_path', None)
+    if cache_path is None:
+        return compute()
+    import numpy as np
+    digest = hashlib.sha256(json.dumps(settings).encode('utf-8')).hexdigest()[:16]
+    path = f'{cache_path}.{kind}.{digest}.npz'
+    try:
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+    except (OSError, ValueError, zipfile.BadZipFile):
+        pass
+    arrays = compute()
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npz.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+    return arrays
+
+
+class DatasetRegistry:
+    def __init__(self, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir
+
+    def names(self):
+        paths = glob.glob(os.path.join(self.data_dir, '*.csv')) + glob.glob(os.path.join(self.data_dir, '*.parquet'))
+        return sorted(os.path.basename(path) for path in paths)
+
+    def list(self):
+        # Available datasets with their size and whether their cache is fresh.
+        datasets = []
+        for name in self.names():
+            source = os.path.join(self.data_dir, name)
+            meta = self.read_meta(name)
+            st = os.stat(source)
+            datasets.append({
+                'name': name,
+                'size': st.st_size,
+                'rows': meta['n_rows'] if meta else None,
+                'cached': bool(meta) and meta['mtime_ns'] == st.st_mtime_ns and meta['size'] == st.st_size,
+            })
+        return datasets
+
+    def meta_path(self, name):
+        return os.path.join(self.cache_dir, f'{name}.json')
+
+    def read_meta(self, name):
+        try:
+            with open(self.meta_path(name), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('format') != CACHE_FORMAT or not os.path.exists(os.path.join(self.cache_dir, meta['cache_file'])):
+            return None
+        return meta
+
+    def write_meta(self, name, meta):
+        # Written atomically: other workers may be reading it.
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.json.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path(name))
+
+    def fresh_meta(self, name):
+        # Returns the cache metadata if the cache matches the source, else None.
+        meta = self.read_meta(name)
+        if meta is None:
+            return None
+        st = os.stat(os.path.join(self.data_dir, name))
+        if meta['mtime_ns'] == st.st_mtime_ns and meta['size'] == st.st_size:
+            return meta
+        if meta['size'] != st.st_size or meta['sha256'] != file_sha256(os.path.join(self.data_dir, name)):
+            return None
+        # Same content with a new mtime: keep the cache
+        meta['mtime_ns'] = st.st_mtime_ns
+        self.write_meta(name, meta)
+        return meta
+
+    def build(self, name, progress=None):
+        # Parses the source file and writes a new cache file for it.
+        source = os.path.join(self.data_dir, name)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        st = os.stat(source)
+        sha256 = file_sha256(source)
+        columns, rows = read_records(source, progress=progress)
+        cache_file = f'{name}.{sha256[:16]}.bin'
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.bin.tmp')
+        os.close(fd)
+        try:
+            layout = write_cache(columns, rows, tmp)
+        except Exception:
+            os.remove(tmp)
+            raise
+        os.replace(tmp, os.path.join(self.cache_dir, cache_file))
+        old = self.read_meta(name)
+        meta = {
+            'format': CACHE_FORMAT,
+            'source': name,
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+            'sha256': sha256,
+            'n_rows': len(rows),
+            'cache_file': cache_file,
+            'columns': layout,
+        }
+        self.write_meta(name, meta)
+        if old and old['cache_file'] != cache_file:
+            # Workers that still map the old file keep their pages until they close it
+            old_path = os.path.join(self.cache_dir, old['cache_file'])
+            for path in [old_path] + glob.glob(glob.escape(old_path) + '.*.npz'):
+                os.remove(path)
+        return meta
+
+    def open(self, name, progress=None):
+        # Returns (columns, rows) for a dataset, building its cache first if
+        # it is missing or stale.
+        if name not in self.names():
+            raise DatasetError(f'Unknown dataset: {name}')
+        meta = self.fresh_meta(name) or self.build(name, progress=progress)
+        if progress is not None:
+            progress.update(rows=meta['n_rows'], bytes=meta['size'], total_bytes=meta['size'])
+        return map_cache(os.path.join(self.cache_dir, meta['cache_file']), meta)
+
+    def warm(self, job=None, derive=None):
+        # Builds the caches of all datasets that are missing or stale, so that
+        # opening them later is instant. Meant to run as a background job.
+        # derive(columns, rows), if given, is called on every dataset to fill
+        # in its cached_arrays as well.
+        for name in self.names():
+            try:
+                if self.fresh_meta(name) is None:
+                    self.build(name)
+                if derive is not None:
+                    derive(*self.open(name))
+            except DatasetError:
+                # Unparseable files are reported when someone opens them
+                continue
+        return {}
+
+
+def render_dataset_picker(registry):
+    # Lists the server-side datasets on the upload page, one "Open" button each.
+    datasets = registry.list()
+    if not datasets:
+        return ''
+    items = []
+    for ds in datasets:
+        details = f"{ds['rows']:,} rows" if ds['rows'] is not None else f"{ds['size'] / 1024:.0f} KB"
+        items.append(f"""
+            <form action='/datasets/open' method='post' class='flex justify-between items-center gap-2'>
+                <input type='hidden' name='name' value='{html.escape(ds['name'], quote=True)}'>
+                <span class='text-sm text-gray-800'>{html.escape(ds['name'])} <span class='text-gray-500 text-xs'>({details}{'' if ds['cached'] else ', not cached yet'})</span></span>
+                <button type='submit' class='bg-blue-500 text-white rounded px-3 py-1 hover:bg-blue-600 text-sm'>Open</button>
+            </form>
+        """)
+    return f"""
+        <div class='border-t pt-4 mt-6'>
+            <label class='block text-gray-700 mb-2'>Or open a dataset from the server</label>
+            <div class='flex flex-col gap-2'>{''.join(items)}</div>
+        </div>
+    """
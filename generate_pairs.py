@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import csv
+import itertools
+import os
+import sys
+
+from llm_client import LLMClient
+
+# Offline generation harness: answers every question in a queries CSV with
+# every system prompt variant in prompts/, then writes one pairwise CSV per
+# pair of variants in the format main_pairs.py expects
+# (UserQuestion, ModelAnswer1, ModelAnswer2).
+#
+#   uvicorn stub_llm_server:app --port 8001 &
+#   python generate_pairs.py --base-url http://127.0.0.1:8001/v1 --model stub
+#
+# Responses are cached under --cache-dir, so rerunning after a crash or with
+# extra variants only sends the requests that are missing.
+
+PAIR_COLUMNS = ['QueryID', 'UniqueUserReference', 'AssignedCountry', 'Variant1', 'Variant2',
+                'UserQuestion', 'ModelAnswer1', 'ModelAnswer2']
+
+
+def load_prompts(prompts_dir, variants=None):
+    # Returns {variant: system prompt}, where the variant is the file stem
+    # (e.g. 'usa_p1_0721').
+    available = sorted(name[:-4] for name in os.listdir(prompts_dir) if name.endswith('.txt'))
+    missing = [v for v in variants or [] if v not in available]
+    if missing:
+        raise SystemExit(f'Unknown prompt variants: {", ".join(missing)}. Available: {", ".join(available)}')
+    prompts = {}
+    for variant in variants or available:
+        with open(os.path.join(prompts_dir, f'{variant}.txt'), encoding='utf-8') as f:
+            prompts[variant] = f.read()
+    return prompts
+
+
+def country_of(variant):
+    return variant.split('_', 1)[0]
+
+
+def default_pairs(variants):
+    # By default compare every two variants written for the same country.
+    return [(a, b) for a, b in itertools.combinations(variants, 2) if country_of(a) == country_of(b)]
+
+
+def parse_pair(value):
+    left, sep, right = value.partition(':')
+    if not sep or not left or not right:
+        raise argparse.ArgumentTypeError(f'Expected VARIANT1:VARIANT2, got {value!r}')
+    return left, right
+
+
+def iter_queries(path):
+    # Streams question rows from the queries CSV, skipping blank questions.
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if (row.get('UserQuestion') or '').strip():
+                yield row
+
+
+def pair_filename(pair):
+    return f'pairs_{pair[0]}__{pair[1]}.csv'
+
+
+async def answer_query(client, prompts, variants, query):
+    answers = await asyncio.gather(*(client.complete(prompts[v], query['UserQuestion']) for v in variants))
+    return query, dict(zip(variants, answers))
+
+
+def write_pair_rows(writers, pairs, query, answers):
+    for pair in pairs:
+        left, right = pair
+        writers[pair].writerow({
+            'QueryID': query.get('QueryID', ''),
+            'UniqueUserReference': query.get('UniqueUserReference', ''),
+            'AssignedCountry': country_of(left) if country_of(left) == country_of(right) else '',
+            'Variant1': left,
+            'Variant2': right,
+            'UserQuestion': query['UserQuestion'],
+            'ModelAnswer1': answers[left],
+            'ModelAnswer2': answers[right],
+        })
+
+
+async def generate(client, prompts, pairs, queries, out_dir, max_pending=64):
+    # Answers queries with at most max_pending questions in flight and appends
+    # each question's rows to every pair file as soon as all of its answers
+    # are in, so memory stays bounded and partial output is usable.
+    variants = sorted({v for pair in pairs for v in pair})
+    os.makedirs(out_dir, exist_ok=True)
+    files = {pair: open(os.path.join(out_dir, pair_filename(pair)), 'w', newline='', encoding='utf-8') for pair in pairs}
+    writers = {pair: csv.DictWriter(f, fieldnames=PAIR_COLUMNS) for pair, f in files.items()}
+    for writer in writers.values():
+        writer.writeheader()
+
+    written = failed = 0
+    pending = set()
+    queries = iter(queries)
+    try:
+        while True:
+            for query in itertools.islice(queries, max_pending - len(pending)):
+                pending.add(asyncio.ensure_future(answer_query(client, prompts, variants, query)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    query, answers = task.result()
+                except Exception as e:
+                    failed += 1
+                    print(f'Request failed after retries: {e}', file=sys.stderr)
+                    continue
+                write_pair_rows(writers, pairs, query, answers)
+                written += 1
+            for f in files.values():
+                f.flush()
+    finally:
+        for task in pending:
+            task.cancel()
+        for f in files.values():
+            f.close()
+    return written, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate pairwise annotation CSVs from prompt variants.')
+    parser.add_argument('--queries', default='data/localizable_queries.csv')
+    parser.add_argument('--prompts-dir', default='prompts')
+    parser.add_argument('--variants', nargs='+', help='Prompt variants to use (default: all files in --prompts-dir)')
+    parser.add_argument('--pair', dest='pairs', action='append', type=parse_pair,
+                        help='VARIANT1:VARIANT2 pair to write (repeatable, default: all same-country pairs)')
+    parser.add_argument('--out-dir', default='data/generated')
+    parser.add_argument('--cache-dir', default='.cache/completions')
+    parser.add_argument('--base-url', default=os.environ.get('OPENAI_BASE_URL', 'http://127.0.0.1:8001/v1'))
+    parser.add_argument('--api-key', default=os.environ.get('OPENAI_API_KEY'))
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--temperature', type=float, default=0.0)
+    parser.add_argument('--max-tokens', type=int, default=1024)
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum requests in flight')
+    parser.add_argument('--rps', type=float, default=None, help='Maximum requests started per second')
+    parser.add_argument('--max-retries', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    pairs = args.pairs
+    prompts = load_prompts(args.prompts_dir, sorted({v for p in pairs for v in p}) if pairs else args.variants)
+    pairs = pairs or default_pairs(list(prompts))
+    if not pairs:
+        raise SystemExit('No variant pairs to generate. Pass --pair VARIANT1:VARIANT2.')
+
+    async def run():
+        params = {'temperature': args.temperature, 'max_tokens': args.max_tokens}
+        async with LLMClient(args.base_url, args.model, api_key=args.api_key, params=params,
+                             concurrency=args.concurrency, requests_per_second=args.rps,
+                             max_retries=args.max_retries, cache_dir=args.cache_dir) as client:
+            written, failed = await generate(client, prompts, pairs, iter_queries(args.queries), args.out_dir,
+                                             max_pending=max(args.concurrency * 4, 1))
+            return written, failed, client.stats
+
+    written, failed, stats = asyncio.run(run())
+    print(f'Wrote {written} questions to {len(pairs)} pair file(s) in {args.out_dir} '
+          f'({stats["requested"]} requested, {stats["cached"]} cached, {stats["retries"]} retries, {failed} failed).')
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import re
+
+# Suggested COMMON_ISSUES flags for pairwise mode, computed once when a file
+# is loaded so that annotators only confirm or clear them.
+#
+# Per-answer features are computed over batches of rows at a time: the
+# answers of a batch are laid out back to back as one array of code points
+# and words are counted with np.add.reduceat over word starts. Short answers
+# are then searched for refusal and clarification patterns (the behaviours
+# the prompts/ rules ask for, e.g. "ask the user to clarify" or "refuse to
+# act as an interpreter") with one regex scan per batch, matches being
+# mapped back to rows with np.searchsorted. numpy is imported by the
+# functions that compute flags, so that rendering a page never loads it.
+#
+# Suggestions:
+#   No_Answer  - the answer is empty, a refusal or a clarification request
+#                while the other model did answer.
+#   Too_Wordy  - the answer is long and much longer than the other one.
+# Should_Not_Answer has no cheap signal and is never suggested.
+
+BATCH_ROWS = 5_000
+SHORT_ANSWER_WORDS = 120
+REFUSAL_WINDOW = 300
+TOO_WORDY_WORDS = 350
+TOO_WORDY_RATIO = 1.5
+
+_APOSTROPHE = "['’]"
+REFUSAL = re.compile(
+    rf"\b(?:I{_APOSTROPHE}m sorry|I am sorry|sorry, but"
+    rf"|I (?:can{_APOSTROPHE}?t|cannot|am unable to|am not able to|won{_APOSTROPHE}t be able to) (?:help|assist|answer|provide|do that|act as|support)"
+    rf"|I{_APOSTROPHE}m (?:unable|not able) to (?:help|assist|answer|provide|do that|act as|support)"
+    r"|(?:outside|beyond) (?:of )?(?:my|the) scope"
+    r"|I can only (?:help|assist|answer))",
+    re.IGNORECASE)
+CLARIFICATION = re.compile(
+    r"\b(?:(?:could|can|would) you (?:please )?(?:clarify|specify|tell me more|provide more|explain what you mean|let me know)"
+    r"|please (?:clarify|specify|provide more)"
+    r"|(?:is|was) (?:this|your)(?: question)? (?:related to|about|part of)"
+    r"|do you have access to"
+    r"|what (?:exactly )?do you mean)",
+    re.IGNORECASE)
+
+
+def _pattern_hits(pattern, texts):
+    # Boolean per text: whether pattern matches it, found with one scan over
+    # the texts joined by \0.
+    import numpy as np
+    joined = '\0'.join(texts)
+    lengths = np.fromiter((len(t) + 1 for t in texts), dtype=np.int64, count=len(texts))
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    hits = np.zeros(len(texts), dtype=bool)
+    positions = np.fromiter((m.start() for m in pattern.finditer(joined)), dtype=np.int64)
+    hits[np.searchsorted(starts, positions, side='right') - 1] = True
+    return hits
+
+
+def word_counts(texts, batch_rows=BATCH_ROWS):
+    # Number of whitespace-separated words of each text. The texts of a batch
+    # are laid out as one array of code points separated by \0; a word
+    # starts wherever a non-space follows a space.
+    import numpy as np
+    words = np.zeros(len(texts), dtype=np.int64)
+    for start in range(0, len(texts), batch_rows):
+        batch = texts[start:start + batch_rows]
+        codes = np.frombuffer(('\0'.join(batch) + '\0').encode('utf-32-le'), dtype=np.uint32)
+        lengths = np.fromiter((len(t) + 1 for t in batch), dtype=np.int64, count=len(batch))
+        is_space = (codes <= 32) | (codes == 0xA0)
+        word_start = ~is_space
+        word_start[1:] &= is_space[:-1]
+        words[start:start + len(batch)] = np.add.reduceat(word_start, np.cumsum(lengths) - lengths, dtype=np.int64)
+    return words
+
+
+def answer_features(texts):
+    # Returns {'words', 'refusal', 'clarification', 'empty'} arrays, one
+    # value per text; missing values count as empty answers. Only short
+    # answers can be refusals or clarification requests, so only those are
+    # searched, refusals in their first REFUSAL_WINDOW characters.
+    import numpy as np
+    texts = [t if isinstance(t, str) else '' for t in texts]
+    words = word_counts(texts)
+    refusal = np.zeros(len(texts), dtype=bool)
+    clarification = np.zeros(len(texts), dtype=bool)
+    short = np.flatnonzero((words > 0) & (words < SHORT_ANSWER_WORDS))
+    for start in range(0, len(short), BATCH_ROWS):
+        rows = short[start:start + BATCH_ROWS]
+        batch = [texts[i] for i in rows.tolist()]
+        refusal[rows] = _pattern_hits(REFUSAL, [t[:REFUSAL_WINDOW] for t in batch])
+        clarification[rows] = _pattern_hits(CLARIFICATION, batch)
+    return {'words': words, 'refusal': refusal, 'clarification': clarification, 'empty': words == 0}
+
+
+def suggest_flags(rows, issue_keys, columns=('ModelAnswer1', 'ModelAnswer2')):
+    # Returns {'LLM_<n>_<issue>': bool array} for the issues in issue_keys
+    # that can be predicted.
+    features = [answer_features([row.get(col) for row in rows]) for col in columns]
+    non_answer = [f['empty'] | f['refusal'] | f['clarification'] for f in features]
+    flags = {}
+    for k, other in ((0, 1), (1, 0)):
+        if 'No_Answer' in issue_keys:
+            flags[f'LLM_{k + 1}_No_Answer'] = non_answer[k] & ~non_answer[other]
+        if 'Too_Wordy' in issue_keys:
+            words, other_words = features[k]['words'], features[other]['words']
+            flags[f'LLM_{k + 1}_Too_Wordy'] = (words > TOO_WORDY_WORDS) & (words > TOO_WORDY_RATIO * other_words)
+    return flags
+
+
+def flag_suggestions(state, idx):
+    # The flags suggested for one item, as {key: True}.
+    flags = state.get('suggested_flags') or {}
+    return {key: True for key, suggested in flags.items() if suggested[idx]}
+
+
+def review_columns(flags, store):
+    # Export columns recording, for every suggested flag, the suggestion and
+    # whether the annotator 'accepted' or 'overridden' it on completed items,
+    # computed over the arrays of the AnnotationStore.
+    import numpy as np
+    completed = store.in_status('completed')
+    columns = {}
+    for key, suggested in flags.items():
+        final = store.flag(key)
+        columns[f'{key}_suggested'] = suggested
+        columns[f'{key}_review'] = np.where(completed, np.where(final == suggested, 'accepted', 'overridden'), '')
+    return columns
@@ -0,0 +1,235 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+
+from annotation_state import changes_since, checkpoint_token
+from assets import asset_url
+from dataset_io import DatasetError, write_csv_export
+from issue_flags import review_columns
+from judge import judge_columns
+
+# Background jobs for CPU-heavy work (CSV parsing and export), so that it
+# never runs on the event loop and other annotators' requests stay fast.
+#
+# Jobs run in a small thread pool rather than a process pool because their
+# results (parsed rows, export files) have to end up in this process; the
+# csv module's reader and writer do most of their work in C. The UI polls
+# /api/jobs/{id} for progress and follows job.result['redirect'] when done.
+#
+# Long-running jobs (the LLM judge, warming the dataset caches) have a pool
+# of their own, so an upload or export never waits behind them.
+
+MAX_FINISHED_JOBS = 50
+# Job kinds run in the background pool rather than the interactive one
+BACKGROUND_KINDS = ('judge', 'warm')
+JOB_TITLES = {'upload': 'Loading file', 'export': 'Preparing download', 'judge': 'Running the LLM judge'}
+
+
+class Job:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.progress = {}
+        self.result = {}
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'redirect': self.result.get('redirect'),
+            'error': self.error,
+        }
+
+
+class JobRunner:
+    def __init__(self, max_workers=2, background_workers=1):
+        # max_workers: threads for uploads and exports, which a user waits on.
+        # background_workers: threads for the BACKGROUND_KINDS jobs.
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.background_executor = ThreadPoolExecutor(max_workers=background_workers, thread_name_prefix='background-job')
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, kind, fn, *args):
+        # Runs fn(job, *args) in the pool for its kind. fn returns the job's
+        # result dict; a DatasetError message is shown to the user as the
+        # job's error.
+        job = Job(kind)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._evict_finished()
+        executor = self.background_executor if kind in BACKGROUND_KINDS else self.executor
+        executor.submit(self._run, job, fn, args)
+        return job
+
+    def shutdown(self):
+        # Drops the queued jobs when the server stops; running ones finish.
+        for executor in (self.executor, self.background_executor):
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job, fn, args):
+        job.status = 'running'
+        try:
+            job.result = fn(job, *args) or {}
+            job.status = 'done'
+        except DatasetError as e:
+            job.error = str(e)
+            job.status = 'error'
+        except Exception as e:
+            traceback.print_exc()
+            job.error = f'{job.kind.capitalize()} failed: {e}'
+            job.status = 'error'
+        finally:
+            job.finished_at = time.time()
+
+    def _evict_finished(self):
+        # Forgets the oldest finished jobs and deletes the files they produced.
+        finished = [job for job in self.jobs.values() if job.finished_at is not None]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
+            path = job.result.get('path')
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+async def save_upload(file):
+    # Copies an uploaded file to a temporary path without blocking the event
+    # loop. The upload itself is closed when the request ends, so jobs read
+    # the copy and delete it when they are done.
+    def copy():
+        suffix = os.path.splitext(file.filename or '')[1] or '.csv'
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix='upload_') as tmp:
+            shutil.copyfileobj(file.file, tmp, length=1024 * 1024)
+            return tmp.name
+    return await run_in_threadpool(copy)
+
+
+def export_job(job, state, annotation_columns, download_name):
+    # Job function writing the current data and annotations to a temporary
+    # CSV file, served afterwards by /api/jobs/{id}/download.
+    # Data rows are never modified in place; the annotation store is copied
+    # so the export is a consistent snapshot while annotators keep working,
+    # and its columns are decoded in bulk.
+    # The checkpoint is taken first: later deltas may repeat a write that
+    # made it into this file, but never miss one.
+    checkpoint = checkpoint_token(state)
+    rows = state['data_rows']
+    store = state['annotations'].copy()
+    columns = store.columns(annotation_columns)
+    if state.get('duplicate_cluster') is not None:
+        columns['DuplicateCluster'] = state['duplicate_cluster']
+    if state.get('suggested_flags'):
+        columns.update(review_columns(state['suggested_flags'], store))
+    columns.update(judge_columns(list(state['suggestions'])) or {})
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.csv', prefix='export_') as tmp:
+        path = tmp.name
+    try:
+        write_csv_export(path, rows, state['columns'], columns, progress=job.progress)
+    except Exception:
+        os.remove(path)
+        raise
+    # Unless another dataset was loaded meanwhile
+    if checkpoint.rpartition('-')[0] == state.get('dataset_id'):
+        state['last_save_checkpoint'] = checkpoint
+    return {'path': path, 'download_name': download_name, 'redirect': f'/api/jobs/{job.id}/download',
+            'checkpoint': checkpoint}
+
+
+def delta_export(state, annotation_columns, key_columns, since=None):
+    # Writes the items annotated after the checkpoint since (by default the
+    # last full save) to a temporary CSV file: the row number, the key
+    # columns present in the data and the annotation columns. Returns
+    # (path, number of rows, new checkpoint token). Only the changed items
+    # are read, so the cost follows the number of changes.
+    changed, checkpoint = changes_since(state, since or state.get('last_save_checkpoint'))
+    key_columns = [col for col in key_columns if col in state['columns']]
+    data_rows = state['data_rows']
+    rows = []
+    for idx in changed:
+        row = data_rows[idx]
+        rows.append({'RowIndex': idx, **{col: row.get(col) for col in key_columns}})
+    columns = state['annotations'].columns(annotation_columns, changed)
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.csv', prefix='delta_') as tmp:
+        path = tmp.name
+    try:
+        write_csv_export(path, rows, ['RowIndex'] + key_columns, columns)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, len(rows), checkpoint
+
+
+def render_job_page(job):
+    return f"""
+    <!DOCTYPE html>
+    <html lang='en'>
+    <head>
+        <meta charset='UTF-8'>
+        <meta name='viewport' content='width=device-width, initial-scale=1.0'>
+        <title>Working...</title>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
+    </head>
+    <body class='bg-gray-100 min-h-screen flex items-center justify-center'>
+        <div class='bg-white shadow-lg rounded-lg p-8 w-full max-w-md' id='job' data-job-id='{job.id}'>
+            <h1 id='jobTitle' class='text-2xl font-bold mb-4 text-center'>{JOB_TITLES.get(job.kind, 'Working...')}</h1>
+            <div class='w-full bg-gray-200 rounded-full h-2 mb-2'>
+                <div id='jobBar' class='bg-green-500 h-2 rounded-full transition-all duration-300' style='width: 0%'></div>
+            </div>
+            <div id='jobStatus' class='text-gray-600 text-sm text-center'>Starting...</div>
+            <div id='jobError' class='mt-4 text-red-500 text-center hidden'></div>
+            <div id='jobLinks' class='flex justify-center gap-4 mt-4 hidden'>
+                <a id='jobDownload' href='#' class='bg-blue-500 text-white rounded p-3 hover:bg-blue-600 hidden'>Download again</a>
+                <a href='/' class='bg-gray-300 text-gray-700 rounded p-3 hover:bg-gray-400'>Back</a>
+            </div>
+        </div>
+        <script src='{asset_url('job.js')}' defer></script>
+    </body>
+    </html>
+    """
+
+
+def create_jobs_router(runner):
+    router = APIRouter()
+
+    @router.get("/jobs/{job_id}", response_class=HTMLResponse)
+    def job_page(job_id: str):
+        job = runner.get(job_id)
+        if job is None:
+            return HTMLResponse('Unknown job.', status_code=404)
+        return render_job_page(job)
+
+    @router.get("/api/jobs/{job_id}")
+    def job_status(job_id: str):
+        job = runner.get(job_id)
+        if job is None:
+            return JSONResponse({'status': 'error', 'error': 'Unknown job.'}, status_code=404)
+        return job.to_dict()
+
+    @router.get("/api/jobs/{job_id}/download")
+    def job_download(job_id: str):
+        job = runner.get(job_id)
+        if job is None or job.status != 'done' or 'path' not in job.result:
+            return JSONResponse({'status': 'error', 'error': 'No file to download.'}, status_code=404)
+        return FileResponse(job.result['path'], media_type='text/csv', filename=job.result['download_name'])
+
+    return router
@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import html
+import json
+import os
+import re
+import sys
+
+from annotation_state import set_queue
+from dataset_io import read_records
+from rubrics import PAGE_CONFIGS
+
+# LLM-as-judge pre-annotation: every row and the rubric are sent to an
+# OpenAI-compatible endpoint, which suggests a value for each criterion and
+# an overall confidence. Suggestions are shown next to the rubric, never
+# selected for the annotator, and exported next to the annotations.
+#
+# The rubric comes from the app's page config in rubrics.py: its panels give the
+# texts of a row and its choices the criteria and their allowed values.
+# Requests go through llm_client.LLMClient, so concurrency is bounded,
+# failures are retried and responses are cached on disk. A rerun only pays
+# for the rows that are missing, and rows already judged in the session are
+# skipped. For testing, run the stand-in server:
+#
+#   uvicorn stub_llm_server:app --port 8001
+#   python judge.py data/generated/pairs_usa_p1__usa_p2.csv --app main_pairs -o judgements.jsonl
+#
+# The command line appends one JSON line per row and skips the rows already
+# in the output file, so an interrupted run resumes where it stopped.
+#
+# The HTTP client is imported when the judge runs: the apps import this
+# module for the hints on the annotation page only.
+
+JUDGE_BASE_URL = os.environ.get('JUDGE_BASE_URL', 'http://127.0.0.1:8001/v1')
+JUDGE_MODEL = os.environ.get('JUDGE_MODEL', 'gpt-4o-mini')
+JUDGE_API_KEY = os.environ.get('JUDGE_API_KEY')
+JUDGE_CACHE_DIR = os.environ.get('JUDGE_CACHE_DIR', os.path.join('.cache', 'judge'))
+JUDGE_CONCURRENCY = int(os.environ.get('JUDGE_CONCURRENCY', '8'))
+
+_JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+
+def build_system_prompt(page_config):
+    # Rubric text with the answer format, built from the page config.
+    lines = [
+        'You are an expert reviewer of the answers that teaching assistant chatbots give to teachers.',
+        'Judge the conversation you are given on each criterion below.',
+        '',
+        'Criteria:',
+    ]
+    template = {}
+    for choice in page_config['choices']:
+        options = ', '.join(f'"{o["value"]}" ({o["label"]})' for o in choice['options'])
+        description = f': {choice["description"]}' if choice.get('description') else ''
+        lines.append(f'- {choice["key"]} ({choice["label"]}{description}) - one of {options}')
+        template[choice['key']] = [o['value'] for o in choice['options']]
+    template['confidence'] = 'number between 0 and 1'
+    lines += [
+        '',
+        'Reply with a JSON object only, choosing one value from each list, and give your overall confidence:',
+        json.dumps(template, ensure_ascii=False),
+    ]
+    return '\n'.join(lines)
+
+
+def build_user_message(row, page_config):
+    # The texts of a row, one section per panel.
+    parts = []
+    for panel in page_config['panels']:
+        text = row.get(panel['column'])
+        parts.append(f'## {panel["label"]}\n{text if isinstance(text, str) else ""}')
+    return '\n\n'.join(parts)
+
+
+def parse_judgement(content, page_config):
+    # Returns {'choices': {key: value}, 'confidence': float} from a reply,
+    # keeping only allowed values, or None if it cannot be read.
+    if not isinstance(content, str):
+        return None
+    match = _JSON_OBJECT.search(content)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    choices = {}
+    for choice in page_config['choices']:
+        value = data.get(choice['key'])
+        if value in [o['value'] for o in choice['options']]:
+            choices[choice['key']] = value
+    if not choices:
+        return None
+    try:
+        confidence = min(1.0, max(0.0, float(data.get('confidence'))))
+    except (TypeError, ValueError):
+        confidence = None
+    return {'choices': choices, 'confidence': confidence}
+
+
+async def judge_rows(client, items, page_config, on_result, concurrency=JUDGE_CONCURRENCY):
+    # Judges (idx, row) items with a fixed number of workers pulling from one
+    # iterator, so pending rows are never all turned into tasks at once.
+    # on_result(idx, judgement) is called as each row finishes; judgement is
+    # None when the reply was unusable or the request kept failing, and the
+    # other rows carry on.
+    import httpx
+    system_prompt = build_system_prompt(page_config)
+    items = iter(items)
+
+    async def worker():
+        for idx, row in items:
+            try:
+                content = await client.complete(system_prompt, build_user_message(row, page_config),
+                                                temperature=0, response_format={'type': 'json_object'})
+                on_result(idx, parse_judgement(content, page_config))
+            except (httpx.HTTPError, KeyError, IndexError, TypeError, ValueError):
+                # Failed requests, and responses without the expected fields
+                # (e.g. from a misbehaving proxy or model server)
+                on_result(idx, None)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def make_client():
+    from llm_client import LLMClient
+    return LLMClient(JUDGE_BASE_URL, JUDGE_MODEL, api_key=JUDGE_API_KEY, concurrency=JUDGE_CONCURRENCY,
+                     cache_dir=JUDGE_CACHE_DIR)
+
+
+def confidence_order(state):
+    # Queue order putting unannotated items first, least confident judgement
+    # first; items the judge could not rate count as the least confident.
+    order = state['queue'] if state.get('queue') is not None else range(state['total_rows'])
+    suggestions, submitted = state['suggestions'], state['annotations'].submitted()
+
+    def key(idx):
+        confidence = (suggestions[idx] or {}).get('confidence')
+        return bool(submitted[idx]), -1.0 if confidence is None else confidence
+    return sorted(order, key=key)
+
+
+def judge_job(job, state, page_config, order_by_confidence=False):
+    # Background job judging the rows of the session that have no suggestion
+    # yet. Suggestions are stored in state['suggestions'], alongside
+    # state['annotations'], as they arrive.
+    rows, suggestions, dataset_id = state['data_rows'], state['suggestions'], state['dataset_id']
+    pending = [idx for idx in range(len(rows)) if suggestions[idx] is None]
+    job.progress.update(rows=0, total_rows=len(pending), failed=0)
+
+    def on_result(idx, judgement):
+        suggestions[idx] = judgement
+        job.progress['rows'] += 1
+        if judgement is None:
+            job.progress['failed'] += 1
+
+    async def run():
+        async with make_client() as client:
+            await judge_rows(client, ((idx, rows[idx]) for idx in pending), page_config, on_result)
+    asyncio.run(run())
+    if order_by_confidence and state.get('dataset_id') == dataset_id:
+        set_queue(state, confidence_order(state))
+    return {'redirect': '/annotate'}
+
+
+def option_label(page_config, key, value):
+    for choice in page_config['choices']:
+        if choice['key'] == key:
+            return next((o['label'] for o in choice['options'] if o['value'] == value), value)
+    return value
+
+
+def _judgement(state, idx):
+    suggestions = state.get('suggestions')
+    return suggestions[idx] if suggestions else None
+
+
+def judge_hint(state, idx, key, page_config):
+    # Small note next to a criterion with the judge's suggestion, if any.
+    judgement = _judgement(state, idx)
+    if not judgement or key not in judgement['choices']:
+        return ''
+    label = option_label(page_config, key, judgement['choices'][key])
+    return f" <span class='font-normal text-gray-500 text-xs'>Judge: {html.escape(label)}</span>"
+
+
+def judge_note(state, idx):
+    # Short note for the annotation page header with the judge's confidence.
+    judgement = _judgement(state, idx)
+    if not judgement or judgement['confidence'] is None:
+        return ''
+    return f"LLM judge {judgement['confidence']:.0%} confident"
+
+
+def judge_columns(suggestions):
+    # Export columns with the suggested value of each criterion and the
+    # confidence, or None when no row was judged.
+    keys = {}
+    for judgement in suggestions:
+        if judgement is not None:
+            keys.update(dict.fromkeys(judgement['choices']))
+    if not keys:
+        return None
+    columns = {}
+    for key in keys:
+        columns[f'{key}_judge'] = [(s or {}).get('choices', {}).get(key, '') for s in suggestions]
+    columns['JudgeConfidence'] = [(s or {}).get('confidence') for s in suggestions]
+    return columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-annotate a CSV or Parquet file with an LLM judge.')
+    parser.add_argument('input', help='Input CSV or Parquet file')
+    parser.add_argument('-o', '--out', required=True, help='Output JSON lines file, appended to and resumed from')
+    parser.add_argument('--app', default='main_pairs', choices=sorted(PAGE_CONFIGS),
+                        help='App whose rubric is used (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    page_config = PAGE_CONFIGS[args.app]
+    _, rows = read_records(args.input)
+    done = set()
+    complete_lines = True
+    if os.path.exists(args.out):
+        with open(args.out, encoding='utf-8') as f:
+            # Failed rows are retried; the last line of a row wins
+            latest = {}
+            for line in f:
+                complete_lines = line.endswith('\n')
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Blank, or cut off by an interrupted run: that row is judged again
+                    continue
+                latest[record['index']] = record['judgement']
+        done = {idx for idx, judgement in latest.items() if judgement is not None}
+    pending = [(idx, row) for idx, row in enumerate(rows) if idx not in done]
+    print(f'{len(rows)} rows, {len(done)} already judged, {len(pending)} to go')
+
+    with open(args.out, 'a', encoding='utf-8') as out:
+        if not complete_lines:
+            # Ends the cut-off line so the next record starts on its own
+            out.write('\n')
+
+        def on_result(idx, judgement):
+            out.write(json.dumps({'index': idx, 'judgement': judgement}, ensure_ascii=False) + '\n')
+            out.flush()
+
+        async def run():
+            async with make_client() as client:
+                await judge_rows(client, pending, page_config, on_result)
+                return client.stats
+        stats = asyncio.run(run())
+    print(f'Done: {stats["requested"]} requests, {stats["cached"]} cached, {stats["retries"]} retries')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from urllib.parse import quote, unquote
+
+from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, StreamingResponse
+
+from annotation_store import AnnotationStore
+from assets import asset_url, json_script
+
+# Live supervisor dashboard shared by both apps.
+#
+# /supervisor listens to /api/live, a Server-Sent Events stream: a snapshot
+# when it connects, then deltas holding only what changed (progress, the
+# annotators who saved something, the criteria whose counts moved).
+#
+# Saving an annotation only calls LiveFeed.record, which updates the saving
+# annotator's counters under a lock held for a few microseconds. While at
+# least one viewer is connected, a single broadcaster task wakes every
+# TICK_SECONDS, counts progress and results over the AnnotationStore arrays,
+# serializes the delta once and puts the same string in every viewer's
+# queue. Queues are short: a viewer that falls behind has its queue emptied
+# and gets a fresh snapshot instead, so slow viewers never hold up the
+# broadcaster, and nothing they do reaches the write path.
+#
+# Annotators are told apart by the 'annotator' cookie, set by opening
+# /annotate?annotator=<name> once (e.g. from the link each annotator is
+# sent); without it the client's IP address is used.
+
+TICK_SECONDS = 1.0
+KEEPALIVE_SECONDS = 15
+SUBSCRIBER_QUEUE = 16
+# Per-annotator throughput is measured over the last THROUGHPUT_WINDOW seconds
+THROUGHPUT_WINDOW = 300
+ANNOTATOR_COOKIE = 'annotator'
+# Put in a viewer's queue in place of the deltas it was too slow to read
+RESYNC = object()
+
+
+def annotator_of(request):
+    # Name of the annotator making a request.
+    name = request.cookies.get(ANNOTATOR_COOKIE)
+    if name:
+        return unquote(name)
+    return request.client.host if request.client else 'unknown'
+
+
+def remember_annotator(response, name):
+    # Sets the annotator cookie on a response when a name is given.
+    name = (name or '').strip()[:64]
+    if name:
+        response.set_cookie(ANNOTATOR_COOKIE, quote(name), max_age=365 * 24 * 3600, samesite='lax')
+    return response
+
+
+def sse_event(event, payload):
+    return f'event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n'
+
+
+class LiveFeed:
+    def __init__(self, state, page_config):
+        # state: the app's session_state dict (mutated in place, never replaced).
+        # page_config: the app's OFFLINE_PAGE_CONFIG, for the criteria.
+        self.state = state
+        self.page_config = page_config
+        self.lock = threading.Lock()
+        self.dataset_id = None
+        self.annotators = {}
+        self.changed = set()
+        self.subscribers = set()
+        self.task = None
+        self.last = None
+
+    def _check_dataset(self):
+        # Forgets the annotators of a previous dataset. Returns True if the
+        # dataset changed. Must be called holding the lock.
+        dataset_id = self.state.get('dataset_id')
+        if dataset_id == self.dataset_id:
+            return False
+        self.dataset_id = dataset_id
+        self.annotators = {}
+        self.changed = set()
+        return True
+
+    def record(self, annotator, status):
+        # Called after an annotation is saved, with its status.
+        now = time.time()
+        with self.lock:
+            self._check_dataset()
+            stats = self.annotators.get(annotator)
+            if stats is None:
+                stats = self.annotators[annotator] = {'saved': 0, 'completed': 0, 'skipped': 0, 'first_seen': now,
+                                                      'recent': deque()}
+            stats['saved'] += 1
+            if status in ('completed', 'skipped'):
+                stats[status] += 1
+            stats['last_seen'] = now
+            recent = stats['recent']
+            recent.append(now)
+            while recent[0] < now - THROUGHPUT_WINDOW:
+                recent.popleft()
+            self.changed.add(annotator)
+
+    def _summary(self, stats, now):
+        recent = stats['recent']
+        while recent and recent[0] < now - THROUGHPUT_WINDOW:
+            recent.popleft()
+        # Annotators who started recently are measured since they started
+        window = max(60, min(THROUGHPUT_WINDOW, now - stats['first_seen']))
+        return {'saved': stats['saved'], 'completed': stats['completed'], 'skipped': stats['skipped'],
+                'per_hour': round(len(recent) * 3600 / window, 1), 'last_seen': stats['last_seen']}
+
+    def _aggregates(self):
+        # Progress and per-criterion value counts of the current dataset.
+        store = self.state.get('annotations')
+        if not isinstance(store, AnnotationStore) or not self.state.get('data_rows'):
+            return {'dataset': None, 'progress': {'total': 0, 'completed': 0, 'skipped': 0}, 'results': {}}
+        return {
+            'dataset': self.state.get('filename'),
+            'progress': {'total': len(store), 'completed': store.count('completed'), 'skipped': store.count('skipped')},
+            'results': {key: store.value_counts(key) for key in store.choice_keys},
+        }
+
+    def snapshot(self):
+        # Everything a new viewer needs.
+        now = time.time()
+        with self.lock:
+            self._check_dataset()
+            annotators = {name: self._summary(stats, now) for name, stats in self.annotators.items()}
+        return {**self._aggregates(), 'annotators': annotators}
+
+    def next_delta(self):
+        # What changed since the previous delta, or None. Values are absolute,
+        # so a delta that repeats part of a snapshot is harmless.
+        now = time.time()
+        with self.lock:
+            new_dataset = self._check_dataset()
+            annotators = {name: self._summary(self.annotators[name], now) for name in self.changed}
+            self.changed = set()
+        current, last = self._aggregates(), self.last
+        self.last = current
+        if new_dataset or last is None or current['dataset'] != last['dataset']:
+            return {**current, 'annotators': annotators, 'reset': True}
+        delta = {}
+        if current['progress'] != last['progress']:
+            delta['progress'] = current['progress']
+        results = {key: counts for key, counts in current['results'].items() if counts != last['results'].get(key)}
+        if results:
+            delta['results'] = results
+        if annotators:
+            delta['annotators'] = annotators
+        return delta or None
+
+    def _publish(self, data):
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    async def _broadcast(self):
+        try:
+            while self.subscribers:
+                await asyncio.sleep(TICK_SECONDS)
+                delta = await run_in_threadpool(self.next_delta)
+                if delta:
+                    self._publish(sse_event('delta', delta))
+        finally:
+            self.task = None
+
+    async def stream(self, request):
+        # Server-Sent Events for one viewer.
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.subscribers.add(queue)
+        if self.task is None:
+            self.task = asyncio.create_task(self._broadcast())
+        try:
+            data = RESYNC
+            while True:
+                if data is RESYNC:
+                    data = sse_event('snapshot', await run_in_threadpool(self.snapshot))
+                yield data
+                try:
+                    data = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    data = ': keepalive\n\n'
+        finally:
+            self.subscribers.discard(queue)
+
+
+def render_supervisor_page(page_config):
+    # Renders the shell of the dashboard; numbers come from /api/live.
+    return f"""
+    <!DOCTYPE html>
+    <html lang='en'>
+    <head>
+        <meta charset='UTF-8'>
+        <meta name='viewport' content='width=device-width, initial-scale=1.0'>
+        <title>Supervisor Dashboard</title>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
+    </head>
+    <body class='bg-gray-100 min-h-screen flex flex-col items-center'>
+        <div class='w-full max-w-7xl mt-8 px-4 flex flex-col gap-6'>
+            <div class='flex justify-between items-center'>
+                <span class='text-gray-800 text-lg font-bold'>Supervisor Dashboard <span id='datasetName' class='text-gray-500 text-sm font-normal'></span></span>
+                <span id='liveStatus' class='text-gray-600 text-sm'>Connecting...</span>
+            </div>
+            <div class='bg-white rounded-lg shadow p-6'>
+                <div class='flex justify-between items-center mb-2'>
+                    <div id='progressText' class='text-gray-600 text-sm'></div>
+                    <div id='skippedText' class='text-yellow-600 text-sm font-medium'></div>
+                </div>
+                <div class='w-full bg-gray-200 rounded-full h-2'>
+                    <div id='progressBar' class='bg-green-500 h-2 rounded-full transition-all duration-300' style='width: 0%'></div>
+                </div>
+            </div>
+            <div class='bg-white rounded-lg shadow p-6'>
+                <div class='font-semibold mb-2'>Annotators</div>
+                <div id='annotators' class='text-sm'></div>
+            </div>
+            <div class='bg-white rounded-lg shadow p-6'>
+                <div class='font-semibold mb-2'>Results so far</div>
+                <div id='results' class='flex flex-col gap-4 text-sm'></div>
+            </div>
+        </div>
+        <script id='supervisor-config' type='application/json'>{json_script({'choices': page_config['choices']})}</script>
+        <script src='{asset_url('supervisor.js')}' defer></script>
+    </body>
+    </html>
+    """
+
+
+def create_live_router(feed):
+    router = APIRouter()
+
+    @router.get("/supervisor", response_class=HTMLResponse)
+    def supervisor_page():
+        return render_supervisor_page(feed.page_config)
+
+    @router.get("/api/live")
+    async def api_live(request: Request):
+        return StreamingResponse(feed.stream(request), media_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    return router
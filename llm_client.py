@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+
+import httpx
+
+# Async client for OpenAI-compatible chat completion endpoints.
+# Used by the offline generation scripts; the annotation apps never import it.
+
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    # Token bucket limiting how many requests are started per second. The
+    # bucket holds at least one token, so rates below one request per second
+    # still let a request through every 1 / rate seconds.
+    def __init__(self, requests_per_second):
+        self.rate = requests_per_second
+        self.capacity = max(1.0, requests_per_second or 0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ResponseCache:
+    # On-disk cache of completions, one JSON file per request hash.
+    # Files are sharded by the first two hex characters of the key so that
+    # directories stay small, and written atomically so an interrupted run
+    # never leaves a truncated entry behind.
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(messages, params):
+        payload = json.dumps({'messages': messages, 'params': params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return json.load(f)['content']
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def set(self, key, content):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'content': content}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class LLMClient:
+    # Sends chat completion requests with bounded concurrency, a request rate
+    # limit and retries with exponential backoff. Completed responses are
+    # cached on disk so that reruns only pay for requests that are missing.
+    def __init__(self, base_url, model, api_key=None, params=None, concurrency=8,
+                 requests_per_second=None, max_retries=5, timeout=120.0, cache_dir=None):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.params = dict(params or {})
+        self.max_retries = max_retries
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        headers = {'Authorization': f'Bearer {api_key}'} if api_key else {}
+        self.http = httpx.AsyncClient(headers=headers, timeout=timeout)
+        self.stats = {'cached': 0, 'requested': 0, 'retries': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.http.aclose()
+
+    async def complete(self, system_prompt, user_message, **overrides):
+        # Returns the assistant message content for a single system/user exchange.
+        messages = [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': user_message},
+        ]
+        params = {'model': self.model, **self.params, **overrides}
+        key = ResponseCache.make_key(messages, params)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.stats['cached'] += 1
+                return cached
+
+        async with self.semaphore:
+            content = await self._post_with_retries({'messages': messages, **params})
+        self.stats['requested'] += 1
+        if self.cache:
+            self.cache.set(key, content)
+        return content
+
+    async def _post_with_retries(self, body):
+        url = f'{self.base_url}/chat/completions'
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                resp = await self.http.post(url, json=body)
+                if resp.status_code not in RETRY_STATUS_CODES:
+                    resp.raise_for_status()
+                    return resp.json()['choices'][0]['message']['content']
+                error = httpx.HTTPStatusError(f'Server returned {resp.status_code}', request=resp.request, response=resp)
+                retry_after = resp.headers.get('Retry-After')
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            self.stats['retries'] += 1
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    @staticmethod
+    def _backoff(attempt, retry_after=None):
+        # Honour Retry-After when the server sends one, otherwise back off
+        # exponentially with full jitter.
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, min(60.0, 0.5 * 2 ** attempt))
@@ -1,43 +1,97 @@
 import uvicorn
-from fastapi import FastAPI, Request, Form, UploadFile, File, Response
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
-from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import io
-import json
-
-app = FastAPI()
+from fastapi import FastAPI, Request, Form, UploadFile, File
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
+from starlette.background import BackgroundTask
+import asyncio
+import html
+import os
+from contextlib import asynccontextmanager
+from answer_diff import diff_batch, get_pool, precompute_diffs
+from annotation_state import (apply_annotation, is_first_in_queue, navigate, reset_items, set_label_copies, set_queue,
+                              status_total)
+from assets import asset_url, json_script, setup_assets
+from dataset_io import DatasetError, read_records
+from dataset_registry import DatasetRegistry, MappedRows, cached_arrays, render_dataset_picker
+from issue_flags import flag_suggestions, suggest_flags
+from judge import judge_hint, judge_job, judge_note
+from jobs import JobRunner, create_jobs_router, delta_export, export_job, save_upload
+from live import LiveFeed, annotator_of, create_live_router, remember_annotator
+from markdown_render import render_markdown, prerender
+from near_duplicates import cluster_members, cluster_texts, duplicate_note, find_near_duplicates, representative_rows
+from offline import create_offline_router
+from overview import create_overview_router
+from rubrics import COMMON_ISSUES, PAIRS_PAGE_CONFIG, PAIRWISE_CRITERIA, REQUIRED_CRITERIA_KEYS
+from sampling import parse_sample_options, sample_records
+
+@asynccontextmanager
+async def lifespan(app):
+    # Background work starts with the server rather than on import, so the
+    # command-line tools and tests can import this module freely.
+    job_runner.submit('warm', dataset_registry.warm, derive_columns)
+    yield
+    job_runner.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+setup_assets(app)
+# Uploads are parsed and exports written in background jobs, off the event loop.
+job_runner = JobRunner()
+# Datasets in the data directory can be opened without an upload; their
+# parsed caches and derived columns are built in the background at startup.
+dataset_registry = DatasetRegistry()
 
 # --- Configuration ---
-# Define the criteria for pairwise comparison on the left side of the UI.
-# Format: (InternalKey, DisplayLabel, Description)
-PAIRWISE_CRITERIA = [
-    ('ContextualRelevance', 'Contextual Relevance', 'How well does the answer fit the local educational environment?'),
-    ('PedagogicalQuality', 'Pedagogical Quality', 'How effective is the teaching advice?'),
-    ('CommunicationStyle', 'Communication Style', 'How does the chatbot communicate (Tone, Persona)?'),
-    ('FollowupQuality', 'Follow-up Quality', 'How good is the follow-up question(s) for the specific query?'),
-    ('OverallQuality', 'Overall Quality🏆', 'Which answer would you like to receive?')
-]
-# Get a list of the internal keys for validation purposes.
-REQUIRED_CRITERIA_KEYS = [key for key, _, _ in PAIRWISE_CRITERIA]
-
-# Define the common issues for the right side of the UI.
-# Format: (InternalKey, DisplayLabel)
-COMMON_ISSUES = [
-    ('Too_Wordy', 'Too Wordy (answer should be more concise)'),
-    ('No_Answer', 'No answer but should have been answered'),
-    ('Should_Not_Answer', 'Answer but should NOT have been answered')
-]
+# The criteria (PAIRWISE_CRITERIA) and common issues (COMMON_ISSUES) are defined in rubrics.py.
+
+# Pre-tick the common issues that can be predicted from the answers (length,
+# refusals, clarification requests) when a file is loaded. Annotators confirm
+# or clear them, and the export records which suggestions were accepted.
+SUGGEST_ISSUE_FLAGS = True
+
+# Columns rendered from Markdown, and whether to pre-render them in the background after upload.
+MARKDOWN_COLUMNS = ['UserQuestion', 'ModelAnswer1', 'ModelAnswer2']
+PRERENDER_ON_UPLOAD = True
+
+# Optional highlighting of the differences between the two answers, and
+# whether to compute it for every row in a process pool after upload.
+SHOW_ANSWER_DIFF = True
+DIFF_ON_UPLOAD = True
+
+# Near-duplicate questions are grouped when a file is loaded. With
+# ANNOTATE_ONE_PER_CLUSTER, only the first row of each group is shown and its
+# annotation is copied to the rest; add 'ModelAnswer1' and 'ModelAnswer2' to
+# NEAR_DUPLICATE_COLUMNS to only group rows whose answers are alike as well.
+DETECT_NEAR_DUPLICATES = True
+NEAR_DUPLICATE_COLUMNS = ['UserQuestion']
+NEAR_DUPLICATE_THRESHOLD = 0.8
+ANNOTATE_ONE_PER_CLUSTER = False
+
+# Defaults for the upload form's sampling option: the columns balanced across
+# (ticked when the chosen file has them) and the seed that makes the sample
+# reproducible.
+SAMPLE_STRATA = ['Variant1', 'Variant2']
+SAMPLE_SEED = 0
+
+# After the LLM judge has run (see judge.py), show unannotated items with the
+# least confident judgements first.
+JUDGE_ORDER_BY_CONFIDENCE = False
+
+# Columns identifying a row in delta exports (GET /api/export/delta), next to
+# its row number, when present in the data.
+DELTA_KEY_COLUMNS = ['UniqueUserReference', 'QueryID', 'Variant1', 'Variant2']
 
 # --- Global Session State ---
 def get_default_state():
     return {
         'data_rows': [],
         'annotations': [],
+        'versions': [],
         'current_index': 0,
         'total_rows': 0,
         'columns': [],
         'filename': None,
+        'dataset_id': None,
+        'answer_diffs': {},
+        'suggested_flags': None,
     }
 session_state = get_default_state()
 
@@ -52,18 +106,29 @@ def render_upload_page(error=None):
         <meta charset='UTF-8'>
         <meta name='viewport' content='width=device-width, initial-scale=1.0'>
         <title>LLM Output Annotation</title>
-        <script src='https://cdn.tailwindcss.com'></script>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
     </head>
     <body class='bg-gray-100 min-h-screen flex items-center justify-center'>
         <div class='bg-white shadow-lg rounded-lg p-8 w-full max-w-md'>
             <h1 class='text-2xl font-bold mb-4 text-center'>LLM Output Annotation</h1>
             {f"<div class='mb-4 text-red-500 text-center'>{error}</div>" if error else ''}
             <form action='/upload' method='post' enctype='multipart/form-data' class='flex flex-col gap-4'>
-                <label class='block text-gray-700'>Upload CSV file</label>
-                <input type='file' name='file' accept='.csv' required class='border rounded p-2'>
+                <label class='block text-gray-700'>Upload CSV or Parquet file</label>
+                <input type='file' name='file' accept='.csv,.parquet' required class='border rounded p-2'>
+                <details class='text-sm text-gray-700'>
+                    <summary class='cursor-pointer'>Annotate a random sample</summary>
+                    <div class='flex flex-col gap-2 mt-2'>
+                        <input type='number' name='sample_size' min='1' placeholder='Number of rows, e.g. 2000' class='border rounded p-2'>
+                        <div id='strataColumns' class='flex flex-wrap gap-x-3 gap-y-1'></div>
+                        <input type='text' name='sample_strata' value='' placeholder='Balance across columns, e.g. is_localizable_manual' class='border rounded p-2'>
+                    </div>
+                </details>
                 <button type='submit' class='bg-green-500 text-white rounded p-2 hover:bg-green-600'>Upload</button>
             </form>
+            {render_dataset_picker(dataset_registry)}
         </div>
+        <script id='upload-config' type='application/json'>{json_script({'strata': SAMPLE_STRATA})}</script>
+        <script src='{asset_url('upload.js')}' defer></script>
     </body>
     </html>
     """
@@ -79,15 +144,29 @@ def render_annotation_page():
     def get_choice(crit):
         return prev_ann.get(f'{crit}_winner', '')
     
+    def get_hint(key):
+        return judge_hint(session_state, idx, key, OFFLINE_PAGE_CONFIG)
+
     def get_comment():
-        return prev_ann.get('Comments', '')
+        return html.escape(prev_ann.get('Comments', ''))
         
+    # Until the item is annotated, suggested flags are shown ticked.
+    suggested = flag_suggestions(session_state, idx) if total > 0 else {}
+
     def get_issue_checked(llm, issue):
-        return 'checked' if prev_ann.get(f'LLM_{llm}_{issue}', False) else ''
+        key = f'LLM_{llm}_{issue}'
+        return 'checked' if (prev_ann.get(key, False) if prev_ann else suggested.get(key, False)) else ''
+
+    def get_issue_suggested(llm, issue):
+        return suggested.get(f'LLM_{llm}_{issue}', False)
+
+    # Precomputed answer diff, if ready; otherwise pairs.js fetches it when asked.
+    answer_diff = session_state['answer_diffs'].get(idx) if SHOW_ANSWER_DIFF and total > 0 else None
 
-    # Calculate progress based on completed annotations.
-    completed_count = sum(1 for ann in session_state['annotations'] if all(ann.get(f'{key}_winner') for key in REQUIRED_CRITERIA_KEYS))
-    skipped_count = sum(1 for ann in session_state['annotations'] if not all(ann.get(f'{key}_winner') for key in REQUIRED_CRITERIA_KEYS) and any(ann))
+    # Progress counters are counted from the status array (one vectorized
+    # count_nonzero per status) each time the page renders.
+    completed_count = status_total(session_state, 'completed')
+    skipped_count = status_total(session_state, 'skipped')
     progress_percentage = (completed_count / total * 100) if total > 0 else 0
     
     return f"""
@@ -97,7 +176,7 @@ def render_annotation_page():
         <meta charset='UTF-8'>
         <meta name='viewport' content='width=device-width, initial-scale=1.0'>
         <title>Annotate LLM Outputs</title>
-        <script src='https://cdn.tailwindcss.com'></script>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
     </head>
     <body class='bg-gray-100 min-h-screen flex flex-col items-center'>
         <div class='w-full max-w-7xl mt-8'>
@@ -109,34 +188,49 @@ def render_annotation_page():
                 <div class='w-full bg-gray-200 rounded-full h-2'>
                     <div class='bg-green-500 h-2 rounded-full transition-all duration-300' style='width: {progress_percentage}%'></div>
                 </div>
-                <div class='text-left mt-2'>
-                    <span class='text-gray-800 text-lg font-bold'>Question #{idx + 1}</span>
+                <div class='flex justify-between items-center mt-2'>
+                    <span class='text-gray-800 text-lg font-bold'>Question #{idx + 1} <span class='text-gray-500 text-sm font-normal'>{duplicate_note(session_state, idx)}</span></span>
+                    <div class='flex items-center gap-4'>
+                        <span class='text-gray-500 text-sm'>{judge_note(session_state, idx)}</span>
+                        <form action='/judge' method='post'><button type='submit' class='text-gray-600 text-sm underline'>Pre-annotate with LLM judge</button></form>
+                        <a href='/overview' class='text-gray-600 text-sm underline'>Overview</a>
+                        <a href='/supervisor' class='text-gray-600 text-sm underline'>Supervisor</a>
+                        <a href='/offline' class='text-gray-600 text-sm underline'>Offline mode</a>
+                    </div>
                 </div>
             </div>
             <div class='bg-white rounded-lg shadow p-6 mb-6'>
                 <div class='mb-4'>
-                    <div class='font-semibold mb-2'>User{f" ({data.get('AssignedCountry', '').upper()})" if data.get('AssignedCountry', '').strip() else ''}:</div>
-                    <div class='bg-gray-200 text-gray-800 rounded-2xl px-4 py-2 max-w-[98%] mb-4'>{data.get('UserQuestion', '').replace(chr(10), '<br>').replace(chr(13), '<br>')}</div>
+                    <div class='font-semibold mb-2'>User{f" ({html.escape(data.get('AssignedCountry', '').upper())})" if data.get('AssignedCountry', '').strip() else ''}:</div>
+                    <div class='bg-gray-200 text-gray-800 rounded-2xl px-4 py-2 max-w-[98%] mb-4'>{render_markdown(data.get('UserQuestion', ''))}</div>
+                    {render_diff_toggle(answer_diff)}
                     <div class='grid grid-cols-2 gap-6'>
                         <div class='flex flex-col'>
                             <div class='font-semibold mb-1 text-center'>LLM 1</div>
-                            <div class='bg-green-100 text-green-900 rounded-2xl px-6 py-2 min-h-[40px] max-w-[95%]'>{data.get('ModelAnswer1', '').replace(chr(10), '<br>').replace(chr(13), '<br>')}</div>
+                            <div class='bg-green-100 text-green-900 rounded-2xl px-6 py-2 min-h-[40px] max-w-[95%]'>
+                                <div data-view='markdown'>{render_markdown(data.get('ModelAnswer1', ''))}</div>
+                                <div data-view='diff' id='diff1' class='whitespace-pre-wrap hidden'>{answer_diff[0] if answer_diff else ''}</div>
+                            </div>
                         </div>
                         <div class='flex flex-col'>
                             <div class='font-semibold mb-1 text-center'>LLM 2</div>
-                            <div class='bg-blue-100 text-blue-900 rounded-2xl px-6 py-2 min-h-[40px] max-w-[95%]'>{data.get('ModelAnswer2', '').replace(chr(10), '<br>').replace(chr(13), '<br>')}</div>
+                            <div class='bg-blue-100 text-blue-900 rounded-2xl px-6 py-2 min-h-[40px] max-w-[95%]'>
+                                <div data-view='markdown'>{render_markdown(data.get('ModelAnswer2', ''))}</div>
+                                <div data-view='diff' id='diff2' class='whitespace-pre-wrap hidden'>{answer_diff[1] if answer_diff else ''}</div>
+                            </div>
                         </div>
                     </div>
                 </div>
             </div>
             <form id='annotationForm' class='bg-white rounded-lg shadow p-6 flex flex-col gap-6'>
                 <input type='hidden' name='index' id='index' value='{idx}'>
+                <input type='hidden' name='version' id='version' value='{session_state['versions'][idx] if total > 0 else 0}'>
                 <div class='grid grid-cols-1 md:grid-cols-3 gap-x-8 gap-y-6'>
                     <div class='md:col-span-2'>
-                        {render_pairwise_rubric(get_choice)}
+                        {render_pairwise_rubric(get_choice, get_hint)}
                     </div>
                     <div class='md:col-span-1'>
-                        {render_common_issues_rubric(get_issue_checked)}
+                        {render_common_issues_rubric(get_issue_checked, get_issue_suggested)}
                     </div>
                 </div>
                 <div class='border-t pt-6'>
@@ -163,124 +257,31 @@ def render_annotation_page():
             </div>
         </div>
         
-        <script>
-            // Store criteria keys from backend for JS validation
-            const requiredCriteria = {json.dumps(REQUIRED_CRITERIA_KEYS)};
-            const allIssueKeys = {json.dumps([key for key, _ in COMMON_ISSUES])};
-
-            function handlePairwiseClick(criterion, value) {{
-                // Logic to handle button clicks for pairwise comparison and update UI
-                ['LLM_1', 'LLM_2', 'NO_PREF'].forEach(val => {{
-                    document.getElementById(`${{criterion}}_${{val}}`).classList.remove('ring-2', 'ring-green-500', 'ring-blue-500', 'ring-gray-400');
-                }});
-                const ringColor = value === 'LLM_1' ? 'ring-green-500' : value === 'LLM_2' ? 'ring-blue-500' : 'ring-gray-400';
-                document.getElementById(`${{criterion}}_${{value}}`).classList.add('ring-2', ringColor);
-                document.getElementById(`${{criterion}}_winner`).value = value;
-                checkNextButton();
-            }}
-
-            function checkNextButton() {{
-                // Enable 'Next' button only when all required criteria are selected
-                const allSelected = requiredCriteria.every(crit => document.getElementById(`${{crit}}_winner`).value);
-                const nextButton = document.getElementById('nextButton');
-                if (allSelected) {{
-                    nextButton.disabled = false;
-                    nextButton.classList.remove('opacity-50', 'cursor-not-allowed');
-                }} else {{
-                    nextButton.disabled = true;
-                    nextButton.classList.add('opacity-50', 'cursor-not-allowed');
-                }}
-            }}
-            
-            // Run on page load to set initial button state
-            document.addEventListener('DOMContentLoaded', checkNextButton);
-
-            function getFormData() {{
-                // Helper to gather all form data into a single payload object
-                const index = parseInt(document.getElementById('index').value);
-                let payload = {{ index: index, Comments: document.getElementById('Comments').value }};
-                
-                // Get pairwise winners
-                requiredCriteria.forEach(crit => {{
-                    payload[`${{crit}}_winner`] = document.getElementById(`${{crit}}_winner`).value;
-                }});
-
-                // Get common issues for both LLMs
-                [1, 2].forEach(llmNum => {{
-                    allIssueKeys.forEach(issueKey => {{
-                        payload[`LLM_${{llmNum}}_${{issueKey}}`] = document.getElementById(`llm${{llmNum}}_issue_${{issueKey.toLowerCase()}}`).checked;
-                    }});
-                }});
-                return payload;
-            }}
-            
-            async function submitAnnotation() {{
-                // Submit the current annotation and move to the next item
-                const payload = getFormData();
-                await postAnnotation(payload);
-                navigate('next');
-            }}
-            
-            async function skipAnnotation() {{
-                // Skip the current item by submitting an empty annotation
-                const index = parseInt(document.getElementById('index').value);
-                let payload = {{ index: index }};
-                requiredCriteria.forEach(crit => payload[`${{crit}}_winner`] = '');
-                [1, 2].forEach(llmNum => allIssueKeys.forEach(key => payload[`LLM_${{llmNum}}_${{key}}`] = false));
-                payload['Comments'] = '';
-                await postAnnotation(payload);
-                navigate('next');
-            }}
-
-            async function confirmFinishYes() {{
-                // Save the current annotation and redirect to the finish page
-                document.getElementById('finishConfirmModal').classList.add('hidden');
-                const payload = getFormData();
-                await postAnnotation(payload);
-                window.location.href = '/finish';
-            }}
-
-            function confirmFinishNo() {{
-                // Hide the confirmation modal
-                document.getElementById('finishConfirmModal').classList.add('hidden');
-            }}
-            
-            function showFinishConfirm() {{
-                // Show the confirmation modal
-                document.getElementById('finishConfirmModal').classList.remove('hidden');
-            }}
-
-            async function postAnnotation(payload) {{
-                // Central function to POST annotation data to the backend
-                await fetch('/api/annotate', {{
-                    method: 'POST',
-                    headers: {{'Content-Type': 'application/json'}},
-                    body: JSON.stringify(payload)
-                }});
-            }}
-            
-            async function navigate(direction) {{
-                // Navigate between previous/next items
-                await fetch('/api/navigate', {{
-                    method: 'POST',
-                    headers: {{'Content-Type': 'application/json'}},
-                    body: JSON.stringify({{direction: direction}})
-                }});
-                window.location.href = '/annotate';
-            }}
-        </script>
+        <script id='annotation-config' type='application/json'>{json_script({'requiredCriteria': REQUIRED_CRITERIA_KEYS, 'allIssueKeys': [key for key, _ in COMMON_ISSUES]})}</script>
+        <script src='{asset_url('pairs.js')}' defer></script>
     </body>
     </html>
     """
 
-def render_pairwise_rubric(get_choice):
+def render_diff_toggle(answer_diff):
+    # Renders the switch between the formatted answers and their highlighted differences.
+    if not SHOW_ANSWER_DIFF:
+        return ''
+    return f"""
+                    <label class='flex items-center gap-2 text-sm text-gray-600 mb-2'>
+                        <input type='checkbox' id='diffToggle' data-ready='{'1' if answer_diff else '0'}' class='h-4 w-4'>
+                        Highlight differences between the answers
+                    </label>
+    """
+
+def render_pairwise_rubric(get_choice, get_hint):
     # Renders the left-side criteria using the PAIRWISE_CRITERIA config.
     btns = ["<div class='flex flex-col gap-4'>"]
     for crit, label, expl in PAIRWISE_CRITERIA:
         btns.append(
             f"""
             <div>
-                <div class='mb-1 font-semibold'>{label}: <span class='font-normal text-gray-600'>{expl}</span></div>
+                <div class='mb-1 font-semibold'>{label}: <span class='font-normal text-gray-600'>{expl}</span>{get_hint(f'{crit}_winner')}</div>
                 <div class='flex items-center gap-4 mb-2'>
                     <input type='hidden' id='{crit}_winner' name='{crit}_winner' value='{get_choice(crit)}'>
                     <button type='button' id='{crit}_LLM_1' onclick="handlePairwiseClick('{crit}','LLM_1')" class='px-4 py-1 rounded border bg-green-50 border-green-300 {'ring-2 ring-green-500' if get_choice(crit)=='LLM_1' else ''}'>LLM 1</button>
@@ -293,7 +294,7 @@ def render_pairwise_rubric(get_choice):
     btns.append("</div>")
     return "".join(btns)
 
-def render_common_issues_rubric(get_issue_checked):
+def render_common_issues_rubric(get_issue_checked, get_issue_suggested):
     # Renders the right-side common issues using the COMMON_ISSUES config.
     html = ["<div class='flex flex-col gap-6'>"]
     for llm_num in [1, 2]:
@@ -303,7 +304,7 @@ def render_common_issues_rubric(get_issue_checked):
                 f"""
                 <label class='flex items-center gap-2'>
                     <input type='checkbox' id='llm{llm_num}_issue_{issue_key.lower()}' name='llm{llm_num}_issue_{issue_key.lower()}' class='h-4 w-4 rounded border-gray-300 text-indigo-600 focus:ring-indigo-500' {get_issue_checked(llm_num, issue_key)}>
-                    <span>{issue_label}</span>
+                    <span>{issue_label}{" <span class='text-gray-500 text-xs'>(suggested)</span>" if get_issue_suggested(llm_num, issue_key) else ''}</span>
                 </label>
                 """
             )
@@ -313,14 +314,14 @@ def render_common_issues_rubric(get_issue_checked):
 
 def render_previous_button(idx):
     # Renders the 'Previous' button if not on the first item.
-    if idx > 0:
+    if not is_first_in_queue(session_state, idx):
         return '<button type="button" onclick="navigate(\'previous\')" class="bg-gray-300 text-gray-700 px-4 py-2 rounded hover:bg-gray-400">Previous</button>'
     return '<div></div>' # Placeholder for alignment
 
 # Other rendering helpers (finish, save, goodbye pages) remain largely the same.
 def render_finish_page():
-    return """
-    <!DOCTYPE html><html lang='en'><head><meta charset='UTF-8'><title>Finish Annotation</title><script src='https://cdn.tailwindcss.com'></script></head>
+    return f"""
+    <!DOCTYPE html><html lang='en'><head><meta charset='UTF-8'><title>Finish Annotation</title><link rel='stylesheet' href='{asset_url('app.css')}'></head>
     <body class='bg-gray-100 min-h-screen flex items-center justify-center'><div class='bg-white shadow-lg rounded-lg p-8 w-full max-w-md'>
     <h1 class='text-2xl font-bold mb-6 text-center'>Finish Annotation</h1><div class='flex flex-col gap-4'>
     <button onclick="window.location.href='/quit'" class='bg-red-500 text-white rounded p-3 hover:bg-red-600'>Quit without saving</button>
@@ -329,41 +330,59 @@ def render_finish_page():
     """
 
 def render_save_page():
-    return """
-    <!DOCTYPE html><html lang='en'><head><meta charset='UTF-8'><title>Save Results</title><script src='https://cdn.tailwindcss.com'></script></head>
+    return f"""
+    <!DOCTYPE html><html lang='en'><head><meta charset='UTF-8'><title>Save Results</title><link rel='stylesheet' href='{asset_url('app.css')}'></head>
     <body class='bg-gray-100 min-h-screen flex items-center justify-center'><div class='bg-white shadow-lg rounded-lg p-8 w-full max-w-md'>
     <h1 class='text-2xl font-bold mb-6 text-center'>Save Results</h1><form action='/save-file' method='post' class='flex flex-col gap-4'>
     <label class='block text-gray-700'>Filename (e.g., my_annotations)</label>
     <input type='text' name='filename' id='filename' required class='border rounded p-2' placeholder='Enter filename...'>
     <button type='submit' id='saveButton' class='bg-gray-400 text-white rounded p-3 cursor-not-allowed' disabled>Save and Download CSV</button>
-    </form></div><script>
-    document.getElementById('filename').addEventListener('input', function() {
-        const btn = document.getElementById('saveButton');
-        if (this.value.trim().length > 0) {
-            btn.disabled = false;
-            btn.classList.remove('bg-gray-400', 'cursor-not-allowed');
-            btn.classList.add('bg-blue-500', 'hover:bg-blue-600');
-        } else {
-            btn.disabled = true;
-            btn.classList.add('bg-gray-400', 'cursor-not-allowed');
-            btn.classList.remove('bg-blue-500', 'hover:bg-blue-600');
-        }
-    });
-    </script></body></html>
+    </form></div><script src='{asset_url('save.js')}' defer></script></body></html>
     """
 
 def render_goodbye_page(action="saved"):
     message = "Your annotations have been saved successfully!" if action == "saved" else "You quit without saving. Your annotations have been lost."
     return f"""
-    <!DOCTYPE html><html lang='en'><head><meta charset='UTF-8'><title>Goodbye</title><script src='https://cdn.tailwindcss.com'></script></head>
+    <!DOCTYPE html><html lang='en'><head><meta charset='UTF-8'><title>Goodbye</title><link rel='stylesheet' href='{asset_url('app.css')}'></head>
     <body class='bg-gray-100 min-h-screen flex items-center justify-center'><div class='bg-white shadow-lg rounded-lg p-8 w-full max-w-md'>
     <h1 class='text-2xl font-bold mb-6 text-center'>Goodbye!</h1><p class='text-gray-600 mb-6 text-center'>{message}</p>
     <div class='flex justify-center'><button onclick="window.location.href='/restart'" class='bg-blue-500 text-white rounded p-3 hover:bg-blue-600'>Start New Annotation</button></div>
     </div></body></html>
     """
 
+# --- Annotation Payloads ---
+
+def build_annotation(data):
+    # Builds the stored annotation dict from a client payload.
+    ann = {'Comments': data.get('Comments', '')}
+    # Add pairwise winners
+    for key in REQUIRED_CRITERIA_KEYS:
+        ann[f'{key}_winner'] = data.get(f'{key}_winner', '')
+    # Add common issues
+    for llm_num in [1, 2]:
+        for issue_key, _ in COMMON_ISSUES:
+            ann[f'LLM_{llm_num}_{issue_key}'] = data.get(f'LLM_{llm_num}_{issue_key}', False)
+    return ann
+
+def annotation_status(ann):
+    # An item is completed once every criterion has a winner, and skipped if
+    # it was submitted without that.
+    if all(ann.get(f'{key}_winner') for key in REQUIRED_CRITERIA_KEYS):
+        return 'completed'
+    return 'skipped' if ann else None
+
+# Describes the panels and rubric for the client-rendered offline page (see rubrics.py).
+OFFLINE_PAGE_CONFIG = PAIRS_PAGE_CONFIG
+
 # --- FastAPI Endpoints ---
 
+live_feed = LiveFeed(session_state, OFFLINE_PAGE_CONFIG)
+
+app.include_router(create_offline_router(session_state, build_annotation, OFFLINE_PAGE_CONFIG, live_feed))
+app.include_router(create_overview_router(session_state, OFFLINE_PAGE_CONFIG))
+app.include_router(create_live_router(live_feed))
+app.include_router(create_jobs_router(job_runner))
+
 @app.get("/", response_class=HTMLResponse)
 def index():
     # Main entry point. Shows upload page or redirects to annotation.
@@ -371,65 +390,128 @@ def index():
         return render_upload_page()
     return RedirectResponse('/annotate', status_code=302)
 
+def derive_columns(columns, rows):
+    # Validates a parsed dataset and computes the columns derived from all of
+    # its rows: near-duplicate clusters and suggested issue flags. For a
+    # server-side dataset they are stored with its cache (see cached_arrays),
+    # so reopening it skips these passes.
+    required_cols = ['UserQuestion', 'ModelAnswer1', 'ModelAnswer2']
+    if not all(col in columns for col in required_cols):
+        raise DatasetError(f'CSV is missing required columns: {", ".join(required_cols)}. Found: {", ".join(columns)}')
+    derived = {'duplicate_cluster': None, 'suggested_flags': None}
+    if DETECT_NEAR_DUPLICATES:
+        derived.update(cached_arrays(rows, 'near_duplicates', [NEAR_DUPLICATE_COLUMNS, NEAR_DUPLICATE_THRESHOLD], lambda: {
+            'duplicate_cluster': find_near_duplicates(cluster_texts(rows, NEAR_DUPLICATE_COLUMNS), threshold=NEAR_DUPLICATE_THRESHOLD)}))
+    if SUGGEST_ISSUE_FLAGS:
+        issue_keys = [key for key, _ in COMMON_ISSUES]
+        derived['suggested_flags'] = cached_arrays(rows, 'issue_flags', issue_keys, lambda: suggest_flags(rows, issue_keys))
+    return derived
+
+def start_session(columns, rows, filename):
+    # Initializes the session with a parsed dataset.
+    derived = derive_columns(columns, rows)
+    reset_items(session_state, rows, OFFLINE_PAGE_CONFIG, filename=filename, annotation_status=annotation_status)
+    session_state['columns'] = columns
+    representatives = session_state['duplicate_cluster'] = derived['duplicate_cluster']
+    if representatives is not None and ANNOTATE_ONE_PER_CLUSTER:
+        set_label_copies(session_state, cluster_members(representatives))
+        set_queue(session_state, representative_rows(representatives))
+    session_state['suggested_flags'] = derived['suggested_flags']
+    session_state['answer_diffs'] = {}
+    # Server-side datasets are rendered and diffed as items are shown, rather
+    # than in full on every open
+    if not isinstance(rows, MappedRows):
+        if PRERENDER_ON_UPLOAD:
+            prerender(row.get(col) for row in rows for col in MARKDOWN_COLUMNS)
+        if SHOW_ANSWER_DIFF and DIFF_ON_UPLOAD:
+            precompute_diffs(rows, session_state['answer_diffs'])
+    return {'redirect': '/annotate'}
+
+def load_dataset(job, path, filename, sample=None):
+    # Background job: parses an uploaded file, or samples it when sample is
+    # a (size, strata) tuple.
+    try:
+        if sample:
+            columns, rows = sample_records(path, sample[0], strata=sample[1], seed=SAMPLE_SEED, progress=job.progress)
+        else:
+            columns, rows = read_records(path, progress=job.progress)
+    finally:
+        os.remove(path)
+    return start_session(columns, rows, filename)
+
+def open_dataset(job, name):
+    # Background job: opens a server-side dataset from its memory-mapped cache.
+    columns, rows = dataset_registry.open(name, progress=job.progress)
+    return start_session(columns, rows, name)
+
 @app.post("/upload")
-async def upload(file: UploadFile = File(...)):
-    # Handles file upload and session initialization.
-    content = await file.read()
+async def upload(file: UploadFile = File(...), sample_size: str = Form(''), sample_strata: str = Form('')):
+    # Handles file upload; parsing runs as a job whose progress page follows.
     try:
-        df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-    except Exception:
-        return HTMLResponse(render_upload_page(error='Invalid CSV file.'), status_code=400)
-    
-    required_cols = ['UserQuestion', 'ModelAnswer1', 'ModelAnswer2']
-    if not all(col in df.columns for col in required_cols):
-        error_msg = f'CSV is missing required columns: {", ".join(required_cols)}. Found: {", ".join(df.columns)}'
-        return HTMLResponse(render_upload_page(error=error_msg), status_code=400)
-    
-    session_state['data_rows'] = df.to_dict(orient='records')
-    session_state['annotations'] = [{} for _ in range(len(df))]
-    session_state['current_index'] = 0
-    session_state['total_rows'] = len(df)
-    session_state['columns'] = list(df.columns)
-    session_state['filename'] = file.filename
-    return RedirectResponse('/annotate', status_code=302)
+        sample = parse_sample_options(sample_size, sample_strata)
+    except DatasetError as e:
+        return HTMLResponse(render_upload_page(error=str(e)), status_code=400)
+    path = await save_upload(file)
+    job = job_runner.submit('upload', load_dataset, path, file.filename, sample)
+    return RedirectResponse(f'/jobs/{job.id}', status_code=303)
+
+@app.post("/datasets/open")
+async def open_server_dataset(name: str = Form(...)):
+    # Opens a dataset from the data directory instead of an uploaded file.
+    job = job_runner.submit('upload', open_dataset, name)
+    return RedirectResponse(f'/jobs/{job.id}', status_code=303)
 
 @app.get("/annotate", response_class=HTMLResponse)
-def annotate():
+def annotate(annotator: str = ''):
     # Displays the main annotation page.
+    # ?annotator=<name> remembers who is annotating, for the supervisor dashboard.
     if not session_state['data_rows']:
         return RedirectResponse('/', status_code=302)
-    return render_annotation_page()
+    return remember_annotator(HTMLResponse(render_annotation_page()), annotator)
 
 @app.post("/api/annotate")
 async def api_annotate(request: Request):
     # API endpoint to save a single annotation to the session state.
+    # The write only succeeds if it is based on the item's current version.
     data = await request.json()
     idx = data.get('index', 0)
-    
-    ann = {'Comments': data.get('Comments', '')}
-    # Add pairwise winners
-    for key in REQUIRED_CRITERIA_KEYS:
-        ann[f'{key}_winner'] = data.get(f'{key}_winner', '')
-    # Add common issues
-    for llm_num in [1, 2]:
-        for issue_key, _ in COMMON_ISSUES:
-            ann[f'LLM_{llm_num}_{issue_key}'] = data.get(f'LLM_{llm_num}_{issue_key}', False)
-            
-    if 0 <= idx < len(session_state['annotations']):
-        session_state['annotations'][idx] = ann
-    
-    return {"status": "success"}
+    ann = build_annotation(data)
+    status, version = apply_annotation(session_state, idx, ann, base_version=data.get('base_version'))
+    if status == 'conflict':
+        return JSONResponse({"status": "conflict", "version": version, "annotation": session_state['annotations'][idx]}, status_code=409)
+    if status == 'ok':
+        live_feed.record(annotator_of(request), annotation_status(ann))
+    return {"status": "success" if status == 'ok' else status, "version": version}
+
+@app.get("/api/diff/{idx}")
+async def api_diff(idx: int):
+    # Highlighted differences between the two answers of an item. Rows not
+    # precomputed yet are diffed in the process pool, off the event loop.
+    diffs = session_state['answer_diffs']
+    if not 0 <= idx < session_state['total_rows']:
+        return JSONResponse({"status": "error", "message": "Invalid index."}, status_code=404)
+    if idx not in diffs:
+        row = session_state['data_rows'][idx]
+        [(_, result)] = await asyncio.get_running_loop().run_in_executor(
+            get_pool(), diff_batch, [(idx, row.get('ModelAnswer1'), row.get('ModelAnswer2'))])
+        diffs[idx] = result
+    html1, html2 = diffs[idx]
+    return {"index": idx, "html1": html1, "html2": html2}
+
+@app.post("/judge")
+def judge():
+    # Asks the LLM judge for suggestions on the rows that have none yet.
+    if not session_state['data_rows']:
+        return RedirectResponse('/', status_code=303)
+    job = job_runner.submit('judge', judge_job, session_state, OFFLINE_PAGE_CONFIG, JUDGE_ORDER_BY_CONFIDENCE)
+    return RedirectResponse(f'/jobs/{job.id}', status_code=303)
 
 @app.post("/api/navigate")
 async def api_navigate(request: Request):
     # API endpoint to handle moving between previous/next items.
     data = await request.json()
-    direction = data.get('direction')
-    if direction == 'next' and session_state['current_index'] < session_state['total_rows'] - 1:
-        session_state['current_index'] += 1
-    elif direction == 'previous' and session_state['current_index'] > 0:
-        session_state['current_index'] -= 1
-    return {"status": "success", "index": session_state['current_index']}
+    idx = navigate(session_state, data.get('direction'), from_index=data.get('from_index'))
+    return {"status": "success", "index": idx}
 
 @app.get("/finish", response_class=HTMLResponse)
 def finish():
@@ -439,34 +521,42 @@ def finish():
 def save():
     return render_save_page()
 
-@app.post("/save-file", response_class=StreamingResponse)
+@app.post("/save-file")
 async def save_file(filename: str = Form(...)):
-    # Compiles annotations and data into a CSV file for download.
-    df = pd.DataFrame(session_state['data_rows'])
-    ann_df = pd.DataFrame(session_state['annotations'])
-    out_df = pd.concat([df, ann_df], axis=1)
-    
-    buf = io.StringIO()
-    out_df.to_csv(buf, index=False)
-    buf.seek(0)
-    
+    # Compiles annotations and data into a CSV file in a background job;
+    # the job page starts the download when it is written.
     safe_filename = "".join(c for c in filename if c.isalnum() or c in (' ', '_')).rstrip()
-    return StreamingResponse(iter([buf.getvalue()]), media_type='text/csv', headers={
-        'Content-Disposition': f'attachment; filename="{safe_filename}.csv"'
-    })
+    job = job_runner.submit('export', export_job, session_state, list(build_annotation({})), f'{safe_filename}.csv')
+    return RedirectResponse(f'/jobs/{job.id}', status_code=303)
+
+@app.get("/api/export/delta")
+def export_delta(since: str = ''):
+    # Annotations written since a checkpoint token (by default the last full
+    # save), as a CSV of row keys and annotation columns. The X-Checkpoint
+    # header holds the token to pass as 'since' next time.
+    if not session_state['data_rows']:
+        return JSONResponse({"status": "error", "message": "No dataset loaded."}, status_code=404)
+    try:
+        path, count, checkpoint = delta_export(session_state, list(build_annotation({})), DELTA_KEY_COLUMNS, since)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=409)
+    return FileResponse(path, media_type='text/csv', filename=f'delta_{checkpoint}.csv',
+                        headers={'X-Checkpoint': checkpoint, 'X-Changed-Rows': str(count)},
+                        background=BackgroundTask(os.remove, path))
 
 @app.get("/restart")
 def restart():
     # Clears the session and restarts the application.
-    global session_state
-    session_state = get_default_state()
+    # The state is cleared in place because the offline router holds a reference to it.
+    session_state.clear()
+    session_state.update(get_default_state())
     return RedirectResponse('/', status_code=302)
 
 @app.get("/quit")
 def quit():
     # Quits the session and shows a goodbye message.
-    global session_state
-    session_state = get_default_state()
+    session_state.clear()
+    session_state.update(get_default_state())
     return render_goodbye_page(action="quit")
 
 if __name__ == "__main__":
@@ -1,22 +1,73 @@
 import uvicorn
-from fastapi import FastAPI, Request, Form, UploadFile, File, Response
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
-from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import io
-import json
+from fastapi import FastAPI, Request, Form, UploadFile, File
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
+from starlette.background import BackgroundTask
+import html
+import os
+from contextlib import asynccontextmanager
+from annotation_state import (apply_annotation, is_first_in_queue, navigate, reset_items, set_label_copies, set_queue,
+                              status_total)
+from assets import asset_url, json_script, setup_assets
+from dataset_io import DatasetError, read_records
+from dataset_registry import DatasetRegistry, MappedRows, cached_arrays, render_dataset_picker
+from judge import judge_hint, judge_job, judge_note
+from jobs import JobRunner, create_jobs_router, delta_export, export_job, save_upload
+from live import LiveFeed, annotator_of, create_live_router, remember_annotator
+from markdown_render import render_markdown, prerender
+from near_duplicates import cluster_members, cluster_texts, duplicate_note, find_near_duplicates, representative_rows
+from offline import create_offline_router
+from overview import create_overview_router
+from rubrics import SINGLE_PAGE_CONFIG
+from sampling import parse_sample_options, sample_records
 
-app = FastAPI()
+# Background work starts with the server rather than on import, so command-line tools and tests can import this module
+@asynccontextmanager
+async def lifespan(app):
+    job_runner.submit('warm', dataset_registry.warm, derive_columns)
+    yield
+    job_runner.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+setup_assets(app)
+# Uploads are parsed and exports written in background jobs, off the event loop
+job_runner = JobRunner()
+# Datasets in the data directory can be opened without an upload; their parsed caches and derived columns are built in
+# the background at startup
+dataset_registry = DatasetRegistry()
+
+# Columns rendered from Markdown, and whether to pre-render them in the background after upload.
+MARKDOWN_COLUMNS = ['UserQuestion', 'ModelAnswer']
+PRERENDER_ON_UPLOAD = True
+
+# Near-duplicate questions are grouped on load. With ANNOTATE_ONE_PER_CLUSTER, only the first row of each group
+# is shown and its ratings are copied to the rest; add 'ModelAnswer' to the columns to also require alike answers.
+DETECT_NEAR_DUPLICATES = True
+NEAR_DUPLICATE_COLUMNS = ['UserQuestion']
+NEAR_DUPLICATE_THRESHOLD = 0.8
+ANNOTATE_ONE_PER_CLUSTER = False
+
+# Defaults for the upload form's sampling option: columns to balance across (ticked when the chosen file has them), and
+# the seed that makes samples reproducible
+SAMPLE_STRATA = ['is_localizable_manual']
+SAMPLE_SEED = 0
+
+# After the LLM judge has run (see judge.py), show unannotated items with the least confident judgements first
+JUDGE_ORDER_BY_CONFIDENCE = False
+
+# Columns identifying a row in delta exports (GET /api/export/delta), next to its row number, when present in the data
+DELTA_KEY_COLUMNS = ['UniqueUserReference', 'QueryID']
 
 # Global session state
 def get_default_state():
     return {
         'data_rows': [],
         'annotations': [],
+        'versions': [],
         'current_index': 0,
         'total_rows': 0,
         'columns': [],
         'filename': None,
+        'dataset_id': None,
     }
 session_state = get_default_state()
 
@@ -29,18 +80,29 @@ def render_upload_page(error=None):
         <meta charset='UTF-8'>
         <meta name='viewport' content='width=device-width, initial-scale=1.0'>
         <title>LLM Output Annotation</title>
-        <script src='https://cdn.tailwindcss.com'></script>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
     </head>
     <body class='bg-gray-100 min-h-screen flex items-center justify-center'>
         <div class='bg-white shadow-lg rounded-lg p-8 w-full max-w-md'>
             <h1 class='text-2xl font-bold mb-4 text-center'>LLM Output Annotation</h1>
             {f"<div class='mb-4 text-red-500 text-center'>{error}</div>" if error else ''}
             <form action='/upload' method='post' enctype='multipart/form-data' class='flex flex-col gap-4'>
-                <label class='block text-gray-700'>Upload CSV file</label>
-                <input type='file' name='file' accept='.csv' required class='border rounded p-2'>
+                <label class='block text-gray-700'>Upload CSV or Parquet file</label>
+                <input type='file' name='file' accept='.csv,.parquet' required class='border rounded p-2'>
+                <details class='text-sm text-gray-700'>
+                    <summary class='cursor-pointer'>Annotate a random sample</summary>
+                    <div class='flex flex-col gap-2 mt-2'>
+                        <input type='number' name='sample_size' min='1' placeholder='Number of rows, e.g. 2000' class='border rounded p-2'>
+                        <div id='strataColumns' class='flex flex-wrap gap-x-3 gap-y-1'></div>
+                        <input type='text' name='sample_strata' value='' placeholder='Balance across columns, e.g. is_localizable_manual' class='border rounded p-2'>
+                    </div>
+                </details>
                 <button type='submit' class='bg-green-500 text-white rounded p-2 hover:bg-green-600'>Upload</button>
             </form>
+            {render_dataset_picker(dataset_registry)}
         </div>
+        <script id='upload-config' type='application/json'>{json_script({'strata': SAMPLE_STRATA})}</script>
+        <script src='{asset_url('upload.js')}' defer></script>
     </body>
     </html>
     """
@@ -54,13 +116,16 @@ def render_annotation_page():
     prev_ann = annotations[idx] if idx < len(annotations) else {}
     def get_rating(crit):
         return prev_ann.get(crit + '_rating', '')
+    def get_hint(key):
+        return judge_hint(session_state, idx, key, OFFLINE_PAGE_CONFIG)
+
     def get_comment():
-        return prev_ann.get('Comments', '')
-    # Calculate progress - count only completed annotations (not skipped)
-    completed_count = sum(1 for ann in session_state['annotations'] if any(ann.get(f'{crit}_rating') for crit in ['ContextualRelevance', 'PedagogicalQuality', 'Actionability', 'CommunicationStyle']))
-    skipped_count = sum(1 for ann in session_state['annotations'] if not any(ann.get(f'{crit}_rating') for crit in ['ContextualRelevance', 'PedagogicalQuality', 'Actionability', 'CommunicationStyle']) and any(ann))
+        return html.escape(prev_ann.get('Comments', ''))
+    # Calculate progress - count only completed annotations (not skipped). The
+    # counts come from the status array, one vectorized count_nonzero per render
+    completed_count = status_total(session_state, 'completed')
+    skipped_count = status_total(session_state, 'skipped')
     progress_percentage = (completed_count / total * 100) if total > 0 else 0
-    remaining = total - completed_count
     return f"""
     <!DOCTYPE html>
     <html lang='en'>
@@ -68,7 +133,7 @@ def render_annotation_page():
         <meta charset='UTF-8'>
         <meta name='viewport' content='width=device-width, initial-scale=1.0'>
         <title>Annotate LLM Outputs</title>
-        <script src='https://cdn.tailwindcss.com'></script>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
     </head>
     <body class='bg-gray-100 min-h-screen flex flex-col items-center'>
         <div class='w-full max-w-7xl mt-8'>
@@ -80,27 +145,35 @@ def render_annotation_page():
                 <div class='w-full bg-gray-200 rounded-full h-2'>
                     <div class='bg-green-500 h-2 rounded-full transition-all duration-300' style='width: {progress_percentage}%'></div>
                 </div>
-                <div class='text-left mt-2'>
-                    <span class='text-gray-800 text-lg font-bold'>Question #{idx + 1}</span>
+                <div class='flex justify-between items-center mt-2'>
+                    <span class='text-gray-800 text-lg font-bold'>Question #{idx + 1} <span class='text-gray-500 text-sm font-normal'>{duplicate_note(session_state, idx)}</span></span>
+                    <div class='flex items-center gap-4'>
+                        <span class='text-gray-500 text-sm'>{judge_note(session_state, idx)}</span>
+                        <form action='/judge' method='post'><button type='submit' class='text-gray-600 text-sm underline'>Pre-annotate with LLM judge</button></form>
+                        <a href='/overview' class='text-gray-600 text-sm underline'>Overview</a>
+                        <a href='/supervisor' class='text-gray-600 text-sm underline'>Supervisor</a>
+                        <a href='/offline' class='text-gray-600 text-sm underline'>Offline mode</a>
+                    </div>
                 </div>
             </div>
             <div class='bg-white rounded-lg shadow p-6 mb-6'>
                 <div class='flex flex-col gap-4'>
                     <div class='flex'>
                         <div class='bg-gray-200 text-gray-800 rounded-2xl px-4 py-2 max-w-[98%]'>
-                            <span class='font-semibold'>User:</span> {data.get('UserQuestion', '').replace(chr(10), '<br>').replace(chr(13), '<br>')}
+                            <div class='font-semibold'>User:</div>{render_markdown(data.get('UserQuestion', ''))}
                         </div>
                     </div>
                     <div class='flex justify-end'>
                         <div class='bg-green-100 text-green-900 rounded-2xl px-4 py-2 max-w-[98%]'>
-                            <span class='font-semibold'>LLM:</span> {data.get('ModelAnswer', '').replace(chr(10), '<br>').replace(chr(13), '<br>')}
+                            <div class='font-semibold'>LLM:</div>{render_markdown(data.get('ModelAnswer', ''))}
                         </div>
                     </div>
                 </div>
             </div>
             <form id='annotationForm' class='bg-white rounded-lg shadow p-6 flex flex-col gap-6'>
                 <input type='hidden' name='index' id='index' value='{idx}'>
-                {render_rubric(get_rating)}
+                <input type='hidden' name='version' id='version' value='{session_state['versions'][idx] if total > 0 else 0}'>
+                {render_rubric(get_rating, get_hint)}
                 <div class='mb-4'>
                     <label for='Comments' class='block font-semibold mb-1'>Comments <span class='text-gray-500 text-xs'>(optional)</span></label>
                     <textarea id='Comments' name='Comments' class='border rounded p-2 w-full text-sm' rows='2' placeholder='Add any comments here (optional)'>{get_comment()}</textarea>
@@ -125,143 +198,12 @@ def render_annotation_page():
                 </div>
             </div>
         </div>
-        <script>
-        let ratings = {{}}
-        function handleRatingClick(criterion, value) {{
-            ratings[criterion] = value;
-            let options = ratingOptions[criterion];
-            for (let i = 0; i < options.length; i++) {{
-                let v = options[i];
-                let btn = document.getElementById(criterion + '_' + v);
-                if (btn) btn.classList.remove('ring-2','ring-green-500','ring-gray-400','ring-red-500','text-green-800','text-gray-700','text-red-600');
-            }}
-            // Add correct ring and font color to selected
-            let selectedIdx = ratingOptions[criterion].indexOf(value);
-            let btn = document.getElementById(criterion + '_' + value);
-            if (btn) {{
-                if (selectedIdx === 0) {{
-                    btn.classList.add('ring-2','ring-green-500','text-green-800');
-                }} else if (selectedIdx === 1) {{
-                    btn.classList.add('ring-2','ring-gray-400','text-gray-700');
-                }} else if (selectedIdx === 2) {{
-                    btn.classList.add('ring-2','ring-red-500','text-red-600');
-                }}
-            }}
-            document.getElementById(criterion + '_rating').value = value;
-            checkNextButton();
-        }}
-        const ratingOptions = {{
-            'ContextualRelevance': ['Excellent','Good','Poor'],
-            'PedagogicalQuality': ['Effective','Acceptable','Ineffective'],
-            'Actionability': ['VeryActionable','SomewhatActionable','NotActionable'],
-            'CommunicationStyle': ['Supportive','Neutral','Condescending']
-        }};
-        function checkNextButton() {{
-            const cr = document.getElementById('ContextualRelevance_rating').value;
-            const pq = document.getElementById('PedagogicalQuality_rating').value;
-            const ac = document.getElementById('Actionability_rating').value;
-            const cs = document.getElementById('CommunicationStyle_rating').value;
-            const nextButton = document.getElementById('nextButton');
-            if (cr && pq && ac && cs) {{
-                nextButton.disabled = false;
-                nextButton.classList.remove('opacity-50', 'cursor-not-allowed');
-                nextButton.classList.add('hover:bg-green-600');
-            }} else {{
-                nextButton.disabled = true;
-                nextButton.classList.add('opacity-50', 'cursor-not-allowed');
-                nextButton.classList.remove('hover:bg-green-600');
-            }}
-        }}
-        document.addEventListener('DOMContentLoaded', function() {{
-            checkNextButton();
-        }});
-        async function submitAnnotation() {{
-            let index = parseInt(document.getElementById('index').value);
-            let payload = {{
-                index: index,
-                ContextualRelevance_rating: document.getElementById('ContextualRelevance_rating').value,
-                PedagogicalQuality_rating: document.getElementById('PedagogicalQuality_rating').value,
-                Actionability_rating: document.getElementById('Actionability_rating').value,
-                CommunicationStyle_rating: document.getElementById('CommunicationStyle_rating').value,
-                Comments: document.getElementById('Comments').value
-            }};
-            let resp = await fetch('/api/annotate', {{
-                method: 'POST',
-                headers: {{'Content-Type': 'application/json'}},
-                body: JSON.stringify(payload)
-            }});
-            let data = await resp.json();
-            if (data.status === 'success') {{
-                navigate('next');
-            }}
-        }}
-        async function navigate(direction) {{
-            let resp = await fetch('/api/navigate', {{
-                method: 'POST',
-                headers: {{'Content-Type': 'application/json'}},
-                body: JSON.stringify({{direction: direction}})
-            }});
-            let data = await resp.json();
-            if (data.index !== undefined) {{
-                window.location.href = '/annotate';
-            }}
-        }}
-        async function skipAnnotation() {{
-            let index = parseInt(document.getElementById('index').value);
-            let payload = {{
-                index: index,
-                ContextualRelevance_rating: '',
-                PedagogicalQuality_rating: '',
-                Actionability_rating: '',
-                CommunicationStyle_rating: '',
-                Comments: ''
-            }};
-            let resp = await fetch('/api/annotate', {{
-                method: 'POST',
-                headers: {{'Content-Type': 'application/json'}},
-                body: JSON.stringify(payload)
-            }});
-            let data = await resp.json();
-            if (data.status === 'success') {{
-                navigate('next');
-            }}
-        }}
-        // Show confirmation modal for Finish and Save
-        function showFinishConfirm() {{
-            document.getElementById('finishConfirmModal').classList.remove('hidden');
-        }}
-        // If user confirms, proceed to finish
-        async function confirmFinishYes() {{
-            document.getElementById('finishConfirmModal').classList.add('hidden');
-            let index = parseInt(document.getElementById('index').value);
-            let payload = {{
-                index: index,
-                ContextualRelevance_rating: document.getElementById('ContextualRelevance_rating').value,
-                PedagogicalQuality_rating: document.getElementById('PedagogicalQuality_rating').value,
-                Actionability_rating: document.getElementById('Actionability_rating').value,
-                CommunicationStyle_rating: document.getElementById('CommunicationStyle_rating').value,
-                Comments: document.getElementById('Comments').value
-            }};
-            let resp = await fetch('/api/annotate', {{
-                method: 'POST',
-                headers: {{'Content-Type': 'application/json'}},
-                body: JSON.stringify(payload)
-            }});
-            let data = await resp.json();
-            if (data.status === 'success') {{
-                window.location.href = '/finish';
-            }}
-        }}
-        // If user cancels, hide modal and stay on annotation
-        function confirmFinishNo() {{
-            document.getElementById('finishConfirmModal').classList.add('hidden');
-        }}
-        </script>
+        <script src='{asset_url('single.js')}' defer></script>
     </body>
     </html>
     """
 
-def render_rubric(get_rating):
+def render_rubric(get_rating, get_hint):
     rubric = [
         ('ContextualRelevance', 'Contextual Relevance', [
             ('Excellent', 'Highly Localized'),
@@ -293,7 +235,7 @@ def render_rubric(get_rating):
             crit, label, options = rubric[idx]
             btns.append(
                 f"<div>"
-                f"<div class='mb-1 font-semibold'>{label}</div>"
+                f"<div class='mb-1 font-semibold'>{label}{get_hint(f'{crit}_rating')}</div>"
                 f"<div class='flex items-center gap-2 mb-2'>"
                 f"<input type='hidden' id='{crit}_rating' name='{crit}_rating' value='{get_rating(crit)}'>"
             )
@@ -337,7 +279,7 @@ def render_rubric(get_rating):
     return "".join(btns)
 
 def render_previous_button(idx):
-    if idx > 0:
+    if not is_first_in_queue(session_state, idx):
         return '<button type="button" onclick="navigate(\'previous\')" class="bg-gray-300 text-gray-700 px-4 py-2 rounded hover:bg-gray-400">Previous</button>'
     return '<div></div>'
 
@@ -350,7 +292,7 @@ def render_finish_page():
         <meta charset='UTF-8'>
         <meta name='viewport' content='width=device-width, initial-scale=1.0'>
         <title>Finish Annotation</title>
-        <script src='https://cdn.tailwindcss.com'></script>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
     </head>
     <body class='bg-gray-100 min-h-screen flex items-center justify-center'>
         <div class='bg-white shadow-lg rounded-lg p-8 w-full max-w-md'>
@@ -377,7 +319,7 @@ def render_save_page():
         <meta charset='UTF-8'>
         <meta name='viewport' content='width=device-width, initial-scale=1.0'>
         <title>Save Results</title>
-        <script src='https://cdn.tailwindcss.com'></script>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
     </head>
     <body class='bg-gray-100 min-h-screen flex items-center justify-center'>
         <div class='bg-white shadow-lg rounded-lg p-8 w-full max-w-md'>
@@ -388,22 +330,7 @@ def render_save_page():
                 <button type='submit' id='saveButton' class='bg-gray-400 text-white rounded p-3 cursor-not-allowed' disabled>Save</button>
             </form>
         </div>
-        <script>
-        document.getElementById('filename').addEventListener('input', function() {{
-            const filename = this.value.trim();
-            const saveButton = document.getElementById('saveButton');
-            
-            if (filename.length > 0) {{
-                saveButton.disabled = false;
-                saveButton.classList.remove('bg-gray-400', 'cursor-not-allowed');
-                saveButton.classList.add('bg-blue-500', 'hover:bg-blue-600');
-            }} else {{
-                saveButton.disabled = true;
-                saveButton.classList.remove('bg-blue-500', 'hover:bg-blue-600');
-                saveButton.classList.add('bg-gray-400', 'cursor-not-allowed');
-            }}
-        }});
-        </script>
+        <script src='{asset_url('save.js')}' defer></script>
     </body>
     </html>
     """
@@ -418,7 +345,7 @@ def render_goodbye_page(action="saved"):
         <meta charset='UTF-8'>
         <meta name='viewport' content='width=device-width, initial-scale=1.0'>
         <title>Goodbye</title>
-        <script src='https://cdn.tailwindcss.com'></script>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
     </head>
     <body class='bg-gray-100 min-h-screen flex items-center justify-center'>
         <div class='bg-white shadow-lg rounded-lg p-8 w-full max-w-md'>
@@ -442,7 +369,7 @@ def render_save_success_page():
         <meta charset='UTF-8'>
         <meta name='viewport' content='width=device-width, initial-scale=1.0'>
         <title>File Saved Successfully</title>
-        <script src='https://cdn.tailwindcss.com'></script>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
     </head>
     <body class='bg-gray-100 min-h-screen flex items-center justify-center'>
         <div class='bg-white shadow-lg rounded-lg p-8 w-full max-w-md'>
@@ -456,6 +383,32 @@ def render_save_success_page():
     </html>
     """
 
+# Helper: Build the stored annotation from a client payload
+def build_annotation(data):
+    return {
+        'ContextualRelevance_rating': data.get('ContextualRelevance_rating',''),
+        'PedagogicalQuality_rating': data.get('PedagogicalQuality_rating',''),
+        'Actionability_rating': data.get('Actionability_rating',''),
+        'CommunicationStyle_rating': data.get('CommunicationStyle_rating',''),
+        'Comments': data.get('Comments',''),
+    }
+
+# Helper: Completed if any criterion is rated, skipped if submitted without ratings
+def annotation_status(ann):
+    if any(ann.get(f'{crit}_rating') for crit in ['ContextualRelevance', 'PedagogicalQuality', 'Actionability', 'CommunicationStyle']):
+        return 'completed'
+    return 'skipped' if ann else None
+
+# Panels and rubric for the client-rendered offline page (see rubrics.py)
+OFFLINE_PAGE_CONFIG = SINGLE_PAGE_CONFIG
+
+live_feed = LiveFeed(session_state, OFFLINE_PAGE_CONFIG)
+
+app.include_router(create_offline_router(session_state, build_annotation, OFFLINE_PAGE_CONFIG, live_feed))
+app.include_router(create_overview_router(session_state, OFFLINE_PAGE_CONFIG))
+app.include_router(create_live_router(live_feed))
+app.include_router(create_jobs_router(job_runner))
+
 @app.get("/", response_class=HTMLResponse)
 def index():
     if not session_state['data_rows']:
@@ -463,75 +416,103 @@ def index():
     else:
         return RedirectResponse('/annotate', status_code=302)
 
-@app.post("/upload")
-async def upload(file: UploadFile = File(...)):
-    content = await file.read()
-    try:
-        df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-    except Exception:
-        return HTMLResponse(render_upload_page(error='Invalid CSV file. Please check the file format.'), status_code=400)
-    
+# Helper: Validate a parsed dataset and compute the columns derived from all of its rows (near-duplicate clusters).
+# For a server-side dataset they are stored with its cache (see cached_arrays), so reopening it skips this pass.
+def derive_columns(columns, rows):
     # Check for required columns with exact name matching
     required_columns = ['UserQuestion', 'ModelAnswer']
-    missing_columns = []
-    available_columns = list(df.columns)
-    
-    for col in required_columns:
-        if col not in df.columns:
-            missing_columns.append(col)
-    
+    missing_columns = [col for col in required_columns if col not in columns]
     if missing_columns:
-        error_msg = f'CSV file is missing required columns: {", ".join(missing_columns)}. Available columns: {", ".join(available_columns)}'
-        return HTMLResponse(render_upload_page(error=error_msg), status_code=400)
-    
+        raise DatasetError(f'CSV file is missing required columns: {", ".join(missing_columns)}. Available columns: {", ".join(columns)}')
+
     # Check if columns have data
-    if df.empty:
-        return HTMLResponse(render_upload_page(error='CSV file is empty. Please upload a file with data.'), status_code=400)
-    
-    session_state['data_rows'] = df.to_dict(orient='records')
-    session_state['annotations'] = [{} for _ in range(len(session_state['data_rows']))]
-    session_state['current_index'] = 0
-    session_state['total_rows'] = len(session_state['data_rows'])
-    session_state['columns'] = list(df.columns)
-    session_state['filename'] = file.filename
-    return RedirectResponse('/annotate', status_code=302)
+    if not rows:
+        raise DatasetError('CSV file is empty. Please upload a file with data.')
+
+    derived = {'duplicate_cluster': None}
+    if DETECT_NEAR_DUPLICATES:
+        derived.update(cached_arrays(rows, 'near_duplicates', [NEAR_DUPLICATE_COLUMNS, NEAR_DUPLICATE_THRESHOLD], lambda: {
+            'duplicate_cluster': find_near_duplicates(cluster_texts(rows, NEAR_DUPLICATE_COLUMNS), threshold=NEAR_DUPLICATE_THRESHOLD)}))
+    return derived
+
+# Helper: Initialize the session with a parsed dataset
+def start_session(columns, rows, filename):
+    derived = derive_columns(columns, rows)
+    reset_items(session_state, rows, OFFLINE_PAGE_CONFIG, filename=filename, annotation_status=annotation_status)
+    session_state['columns'] = columns
+    representatives = session_state['duplicate_cluster'] = derived['duplicate_cluster']
+    if representatives is not None and ANNOTATE_ONE_PER_CLUSTER:
+        set_label_copies(session_state, cluster_members(representatives))
+        set_queue(session_state, representative_rows(representatives))
+    # Server-side datasets are rendered as items are shown, rather than in full on every open
+    if PRERENDER_ON_UPLOAD and not isinstance(rows, MappedRows):
+        prerender(row.get(col) for row in rows for col in MARKDOWN_COLUMNS)
+    return {'redirect': '/annotate'}
+
+# Background job: parse an uploaded file, or sample it when sample is a (size, strata) tuple
+def load_dataset(job, path, filename, sample=None):
+    try:
+        if sample:
+            columns, rows = sample_records(path, sample[0], strata=sample[1], seed=SAMPLE_SEED, progress=job.progress)
+        else:
+            columns, rows = read_records(path, progress=job.progress)
+    finally:
+        os.remove(path)
+    return start_session(columns, rows, filename)
+
+# Background job: open a server-side dataset from its memory-mapped cache
+def open_dataset(job, name):
+    columns, rows = dataset_registry.open(name, progress=job.progress)
+    return start_session(columns, rows, name)
+
+@app.post("/upload")
+async def upload(file: UploadFile = File(...), sample_size: str = Form(''), sample_strata: str = Form('')):
+    try:
+        sample = parse_sample_options(sample_size, sample_strata)
+    except DatasetError as e:
+        return HTMLResponse(render_upload_page(error=str(e)), status_code=400)
+    path = await save_upload(file)
+    job = job_runner.submit('upload', load_dataset, path, file.filename, sample)
+    return RedirectResponse(f'/jobs/{job.id}', status_code=303)
+
+@app.post("/datasets/open")
+async def open_server_dataset(name: str = Form(...)):
+    job = job_runner.submit('upload', open_dataset, name)
+    return RedirectResponse(f'/jobs/{job.id}', status_code=303)
 
 @app.get("/annotate", response_class=HTMLResponse)
-def annotate():
+def annotate(annotator: str = ''):
+    # ?annotator=<name> remembers who is annotating, for the supervisor dashboard.
     if not session_state['data_rows']:
         return RedirectResponse('/', status_code=302)
-    return render_annotation_page()
+    return remember_annotator(HTMLResponse(render_annotation_page()), annotator)
 
 @app.post("/api/annotate")
 async def api_annotate(request: Request):
     data = await request.json()
     idx = data.get('index', 0)
-    ann = {
-        'ContextualRelevance_rating': data.get('ContextualRelevance_rating',''),
-        'PedagogicalQuality_rating': data.get('PedagogicalQuality_rating',''),
-        'Actionability_rating': data.get('Actionability_rating',''),
-        'CommunicationStyle_rating': data.get('CommunicationStyle_rating',''),
-        'Comments': data.get('Comments',''),
-    }
-    if idx < len(session_state['annotations']):
-        session_state['annotations'][idx] = ann
-    else:
-        session_state['annotations'].append(ann)
-    return {"status": "success"}
+    # Rejected with 409 if the item changed since the client loaded it
+    ann = build_annotation(data)
+    status, version = apply_annotation(session_state, idx, ann, base_version=data.get('base_version'))
+    if status == 'conflict':
+        return JSONResponse({"status": "conflict", "version": version, "annotation": session_state['annotations'][idx]}, status_code=409)
+    if status == 'ok':
+        live_feed.record(annotator_of(request), annotation_status(ann))
+    return {"status": "success" if status == 'ok' else status, "version": version}
+
+@app.post("/judge")
+def judge():
+    # Asks the LLM judge for suggestions on the rows that have none yet.
+    if not session_state['data_rows']:
+        return RedirectResponse('/', status_code=303)
+    job = job_runner.submit('judge', judge_job, session_state, OFFLINE_PAGE_CONFIG, JUDGE_ORDER_BY_CONFIDENCE)
+    return RedirectResponse(f'/jobs/{job.id}', status_code=303)
 
 @app.post("/api/navigate")
 async def api_navigate(request: Request):
     data = await request.json()
-    direction = data.get('direction')
-    idx = session_state['current_index']
     total = session_state['total_rows']
-    if direction == 'next':
-        if idx < total - 1:
-            session_state['current_index'] += 1
-    elif direction == 'previous':
-        if idx > 0:
-            session_state['current_index'] -= 1
-    idx = session_state['current_index']
+    idx = navigate(session_state, data.get('direction'), from_index=data.get('from_index'))
     row = session_state['data_rows'][idx] if total > 0 else {'UserQuestion': '', 'ModelAnswer': ''}
     return {'index': idx, 'question': row.get('UserQuestion',''), 'answer': row.get('ModelAnswer','')}
 
@@ -547,6 +528,11 @@ def save():
         return RedirectResponse('/', status_code=302)
     return render_save_page()
 
+# Helper: Start a background export of data and annotations; the job page downloads the file when written
+def start_export(download_name):
+    job = job_runner.submit('export', export_job, session_state, list(build_annotation({})), download_name)
+    return RedirectResponse(f'/jobs/{job.id}', status_code=303)
+
 @app.post("/save-file")
 async def save_file(filename: str = Form(...)):
     if not session_state['data_rows']:
@@ -556,34 +542,32 @@ async def save_file(filename: str = Form(...)):
     if session_state.get('file_saved', False):
         return RedirectResponse('/save-success', status_code=302)
     
-    df = pd.DataFrame(session_state['data_rows'])
-    ann_df = pd.DataFrame(session_state['annotations'])
-    out = pd.concat([df, ann_df], axis=1)
-    buf = io.StringIO()
-    out.to_csv(buf, index=False)
-    buf.seek(0)
     # Store filename and mark as saved
     session_state['saved_filename'] = filename
     session_state['file_saved'] = True
-    # Return the actual CSV file for download
-    return StreamingResponse(iter([buf.getvalue()]), media_type='text/csv', headers={
-        'Content-Disposition': f'attachment; filename="{filename}.csv"'
-    })
+    return start_export(f'{filename}.csv')
 
 @app.get("/save-file")
 def save_file_get():
     if not session_state['data_rows']:
         return RedirectResponse('/', status_code=302)
-    df = pd.DataFrame(session_state['data_rows'])
-    ann_df = pd.DataFrame(session_state['annotations'])
-    out = pd.concat([df, ann_df], axis=1)
-    buf = io.StringIO()
-    out.to_csv(buf, index=False)
-    buf.seek(0)
     filename = session_state.get('saved_filename', 'annotated_results')
-    return StreamingResponse(iter([buf.getvalue()]), media_type='text/csv', headers={
-        'Content-Disposition': f'attachment; filename="{filename}.csv"'
-    })
+    return start_export(f'{filename}.csv')
+
+@app.get("/api/export/delta")
+def export_delta(since: str = ''):
+    # Annotations written since a checkpoint token (by default the last full
+    # save), as a CSV of row keys and annotation columns. The X-Checkpoint
+    # header holds the token to pass as 'since' next time.
+    if not session_state['data_rows']:
+        return JSONResponse({"status": "error", "message": "No dataset loaded."}, status_code=404)
+    try:
+        path, count, checkpoint = delta_export(session_state, list(build_annotation({})), DELTA_KEY_COLUMNS, since)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=409)
+    return FileResponse(path, media_type='text/csv', filename=f'delta_{checkpoint}.csv',
+                        headers={'X-Checkpoint': checkpoint, 'X-Changed-Rows': str(count)},
+                        background=BackgroundTask(os.remove, path))
 
 @app.get("/quit")
 def quit():
@@ -619,16 +603,8 @@ def goodbye(action: str = "saved"):
 def download():
     if not session_state['data_rows']:
         return RedirectResponse('/', status_code=302)
-    df = pd.DataFrame(session_state['data_rows'])
-    ann_df = pd.DataFrame(session_state['annotations'])
-    out = pd.concat([df, ann_df], axis=1)
-    buf = io.StringIO()
-    out.to_csv(buf, index=False)
-    buf.seek(0)
     filename = session_state.get('filename', 'results')
-    return StreamingResponse(iter([buf.getvalue()]), media_type='text/csv', headers={
-        'Content-Disposition': f'attachment; filename="annotated_{filename}.csv"'
-    })
+    return start_export(f'annotated_{filename}.csv')
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
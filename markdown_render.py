@@ -0,0 +1,254 @@
+import hashlib
+import html
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Server-side Markdown rendering for questions and model answers.
+#
+# Supports the subset of Markdown that LLM answers actually use (headings,
+# nested bullet and numbered lists, bold/italic, inline and fenced code,
+# blockquotes, rules and http(s) links). All text is HTML-escaped before any
+# markup is added, so a '<' in an answer can never break the page.
+#
+# Rendered HTML is memoized in a size-bounded LRU cache keyed by a hash of
+# the source text, so repeat views of an item cost a dictionary lookup.
+
+CACHE_MAX_BYTES = int(os.environ.get('MARKDOWN_CACHE_BYTES', 64 * 2 ** 20))
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+RULE_RE = re.compile(r'^([-*_])(\s*\1){2,}$')
+LIST_ITEM_RE = re.compile(r'^(\s*)([-*+•]|(\d{1,9})[.)])\s+(.*)$')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+CODE_SPAN_RE = re.compile(r'`([^`\n]+)`')
+LINK_RE = re.compile(r'\[([^\]\n]+)\]\(((?:https?://|mailto:)[^\s)]+)\)')
+BOLD_RE = re.compile(r'\*\*(?!\s)(.+?)(?<!\s)\*\*|__(?!\s)(.+?)(?<!\s)__')
+ITALIC_RE = re.compile(r'(?<![\w*])\*(?![\s*])(.+?)(?<![\s*])\*(?![\w*])|(?<![\w_])_(?![\s_])(.+?)(?<![\s_])_(?![\w_])')
+PLACEHOLDER_RE = re.compile('\x00(\\d+)\x00')
+
+
+def _emphasis(escaped):
+    escaped = BOLD_RE.sub(lambda m: f'<strong>{m.group(1) or m.group(2)}</strong>', escaped)
+    return ITALIC_RE.sub(lambda m: f'<em>{m.group(1) or m.group(2)}</em>', escaped)
+
+
+def _inline(text):
+    # Renders inline markup. Code spans and links are swapped for
+    # placeholders first so emphasis rules never apply inside them.
+    tokens = []
+
+    def stash(fragment):
+        tokens.append(fragment)
+        return f'\x00{len(tokens) - 1}\x00'
+
+    text = CODE_SPAN_RE.sub(lambda m: stash(f"<code class='font-mono text-sm'>{html.escape(m.group(1))}</code>"), text)
+    text = LINK_RE.sub(lambda m: stash(
+        f"<a href='{html.escape(m.group(2))}' class='underline' target='_blank' rel='noopener noreferrer'>"
+        f"{_emphasis(html.escape(m.group(1)))}</a>"
+    ), text)
+    text = _emphasis(html.escape(text))
+    return PLACEHOLDER_RE.sub(lambda m: tokens[int(m.group(1))], text)
+
+
+def _render_list(items):
+    # items: [(indent, tag, start, text)]. Deeper indentation opens a nested list.
+    out = []
+    stack = []
+    for indent, tag, start, text in items:
+        while stack and indent < stack[-1][0]:
+            out.append(f'</li></{stack.pop()[1]}>')
+        if stack and indent == stack[-1][0] and tag != stack[-1][1]:
+            out.append(f'</li></{stack.pop()[1]}>')
+        if stack and indent == stack[-1][0]:
+            out.append('</li><li>')
+        else:
+            css = 'list-decimal' if tag == 'ol' else 'list-disc'
+            start_attr = f" start='{start}'" if tag == 'ol' and start not in (None, 1) else ''
+            out.append(f"<{tag} class='{css} pl-5 my-1'{start_attr}><li>")
+            stack.append((indent, tag))
+        out.append(text)
+    while stack:
+        out.append(f'</li></{stack.pop()[1]}>')
+    return ''.join(out)
+
+
+def _render_blocks(lines):
+    out = []
+    paragraph = []
+
+    def flush_paragraph():
+        if paragraph:
+            out.append(f"<p class='my-1'>{'<br>'.join(_inline(line) for line in paragraph)}</p>")
+            paragraph.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+
+        fence = FENCE_RE.match(line)
+        if fence:
+            flush_paragraph()
+            code = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith(fence.group(1)):
+                code.append(lines[i])
+                i += 1
+            out.append(f"<pre class='bg-gray-100 rounded p-2 my-1 overflow-x-auto text-sm'><code>{html.escape(chr(10).join(code))}</code></pre>")
+            i += 1
+            continue
+
+        if not stripped:
+            flush_paragraph()
+            i += 1
+            continue
+
+        heading = HEADING_RE.match(stripped)
+        if heading:
+            flush_paragraph()
+            level = len(heading.group(1))
+            css = 'font-bold text-lg' if level <= 2 else 'font-semibold'
+            out.append(f"<h{level} class='{css} mt-2 mb-1'>{_inline(heading.group(2))}</h{level}>")
+            i += 1
+            continue
+
+        if RULE_RE.match(stripped):
+            flush_paragraph()
+            out.append("<hr class='my-2 border-gray-300'>")
+            i += 1
+            continue
+
+        if stripped.startswith('>'):
+            flush_paragraph()
+            quoted = []
+            while i < len(lines) and lines[i].strip().startswith('>'):
+                quoted.append(re.sub(r'^\s*>\s?', '', lines[i]))
+                i += 1
+            out.append(f"<blockquote class='border-l-4 border-gray-300 pl-3 my-1 text-gray-600'>{_render_blocks(quoted)}</blockquote>")
+            continue
+
+        if LIST_ITEM_RE.match(line):
+            flush_paragraph()
+            items = []
+            while i < len(lines):
+                item = LIST_ITEM_RE.match(lines[i])
+                if item:
+                    indent = len(item.group(1).expandtabs(4))
+                    tag = 'ol' if item.group(3) else 'ul'
+                    start = int(item.group(3)) if item.group(3) else None
+                    items.append((indent, tag, start, _inline(item.group(4))))
+                elif lines[i].strip() and lines[i][:1].isspace():
+                    # Indented continuation of the previous item.
+                    indent, tag, start, text = items[-1]
+                    items[-1] = (indent, tag, start, f'{text}<br>{_inline(lines[i].strip())}')
+                else:
+                    break
+                i += 1
+            out.append(_render_list(items))
+            continue
+
+        paragraph.append(stripped)
+        i += 1
+
+    flush_paragraph()
+    return ''.join(out)
+
+
+def render_markdown_uncached(text):
+    # Converts Markdown text to escaped HTML. Missing values render as ''.
+    if text is None or text != text:  # None or NaN from pandas
+        return ''
+    text = str(text).replace('\x00', '').replace('\r\n', '\n').replace('\r', '\n')
+    return _render_blocks(text.split('\n'))
+
+
+class LRUCache:
+    # Thread-safe LRU cache bounded by the total size of the cached values.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value) + len(key)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old) + len(key)
+            self.entries[key] = value
+            self.size += size
+            while self.size > self.max_bytes:
+                old_key, old_value = self.entries.popitem(last=False)
+                self.size -= len(old_value) + len(old_key)
+
+    def is_full(self):
+        return self.size >= self.max_bytes * 0.9
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+cache = LRUCache(CACHE_MAX_BYTES)
+
+
+def _cache_key(text):
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def render_markdown(text):
+    # Cached version of render_markdown_uncached.
+    if text is None or text != text:
+        return ''
+    text = str(text)
+    key = _cache_key(text)
+    rendered = cache.get(key)
+    if rendered is None:
+        rendered = render_markdown_uncached(text)
+        cache.put(key, rendered)
+    return rendered
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='markdown-prerender')
+_generation = 0
+
+
+def prerender(texts):
+    # Renders texts into the cache in a background worker. Starting a new
+    # prerender (e.g. after another upload) stops the previous one, and
+    # prerendering stops once the cache is nearly full so it never evicts
+    # the items an annotator is looking at.
+    global _generation
+    _generation += 1
+    generation = _generation
+
+    def work():
+        for text in texts:
+            if generation != _generation or cache.is_full():
+                return
+            if text is None or text != text:
+                continue
+            text = str(text)
+            key = _cache_key(text)
+            if key not in cache.entries:
+                cache.put(key, render_markdown_uncached(text))
+
+    return _executor.submit(work)
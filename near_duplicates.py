@@ -0,0 +1,209 @@
+import argparse
+import re
+import sys
+
+# Near-duplicate detection for questions (and optionally answers), so that a
+# group of almost identical rows can be annotated once.
+#
+# Each text is normalized and cut into overlapping character shingles, and a
+# MinHash signature estimates the Jaccard similarity between shingle sets.
+# Locality-sensitive hashing over bands of the signature only pairs up rows
+# that share a band, so the work grows with the number of rows instead of
+# their square. Candidate pairs are confirmed on the full signature and
+# joined into clusters by connected components.
+#
+# Shingling, hashing and MinHash are vectorized over batches of rows: the
+# texts of a batch are laid out in one byte array, and the minimum hash per
+# row is taken with np.minimum.reduceat. numpy is imported by the functions
+# that need it, so that the apps can import duplicate_note at no cost.
+#
+# Usage:
+#   python near_duplicates.py data/localizable_queries.csv
+#   python near_duplicates.py pairs.csv --column UserQuestion --column ModelAnswer1 --threshold 0.7 -o clustered.csv
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16
+THRESHOLD = 0.8
+BATCH_ROWS = 20_000
+VERIFY_BLOCK = 500_000
+
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    # Lowercases and strips punctuation and repeated whitespace; missing
+    # values become the empty string.
+    if not isinstance(text, str):
+        return ''
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', text.lower())).strip()
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=0):
+    # Returns an (n, num_perm) uint32 array of MinHash signatures of the
+    # character shingles of each (normalized, non-empty) text.
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    mult = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    add = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    # Lay out the texts back to back, padding short ones to one full shingle
+    encoded = [t.encode('utf-8').ljust(shingle_size) for t in texts]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    # Polynomial hash of every window of shingle_size bytes (wrapping uint64)
+    n_windows = len(data) - shingle_size + 1
+    hashes = np.zeros(n_windows, dtype=np.uint64)
+    for j in range(shingle_size):
+        hashes = hashes * np.uint64(1099511628211) + data[j:j + n_windows]
+
+    # Keep the windows that lie inside one text: each text contributes
+    # length - shingle_size + 1 shingles starting at its own offset
+    counts = lengths - shingle_size + 1
+    window_starts = np.repeat(starts, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    hashes = hashes[window_starts]
+    row_starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for p in range(num_perm):
+        # Multiply-add hash; the high 32 bits are the best mixed
+        permuted = ((hashes * mult[p] + add[p]) >> np.uint64(32)).astype(np.uint32)
+        signatures[:, p] = np.minimum.reduceat(permuted, row_starts)
+    return signatures
+
+
+def band_keys(signatures, bands):
+    # Combines the rows of each band into one uint64 key per (row, band).
+    import numpy as np
+    rows_per_band = signatures.shape[1] // bands
+    keys = np.zeros((len(signatures), bands), dtype=np.uint64)
+    for r in range(rows_per_band):
+        keys = keys * np.uint64(0x9E3779B97F4A7C15) + signatures[:, r::rows_per_band][:, :bands].astype(np.uint64)
+    return keys
+
+
+def find_near_duplicates(texts, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS, shingle_size=SHINGLE_SIZE,
+                         seed=0, batch_rows=BATCH_ROWS):
+    # Returns an int64 array giving, for each text, the index of its cluster's
+    # representative (the first row of the cluster). Rows without a
+    # near-duplicate, and empty texts, are their own representative.
+    import numpy as np
+    texts = [normalize(t) for t in texts]
+    n = len(texts)
+    signatures = np.empty((n, num_perm), dtype=np.uint32)
+    for start in range(0, n, batch_rows):
+        signatures[start:start + batch_rows] = minhash_signatures(texts[start:start + batch_rows], num_perm,
+                                                                  shingle_size, seed)
+    valid = np.fromiter((bool(t) for t in texts), dtype=bool, count=n)
+
+    # Candidate pairs: rows sharing a band key, each paired with the first
+    # row of its bucket. Pairs are encoded as first * n + row to deduplicate.
+    keys = band_keys(signatures, bands)
+    rows = np.flatnonzero(valid)
+    candidates = []
+    for b in range(bands):
+        band = keys[rows, b]
+        order = np.argsort(band, kind='stable')
+        sorted_band = band[order]
+        group_start = np.ones(len(order), dtype=bool)
+        group_start[1:] = sorted_band[1:] != sorted_band[:-1]
+        first = order[np.maximum.accumulate(np.where(group_start, np.arange(len(order)), 0))]
+        members = ~group_start
+        candidates.append(rows[first[members]] * n + rows[order[members]])
+    candidates = np.sort(np.concatenate(candidates))
+    distinct = np.ones(len(candidates), dtype=bool)
+    distinct[1:] = candidates[1:] != candidates[:-1]
+    candidates = candidates[distinct]
+
+    # Confirm candidates on the whole signature, a block at a time
+    confirmed = []
+    for start in range(0, len(candidates), VERIFY_BLOCK):
+        block = candidates[start:start + VERIFY_BLOCK]
+        a, b = block // n, block % n
+        similarity = (signatures[a] == signatures[b]).mean(axis=1)
+        keep = similarity >= threshold
+        confirmed.append((a[keep], b[keep]))
+    return connected_representatives(n, confirmed)
+
+
+def connected_representatives(n, edge_blocks):
+    # Labels each node with the smallest index in its connected component,
+    # by alternating min-label propagation over the edges with pointer jumping.
+    import numpy as np
+    labels = np.arange(n)
+    if not any(len(a) for a, _ in edge_blocks):
+        return labels
+    while True:
+        previous = labels.copy()
+        for a, b in edge_blocks:
+            low = np.minimum(labels[a], labels[b])
+            np.minimum.at(labels, a, low)
+            np.minimum.at(labels, b, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def cluster_members(representatives):
+    # Maps each representative with near-duplicates to the list of its other rows.
+    import numpy as np
+    members = {}
+    for idx in np.flatnonzero(representatives != np.arange(len(representatives))).tolist():
+        members.setdefault(int(representatives[idx]), []).append(idx)
+    return members
+
+
+def representative_rows(representatives):
+    # Indices of the rows that represent their cluster, in row order.
+    import numpy as np
+    return np.flatnonzero(representatives == np.arange(len(representatives))).tolist()
+
+
+def duplicate_note(state, idx):
+    # Short note for the annotation page about the item's near-duplicates.
+    copies = state.get('label_copies', {}).get(idx)
+    if copies:
+        return f'Your labels also apply to {len(copies)} near-duplicate question{"s" if len(copies) > 1 else ""}'
+    representatives = state.get('duplicate_cluster')
+    if representatives is not None and representatives[idx] != idx:
+        return f'Near-duplicate of question #{representatives[idx] + 1}'
+    return ''
+
+
+def cluster_texts(rows, columns):
+    # The text compared for each row: the given columns joined together.
+    return [' '.join(v for v in (row.get(col) for col in columns) if isinstance(v, str)) for row in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find near-duplicate rows in a CSV file.')
+    parser.add_argument('csv', help='Input CSV file')
+    parser.add_argument('--column', action='append', help='Column(s) to compare (default: UserQuestion)')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='Estimated Jaccard similarity to join rows (default: %(default)s)')
+    parser.add_argument('-o', '--output', help='Write the input with a DuplicateCluster column to this file')
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    df = pd.read_csv(args.csv)
+    columns = args.column or ['UserQuestion']
+    reps = find_near_duplicates(cluster_texts(df.to_dict(orient='records'), columns), threshold=args.threshold)
+    members = cluster_members(reps)
+    print(f'{len(df)} rows, {len(members)} clusters with near-duplicates, '
+          f'{sum(len(m) for m in members.values())} rows could reuse a representative\'s labels')
+    for rep, others in sorted(members.items(), key=lambda item: -len(item[1]))[:10]:
+        print(f'  row {rep} (+{len(others)}): {str(df.iloc[rep][columns[0]])[:80]!r}')
+    if args.output:
+        df['DuplicateCluster'] = reps
+        df.to_csv(args.output, index=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import json
+import os
+import zlib
+
+from fastapi import APIRouter, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
+
+from annotation_state import apply_annotation
+from assets import STATIC_DIR, asset_url, json_script
+from issue_flags import flag_suggestions
+from live import annotator_of
+from markdown_render import render_markdown
+
+# Offline annotation mode shared by both apps.
+#
+# /offline is a client-rendered annotation page. It downloads a block of
+# items through /api/items into IndexedDB, records annotations locally while
+# there is no network, and pushes them in gzip-compressed batches to
+# /api/sync. The sync endpoint applies each annotation only if it is based
+# on the item's current version; stale writes are answered with the server's
+# copy so the client can replace its local one. A service worker (/sw.js)
+# keeps the page and its assets available without a connection.
+
+MAX_BLOCK_SIZE = 500
+MAX_SYNC_BYTES = 8 * 2 ** 20
+
+
+def item_payload(state, idx, display_columns):
+    row = state['data_rows'][idx]
+    return {
+        'index': idx,
+        'html': {col: render_markdown(row.get(col, '')) for col in display_columns},
+        'annotation': state['annotations'][idx],
+        'suggestions': flag_suggestions(state, idx),
+        'version': state['versions'][idx],
+    }
+
+
+def render_offline_page(page_config):
+    # Renders the shell of the offline page; items come from IndexedDB.
+    return f"""
+    <!DOCTYPE html>
+    <html lang='en'>
+    <head>
+        <meta charset='UTF-8'>
+        <meta name='viewport' content='width=device-width, initial-scale=1.0'>
+        <title>Annotate Offline</title>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
+    </head>
+    <body class='bg-gray-100 min-h-screen flex flex-col items-center'>
+        <div class='w-full max-w-7xl mt-8 px-4'>
+            <div class='flex justify-between items-center mb-2'>
+                <div id='syncStatus' class='text-gray-600 text-sm'>Loading...</div>
+                <div class='flex gap-2'>
+                    <button type='button' id='downloadButton' class='bg-gray-300 text-gray-700 px-3 py-1 rounded hover:bg-gray-400 text-sm'>Download more items</button>
+                    <button type='button' id='syncButton' class='bg-blue-500 text-white px-3 py-1 rounded hover:bg-blue-600 text-sm'>Sync now</button>
+                </div>
+            </div>
+            <div class='text-left mb-4'>
+                <span id='itemTitle' class='text-gray-800 text-lg font-bold'></span>
+            </div>
+            <div id='itemPanel' class='bg-white rounded-lg shadow p-6 mb-6'></div>
+            <form id='annotationForm' class='bg-white rounded-lg shadow p-6 flex flex-col gap-6'>
+                <div id='rubric' class='flex flex-col gap-4'></div>
+                <div class='border-t pt-6'>
+                    <label for='Comments' class='block font-semibold mb-1'>Comments <span class='text-gray-500 text-xs'>(optional)</span></label>
+                    <textarea id='Comments' class='border rounded p-2 w-full text-sm' rows='2' placeholder='Add any comments here...'></textarea>
+                </div>
+                <div class='flex justify-between items-center mt-4'>
+                    <button type='button' id='previousButton' class='bg-gray-300 text-gray-700 px-4 py-2 rounded hover:bg-gray-400'>Previous</button>
+                    <div class='flex gap-2'>
+                        <button type='button' id='skipButton' class='bg-yellow-500 text-white px-4 py-2 rounded hover:bg-yellow-600'>Skip</button>
+                        <button type='button' id='nextButton' class='bg-green-500 text-white px-4 py-2 rounded hover:bg-green-600 opacity-50 cursor-not-allowed' disabled>Next</button>
+                    </div>
+                    <a href='/annotate' class='bg-blue-500 text-white px-4 py-2 rounded hover:bg-blue-600'>Back to online mode</a>
+                </div>
+            </form>
+        </div>
+        <script id='offline-config' type='application/json'>{json_script(page_config)}</script>
+        <script src='{asset_url('offline-db.js')}' defer></script>
+        <script src='{asset_url('offline.js')}' defer></script>
+    </body>
+    </html>
+    """
+
+
+def create_offline_router(state, build_annotation, page_config, live_feed=None):
+    # state: the app's session_state dict (mutated in place, never replaced).
+    # build_annotation: turns a client payload into the stored annotation dict.
+    # page_config: display columns and rubric description for offline.js.
+    # live_feed: the LiveFeed told about every applied annotation, if any.
+    router = APIRouter()
+    display_columns = [panel['column'] for panel in page_config['panels']]
+
+    @router.get("/offline", response_class=HTMLResponse)
+    def offline_page():
+        if not state['data_rows']:
+            return RedirectResponse('/', status_code=302)
+        return render_offline_page(page_config)
+
+    @router.get("/sw.js")
+    def service_worker():
+        # Served from the root so the worker's scope covers /offline. The
+        # shell URLs are versioned, so a new deploy installs a new worker.
+        shell = ['/offline'] + [asset_url(name) for name in ('app.css', 'offline-db.js', 'offline.js')]
+        with open(os.path.join(STATIC_DIR, 'sw.js'), encoding='utf-8') as f:
+            source = f.read()
+        return Response(f'const SHELL_URLS = {json.dumps(shell)};\n{source}', media_type='application/javascript',
+                        headers={'Cache-Control': 'no-cache'})
+
+    @router.get("/api/items")
+    def api_items(start: int = 0, count: int = 100):
+        # Returns a block of items with rendered text, annotation and version.
+        total = state['total_rows']
+        start = max(0, min(start, total))
+        end = min(total, start + max(0, min(count, MAX_BLOCK_SIZE)))
+        return {
+            'dataset_id': state.get('dataset_id'),
+            'total': total,
+            'start': start,
+            'items': [item_payload(state, idx, display_columns) for idx in range(start, end)],
+        }
+
+    @router.post("/api/sync")
+    async def api_sync(request: Request):
+        # Applies a batch of offline annotations. The body may be gzip-compressed.
+        body = await request.body()
+        too_large = JSONResponse({'status': 'error', 'message': 'Sync batch too large.'}, status_code=413)
+        if len(body) > MAX_SYNC_BYTES:
+            return too_large
+        try:
+            if request.headers.get('content-encoding', '').lower() == 'gzip':
+                # Limits the decompressed size too, so a small gzip bomb cannot
+                # expand without bound
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                body = decompressor.decompress(body, MAX_SYNC_BYTES + 1)
+                if len(body) > MAX_SYNC_BYTES or decompressor.unconsumed_tail:
+                    return too_large
+            data = json.loads(body)
+            if not isinstance(data, dict) or not isinstance(data.get('annotations', []), list):
+                raise ValueError('Sync payload must be a JSON object with a list of annotations')
+        except (zlib.error, ValueError):
+            return JSONResponse({'status': 'error', 'message': 'Invalid sync payload.'}, status_code=400)
+        if data.get('dataset_id') != state.get('dataset_id'):
+            return JSONResponse({'status': 'error', 'message': 'The dataset on the server has changed.'}, status_code=409)
+
+        results = []
+        annotator = annotator_of(request)
+        for record in data.get('annotations', []):
+            idx = record.get('index') if isinstance(record, dict) else None
+            if not isinstance(idx, int) or isinstance(idx, bool):
+                results.append({'index': None, 'status': 'invalid', 'version': None})
+                continue
+            if not isinstance(record.get('annotation', {}), dict):
+                results.append({'index': idx, 'status': 'invalid', 'version': None})
+                continue
+            ann = build_annotation(record.get('annotation', {}))
+            status, version = apply_annotation(state, idx, ann, base_version=record.get('base_version'))
+            if status == 'ok' and live_feed is not None:
+                live_feed.record(annotator, state['annotation_status'](ann))
+            result = {'index': idx, 'status': status, 'version': version}
+            if status == 'conflict':
+                result['annotation'] = state['annotations'][idx]
+            results.append(result)
+        return {'status': 'success', 'results': results}
+
+    return router
@@ -0,0 +1,124 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+
+from annotation_state import OVERVIEW_FILTERS, go_to
+from assets import asset_url, json_script
+
+# Overview page shared by both apps: one line per item with its status, the
+# chosen values and whether it has a comment.
+#
+# The page is a windowed grid. overview.js only creates the lines in view and
+# fetches them a page at a time from /api/overview. 'all' pages are ranges of
+# indices and the other filters read their window from the RowIndex that
+# apply_annotation keeps up to date (see annotation_state.py), so a page
+# costs the same for 2k or 200k items. Clicking a line opens the item in the
+# annotation view through /api/goto.
+
+MAX_PAGE_SIZE = 500
+SNIPPET_CHARS = 160
+FILTER_LABELS = {'all': 'All', 'todo': 'To do', 'completed': 'Done', 'skipped': 'Skipped', 'commented': 'With comment'}
+
+
+def snippet(text):
+    # First SNIPPET_CHARS characters of a text, on one line.
+    if not isinstance(text, str):
+        return ''
+    return ' '.join(text[:SNIPPET_CHARS * 2].split())[:SNIPPET_CHARS]
+
+
+def overview_row(state, idx, choice_keys):
+    ann = state['annotations'][idx]
+    return {
+        'index': idx,
+        'question': snippet(state['data_rows'][idx].get('UserQuestion')),
+        'status': state['annotation_status'](ann) or 'todo',
+        'choices': {key: ann[key] for key in choice_keys if ann.get(key)},
+        'comment': snippet(ann.get('Comments')),
+    }
+
+
+def render_overview_page(page_config):
+    # Renders the shell of the overview; lines come from /api/overview.
+    options = ''.join(f"<option value='{key}'>{label}</option>" for key, label in FILTER_LABELS.items())
+    return f"""
+    <!DOCTYPE html>
+    <html lang='en'>
+    <head>
+        <meta charset='UTF-8'>
+        <meta name='viewport' content='width=device-width, initial-scale=1.0'>
+        <title>Overview</title>
+        <link rel='stylesheet' href='{asset_url('app.css')}'>
+    </head>
+    <body class='bg-gray-100 min-h-screen flex flex-col items-center'>
+        <div class='w-full max-w-7xl mt-8 px-4'>
+            <div class='flex justify-between items-center mb-4'>
+                <div class='flex items-center gap-4'>
+                    <span class='text-gray-800 text-lg font-bold'>Overview</span>
+                    <select id='overviewFilter' class='border rounded p-2 text-sm'>{options}</select>
+                    <span id='overviewTotal' class='text-gray-600 text-sm'></span>
+                </div>
+                <div class='flex items-center gap-4'>
+                    <button type='button' id='refreshButton' class='text-gray-600 text-sm underline'>Refresh</button>
+                    <a href='/annotate' class='bg-blue-500 text-white px-4 py-2 rounded hover:bg-blue-600'>Back to annotation</a>
+                </div>
+            </div>
+            <div class='bg-white rounded-lg shadow'>
+                <div id='gridHeader' class='grid gap-2 px-4 py-2 border-b text-sm font-semibold text-gray-700'></div>
+                <div id='gridViewport' class='overflow-y-auto' style='height: 75vh'>
+                    <div id='gridSpacer' style='position: relative'>
+                        <div id='gridRows'></div>
+                    </div>
+                </div>
+            </div>
+        </div>
+        <script id='overview-config' type='application/json'>{json_script({'choices': page_config['choices'], 'filters': FILTER_LABELS})}</script>
+        <script src='{asset_url('overview.js')}' defer></script>
+    </body>
+    </html>
+    """
+
+
+def create_overview_router(state, page_config):
+    # state: the app's session_state dict (mutated in place, never replaced).
+    # page_config: the app's OFFLINE_PAGE_CONFIG; its choices are the columns.
+    router = APIRouter()
+    choice_keys = [choice['key'] for choice in page_config['choices']]
+
+    @router.get("/overview", response_class=HTMLResponse)
+    def overview_page():
+        if not state['data_rows']:
+            return RedirectResponse('/', status_code=302)
+        return render_overview_page(page_config)
+
+    @router.get("/api/overview")
+    def api_overview(show: str = 'all', start: int = 0, count: int = 100):
+        # Returns a window of the items in a filter, with the size of every
+        # filter for the filter menu.
+        if not state['data_rows']:
+            return JSONResponse({'status': 'error', 'message': 'No dataset loaded.'}, status_code=404)
+        if show != 'all' and show not in OVERVIEW_FILTERS:
+            return JSONResponse({'status': 'error', 'message': f'Unknown filter {show!r}.'}, status_code=400)
+        start, count = max(0, start), max(0, min(count, MAX_PAGE_SIZE))
+        totals = {'all': state['total_rows'], **state['row_index'].totals()}
+        if show == 'all':
+            total, indices = totals['all'], range(start, min(totals['all'], start + count))
+        else:
+            total, indices = state['row_index'].window(show, start, count)
+        return {
+            'dataset_id': state.get('dataset_id'),
+            'total': total,
+            'totals': totals,
+            'start': start,
+            'current': state['current_index'],
+            'rows': [overview_row(state, idx, choice_keys) for idx in indices],
+        }
+
+    @router.post("/api/goto")
+    async def api_goto(request: Request):
+        # Makes the given item the current one of the annotation view.
+        data = await request.json()
+        if not go_to(state, data.get('index')):
+            return JSONResponse({'status': 'error', 'message': 'Unknown item.'}, status_code=400)
+        return {'status': 'success', 'index': data['index']}
+
+    return router
@@ -0,0 +1,67 @@
+# Annotation rubrics of the two apps: the criteria, the common issues and
+# the page configs built from them (the panels shown, the choices with their
+# options, the flags).
+#
+# They live here rather than in main_pairs.py and main_single.py because
+# importing an app builds it; the command-line tools (judge.py,
+# tournament.py) read the rubrics from this module without doing so.
+
+# Define the criteria for pairwise comparison on the left side of the UI.
+# Format: (InternalKey, DisplayLabel, Description)
+PAIRWISE_CRITERIA = [
+    ('ContextualRelevance', 'Contextual Relevance', 'How well does the answer fit the local educational environment?'),
+    ('PedagogicalQuality', 'Pedagogical Quality', 'How effective is the teaching advice?'),
+    ('CommunicationStyle', 'Communication Style', 'How does the chatbot communicate (Tone, Persona)?'),
+    ('FollowupQuality', 'Follow-up Quality', 'How good is the follow-up question(s) for the specific query?'),
+    ('OverallQuality', 'Overall Quality🏆', 'Which answer would you like to receive?')
+]
+# Get a list of the internal keys for validation purposes.
+REQUIRED_CRITERIA_KEYS = [key for key, _, _ in PAIRWISE_CRITERIA]
+
+# Define the common issues for the right side of the UI.
+# Format: (InternalKey, DisplayLabel)
+COMMON_ISSUES = [
+    ('Too_Wordy', 'Too Wordy (answer should be more concise)'),
+    ('No_Answer', 'No answer but should have been answered'),
+    ('Should_Not_Answer', 'Answer but should NOT have been answered')
+]
+
+# Panels and rubric of main_pairs.py (its OFFLINE_PAGE_CONFIG).
+PAIRS_PAGE_CONFIG = {
+    'panels': [
+        {'label': 'User', 'column': 'UserQuestion', 'css': 'bg-gray-200 text-gray-800'},
+        {'label': 'LLM 1', 'column': 'ModelAnswer1', 'css': 'bg-green-100 text-green-900'},
+        {'label': 'LLM 2', 'column': 'ModelAnswer2', 'css': 'bg-blue-100 text-blue-900'},
+    ],
+    'choices': [
+        {'key': f'{key}_winner', 'label': label, 'description': expl,
+         'options': [{'value': 'LLM_1', 'label': 'LLM 1'}, {'value': 'LLM_2', 'label': 'LLM 2'}, {'value': 'NO_PREF', 'label': 'No preference'}]}
+        for key, label, expl in PAIRWISE_CRITERIA
+    ],
+    'flags': [
+        {'key': f'LLM_{llm_num}_{issue_key}', 'label': f'LLM {llm_num}: {issue_label}'}
+        for llm_num in [1, 2] for issue_key, issue_label in COMMON_ISSUES
+    ],
+}
+
+# Panels and rubric of main_single.py (its OFFLINE_PAGE_CONFIG).
+SINGLE_PAGE_CONFIG = {
+    'panels': [
+        {'label': 'User', 'column': 'UserQuestion', 'css': 'bg-gray-200 text-gray-800'},
+        {'label': 'LLM', 'column': 'ModelAnswer', 'css': 'bg-green-100 text-green-900'},
+    ],
+    'choices': [
+        {'key': 'ContextualRelevance_rating', 'label': 'Contextual Relevance',
+         'options': [{'value': 'Excellent', 'label': 'Excellent'}, {'value': 'Good', 'label': 'Good'}, {'value': 'Poor', 'label': 'Poor'}]},
+        {'key': 'PedagogicalQuality_rating', 'label': 'Pedagogical Quality',
+         'options': [{'value': 'Effective', 'label': 'Effective'}, {'value': 'Acceptable', 'label': 'Acceptable'}, {'value': 'Ineffective', 'label': 'Ineffective'}]},
+        {'key': 'Actionability_rating', 'label': 'Actionability',
+         'options': [{'value': 'VeryActionable', 'label': 'Very Actionable'}, {'value': 'SomewhatActionable', 'label': 'Somewhat Actionable'}, {'value': 'NotActionable', 'label': 'Not Actionable'}]},
+        {'key': 'CommunicationStyle_rating', 'label': 'Communication Style',
+         'options': [{'value': 'Supportive', 'label': 'Supportive & Encouraging'}, {'value': 'Neutral', 'label': 'Neutral & Factual'}, {'value': 'Condescending', 'label': 'Condescending or Dismissive'}]},
+    ],
+    'flags': [],
+}
+
+# Page config of each app, by module name
+PAGE_CONFIGS = {'main_pairs': PAIRS_PAGE_CONFIG, 'main_single': SINGLE_PAGE_CONFIG}
@@ -0,0 +1,183 @@
+import argparse
+import hashlib
+import heapq
+import itertools
+import sys
+from collections import Counter
+
+from dataset_io import DatasetError, iter_chunks, write_records
+
+# Stratified random sampling of large CSV or Parquet files in one streaming
+# pass, to annotate a reproducible subset instead of a whole generation run.
+#
+#   python sampling.py data/generated/pairs_usa_p1__usa_p2.csv -n 2000 --strata is_localizable_manual Variant1 -o sample.csv
+#
+# Every row gets a pseudo-random priority from a hash of the seed and its row
+# number, and each stratum keeps the rows with the smallest priorities seen so
+# far (a bottom-k reservoir, kept as a heap). The rows kept for a stratum are a uniform sample
+# of it, whatever the chunk size, and the same seed always picks the same
+# rows.
+#
+# After the pass, the sample size is split across strata: 'balanced' gives
+# every stratum the same share (strata that are too small give their unused
+# share to the others), 'proportional' follows the stratum sizes.
+#
+# With 'balanced', the share a stratum can end up with only shrinks as rows
+# and strata are added, so after each chunk the reservoirs are trimmed to the
+# share the counts seen so far allow, and memory stays around the sample size
+# plus the number of strata. A 'proportional' share can still grow, up to the
+# whole sample for a stratum that turns out to dominate the file, so there
+# every reservoir keeps up to sample_size rows and memory is bounded by the
+# sample size times the number of strata.
+
+ALLOCATIONS = ('balanced', 'proportional')
+
+
+def row_priorities(row_numbers, seed):
+    # Uniform pseudo-random uint64 priorities from a splitmix64 finalizer.
+    import numpy as np
+    salt = int.from_bytes(hashlib.sha256(f'sample:{seed}'.encode('utf-8')).digest()[:8], 'little')
+    x = row_numbers.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) ^ np.uint64(salt)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def allocate(population, sample_size, allocation='balanced'):
+    # Splits sample_size across strata given their population sizes.
+    if allocation not in ALLOCATIONS:
+        raise ValueError(f'Unknown allocation: {allocation}')
+    quota = {key: 0 for key in population}
+    remaining = min(sample_size, sum(population.values()))
+    if allocation == 'proportional':
+        total = sum(population.values())
+        exact = {key: remaining * n / total for key, n in population.items()}
+        quota = {key: int(share) for key, share in exact.items()}
+        # Largest remainders get the rows lost to rounding
+        left = remaining - sum(quota.values())
+        for key in sorted(exact, key=lambda k: quota[k] - exact[k])[:left]:
+            quota[key] += 1
+        return quota
+    open_strata = [key for key in population if population[key] > 0]
+    while remaining > 0 and open_strata:
+        share = max(1, remaining // len(open_strata))
+        for key in list(open_strata):
+            take = min(share, population[key] - quota[key], remaining)
+            quota[key] += take
+            remaining -= take
+            if quota[key] == population[key]:
+                open_strata.remove(key)
+            if remaining == 0:
+                break
+    return quota
+
+
+def balanced_limit(population, sample_size):
+    # Upper bound on the 'balanced' share of any stratum, given the population
+    # counted so far. Strata are filled up to a common level, smallest first;
+    # more rows can only lower that level.
+    sizes = sorted(population.values())
+    remaining = sample_size
+    for i, size in enumerate(sizes):
+        open_count = len(sizes) - i
+        if size * open_count >= remaining:
+            # Rounding gives some strata one row above the level
+            return min(sample_size, remaining // open_count + 1)
+        remaining -= size
+    return sample_size
+
+
+def stratified_sample(chunks, sample_size, strata=(), seed=0, allocation='balanced'):
+    # Samples sample_size rows from an iterable of (columns, rows) chunks.
+    # Returns (columns, sampled rows in input order, {stratum: (population, sampled)}).
+    import numpy as np
+    strata = list(strata)
+    reservoirs = {}
+    population = Counter()
+    columns = None
+    row_offset = 0
+    limit = sample_size
+    for chunk_columns, rows in chunks:
+        if columns is None:
+            columns = chunk_columns
+            missing = [col for col in strata if col not in columns]
+            if missing:
+                raise DatasetError(f'Cannot sample by missing columns: {", ".join(missing)}. Available columns: {", ".join(columns)}')
+        priorities = row_priorities(np.arange(row_offset, row_offset + len(rows)), seed).tolist()
+        if strata:
+            keys = list(zip(*[[row.get(col) for row in rows] for col in strata]))
+        else:
+            keys = [()] * len(rows)
+        population.update(keys)
+        for row_number, key, priority, row in zip(itertools.count(row_offset), keys, priorities, rows):
+            # Max-heap on priority: the root is the k-th smallest kept so far
+            reservoir = reservoirs.get(key)
+            if reservoir is None:
+                reservoir = reservoirs[key] = []
+            if len(reservoir) < limit:
+                heapq.heappush(reservoir, (-priority, row_number, row))
+            elif reservoir and priority < -reservoir[0][0]:
+                heapq.heapreplace(reservoir, (-priority, row_number, row))
+        row_offset += len(rows)
+        if allocation == 'balanced':
+            limit = balanced_limit(population, sample_size)
+            for reservoir in reservoirs.values():
+                # Drops the highest priorities, which no later share can reach
+                while len(reservoir) > limit:
+                    heapq.heappop(reservoir)
+
+    if columns is None:
+        raise DatasetError('CSV file is empty. Please upload a file with data.')
+    quota = allocate(population, sample_size, allocation)
+    sample = []
+    for key, reservoir in reservoirs.items():
+        # Lowest priorities first
+        sample.extend(sorted(reservoir, reverse=True)[:quota[key]])
+    sample.sort(key=lambda item: item[1])
+    summary = {key: (population[key], quota[key]) for key in population}
+    return columns, [row for _, _, row in sample], summary
+
+
+def parse_sample_options(size_text, strata_text):
+    # Reads the upload form's sampling fields. Returns None when no sample
+    # size was given, else (size, list of strata columns).
+    size_text = (size_text or '').strip()
+    if not size_text:
+        return None
+    if not size_text.isdigit() or int(size_text) < 1:
+        raise DatasetError('The sample size must be a positive whole number.')
+    strata = [col.strip() for col in (strata_text or '').split(',') if col.strip()]
+    return int(size_text), strata
+
+
+def sample_records(path, sample_size, strata=(), seed=0, allocation='balanced', progress=None):
+    # Samples a CSV or Parquet file and returns (columns, rows as dicts), like
+    # dataset_io.read_records.
+    columns, sample, _ = stratified_sample(iter_chunks(path, progress=progress), sample_size, strata, seed, allocation)
+    return columns, sample
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Draw a reproducible stratified sample from a large CSV or Parquet file.')
+    parser.add_argument('input', help='Input CSV or Parquet file')
+    parser.add_argument('-n', '--size', type=int, required=True, help='Number of rows to sample')
+    parser.add_argument('-o', '--out', required=True, help='Output CSV')
+    parser.add_argument('--strata', nargs='*', default=[], help='Columns whose value combinations are sampled separately')
+    parser.add_argument('--allocation', choices=ALLOCATIONS, default='balanced')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    try:
+        columns, sample, summary = stratified_sample(iter_chunks(args.input), args.size, args.strata, args.seed, args.allocation)
+    except DatasetError as e:
+        raise SystemExit(str(e))
+    write_records(args.out, columns, sample)
+    for key, (population, sampled) in sorted(summary.items(), key=lambda item: str(item[0])):
+        label = ', '.join(f'{col}={value}' for col, value in zip(args.strata, key)) or 'all rows'
+        print(f'{label}: {sampled} of {population}')
+    print(f'Wrote {len(sample)} rows to {args.out} (seed {args.seed}).')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+// Polls a background job (file upload, export or LLM judge) and follows its result when done
+(function() {
+    const jobId = document.getElementById('job').dataset.jobId;
+    const bar = document.getElementById('jobBar');
+    const statusText = document.getElementById('jobStatus');
+
+    function formatBytes(bytes) {
+        if (bytes < 1024) return bytes + ' B';
+        if (bytes < 1024 * 1024) return (bytes / 1024).toFixed(1) + ' KB';
+        return (bytes / (1024 * 1024)).toFixed(1) + ' MB';
+    }
+
+    function showProgress(job) {
+        const p = job.progress || {};
+        let fraction = 0;
+        if (job.kind === 'upload') {
+            if (p.total_bytes) fraction = p.bytes / p.total_bytes;
+            statusText.textContent = `${(p.rows || 0).toLocaleString()} rows parsed (${formatBytes(p.bytes || 0)} of ${formatBytes(p.total_bytes || 0)})`;
+        } else if (job.kind === 'judge') {
+            if (p.total_rows) fraction = p.rows / p.total_rows;
+            statusText.textContent = `${(p.rows || 0).toLocaleString()} of ${(p.total_rows || 0).toLocaleString()} rows judged` + (p.failed ? ` (${p.failed.toLocaleString()} failed)` : '');
+        } else {
+            if (p.total_rows) fraction = p.rows / p.total_rows;
+            statusText.textContent = `${(p.rows || 0).toLocaleString()} of ${(p.total_rows || 0).toLocaleString()} rows written (${formatBytes(p.bytes || 0)})`;
+        }
+        bar.style.width = Math.round(Math.min(1, fraction) * 100) + '%';
+    }
+
+    function showError(message) {
+        const error = document.getElementById('jobError');
+        error.textContent = message;
+        error.classList.remove('hidden');
+        document.getElementById('jobLinks').classList.remove('hidden');
+    }
+
+    async function poll() {
+        let job;
+        try {
+            const resp = await fetch(`/api/jobs/${jobId}`, {cache: 'no-store'});
+            job = await resp.json();
+        } catch (e) {
+            setTimeout(poll, 2000);
+            return;
+        }
+        if (job.status === 'error') {
+            showError(job.error || 'Something went wrong.');
+            return;
+        }
+        showProgress(job);
+        if (job.status !== 'done') {
+            setTimeout(poll, 500);
+            return;
+        }
+        if (job.kind === 'export') {
+            // Start the download and offer to repeat it
+            const link = document.getElementById('jobDownload');
+            link.href = job.redirect;
+            link.classList.remove('hidden');
+            document.getElementById('jobLinks').classList.remove('hidden');
+            document.getElementById('jobTitle').textContent = 'Download ready';
+        }
+        window.location.href = job.redirect;
+    }
+
+    poll();
+})();
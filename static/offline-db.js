@@ -0,0 +1,144 @@
+// IndexedDB storage and sync shared by the offline page and the service worker.
+// Stores: 'items' (downloaded items, keyed by index), 'pending' (the latest
+// unsynced annotation per item, keyed by index) and 'meta' (key/value).
+
+const OfflineDB = (() => {
+    const DB_NAME = 'annotate-offline';
+    const SYNC_BATCH_SIZE = 200;
+    let dbPromise = null;
+
+    function open() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const req = indexedDB.open(DB_NAME, 1);
+                req.onupgradeneeded = () => {
+                    const db = req.result;
+                    db.createObjectStore('items', { keyPath: 'index' });
+                    db.createObjectStore('pending', { keyPath: 'index' });
+                    db.createObjectStore('meta');
+                };
+                req.onsuccess = () => resolve(req.result);
+                req.onerror = () => reject(req.error);
+            });
+        }
+        return dbPromise;
+    }
+
+    function run(storeNames, mode, fn) {
+        // Runs fn(stores) in one transaction and resolves with its result when it commits
+        return open().then(db => new Promise((resolve, reject) => {
+            const tx = db.transaction(storeNames, mode);
+            const stores = {};
+            [].concat(storeNames).forEach(name => stores[name] = tx.objectStore(name));
+            let result;
+            new Promise(res => res(fn(stores))).then(value => result = value, err => { tx.abort(); reject(err); });
+            tx.oncomplete = () => resolve(result);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        }));
+    }
+
+    function request(req) {
+        return new Promise((resolve, reject) => {
+            req.onsuccess = () => resolve(req.result);
+            req.onerror = () => reject(req.error);
+        });
+    }
+
+    const getMeta = key => run('meta', 'readonly', s => request(s.meta.get(key)));
+    const setMeta = (key, value) => run('meta', 'readwrite', s => { s.meta.put(value, key); });
+    const getItem = index => run('items', 'readonly', s => request(s.items.get(index)));
+    const countItems = () => run('items', 'readonly', s => request(s.items.count()));
+    const countPending = () => run('pending', 'readonly', s => request(s.pending.count()));
+    const lastItemIndex = () => run('items', 'readonly', s => request(s.items.openCursor(null, 'prev')).then(c => c ? c.key : -1));
+
+    function putItems(items) {
+        // Stores downloaded items without overwriting local edits that are still pending
+        return run(['items', 'pending'], 'readwrite', async s => {
+            for (const item of items) {
+                const pending = await request(s.pending.get(item.index));
+                if (pending) {
+                    item.annotation = pending.annotation;
+                    item.version = pending.base_version;
+                }
+                s.items.put(item);
+            }
+        });
+    }
+
+    function saveAnnotation(index, annotation) {
+        // Records an annotation locally and queues it for sync
+        return run(['items', 'pending'], 'readwrite', async s => {
+            const item = await request(s.items.get(index));
+            const pending = await request(s.pending.get(index));
+            const baseVersion = pending ? pending.base_version : item.version;
+            item.annotation = annotation;
+            s.items.put(item);
+            s.pending.put({ index: index, base_version: baseVersion, annotation: annotation, seq: Date.now() + Math.random() });
+        });
+    }
+
+    function clear() {
+        return run(['items', 'pending', 'meta'], 'readwrite', s => {
+            s.items.clear();
+            s.pending.clear();
+            s.meta.clear();
+        });
+    }
+
+    async function gzipBody(text) {
+        // Compresses the sync payload when the browser supports CompressionStream
+        if (typeof CompressionStream === 'undefined') {
+            return { body: text, headers: { 'Content-Type': 'application/json' } };
+        }
+        const stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'));
+        const body = await new Response(stream).arrayBuffer();
+        return { body: body, headers: { 'Content-Type': 'application/json', 'Content-Encoding': 'gzip' } };
+    }
+
+    async function syncPending() {
+        // Sends pending annotations in batches. Returns {synced, conflicts}.
+        const datasetId = await getMeta('dataset_id');
+        let synced = 0, conflicts = 0;
+        while (true) {
+            const batch = await run('pending', 'readonly', s => request(s.pending.getAll(null, SYNC_BATCH_SIZE)));
+            if (!batch.length) break;
+            const payload = await gzipBody(JSON.stringify({ dataset_id: datasetId, annotations: batch }));
+            const resp = await fetch('/api/sync', { method: 'POST', headers: payload.headers, body: payload.body });
+            if (!resp.ok) throw new Error(`Sync failed with status ${resp.status}`);
+            const data = await resp.json();
+            const sentSeq = new Map(batch.map(record => [record.index, record.seq]));
+            await run(['items', 'pending'], 'readwrite', async s => {
+                for (const result of data.results) {
+                    // Entries the server could not read have no index to look up
+                    if (typeof result.index !== 'number') continue;
+                    const item = await request(s.items.get(result.index));
+                    const pending = await request(s.pending.get(result.index));
+                    if (pending && pending.seq !== sentSeq.get(result.index)) {
+                        // Edited again while the batch was in flight: keep the newer edit queued
+                        if (result.status === 'ok') {
+                            pending.base_version = result.version;
+                            s.pending.put(pending);
+                        }
+                        continue;
+                    }
+                    if (result.status === 'ok' && item) {
+                        item.version = result.version;
+                    } else if (result.status === 'conflict' && item) {
+                        // The server has a newer annotation; it wins over the local edit
+                        item.version = result.version;
+                        item.annotation = result.annotation;
+                        conflicts += 1;
+                    }
+                    if (item) s.items.put(item);
+                    s.pending.delete(result.index);
+                }
+            });
+            synced += data.results.length;
+        }
+        if (conflicts) await setMeta('conflicts', ((await getMeta('conflicts')) || 0) + conflicts);
+        return { synced: synced, conflicts: conflicts };
+    }
+
+    return { getMeta, setMeta, getItem, countItems, countPending, lastItemIndex, putItems, saveAnnotation, clear, syncPending };
+})();
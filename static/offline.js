@@ -0,0 +1,194 @@
+// Offline annotation page: renders items from IndexedDB and syncs in the background.
+const config = JSON.parse(document.getElementById('offline-config').textContent);
+const BLOCK_SIZE = 200;
+const SYNC_INTERVAL_MS = 30000;
+
+let currentIndex = 0;
+let currentItem = null;
+let choices = {};
+let syncing = false;
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+async function setStatus(message) {
+    // Shows connectivity, local item count, pending annotations and conflicts
+    const [items, pending, conflicts] = await Promise.all([OfflineDB.countItems(), OfflineDB.countPending(), OfflineDB.getMeta('conflicts')]);
+    const state = navigator.onLine ? 'Online' : 'Offline';
+    let text = `${state} · ${items} items stored · ${pending} waiting to sync`;
+    if (conflicts) text += ` · ${conflicts} replaced by newer server annotations`;
+    if (message) text += ` · ${message}`;
+    document.getElementById('syncStatus').textContent = text;
+}
+
+async function downloadBlock() {
+    // Fetches the next block of items after the last one stored locally
+    const start = (await OfflineDB.lastItemIndex()) + 1;
+    const resp = await fetch(`/api/items?start=${start}&count=${BLOCK_SIZE}`);
+    if (!resp.ok) throw new Error(`Download failed with status ${resp.status}`);
+    const data = await resp.json();
+    const datasetId = await OfflineDB.getMeta('dataset_id');
+    if (datasetId && datasetId !== data.dataset_id) {
+        // A new file was uploaded on the server: pending edits cannot be applied to it
+        await OfflineDB.clear();
+        return downloadBlock();
+    }
+    await OfflineDB.setMeta('dataset_id', data.dataset_id);
+    await OfflineDB.setMeta('total', data.total);
+    await OfflineDB.putItems(data.items);
+    return data.items.length;
+}
+
+async function sync() {
+    // Pushes pending annotations, preferring Background Sync so it also runs after the page is closed
+    if (syncing || !navigator.onLine) return setStatus();
+    syncing = true;
+    try {
+        const result = await OfflineDB.syncPending();
+        await setStatus(result.synced ? `synced ${result.synced}` : '');
+        if (result.conflicts) await showItem(currentIndex);
+    } catch (err) {
+        await setStatus('sync failed, will retry');
+        const registration = await navigator.serviceWorker?.ready;
+        if (registration && registration.sync) registration.sync.register('sync-annotations').catch(() => {});
+    } finally {
+        syncing = false;
+    }
+}
+
+function renderPanels(item) {
+    const [question, ...answers] = config.panels;
+    const answerCols = answers.length > 1 ? 'grid-cols-2' : 'grid-cols-1';
+    let html = `<div class='font-semibold mb-2'>${escapeHtml(question.label)}:</div>`;
+    html += `<div class='${question.css} rounded-2xl px-4 py-2 max-w-[98%] mb-4'>${item.html[question.column]}</div>`;
+    html += `<div class='grid ${answerCols} gap-6'>`;
+    answers.forEach(panel => {
+        html += `<div class='flex flex-col'><div class='font-semibold mb-1 text-center'>${escapeHtml(panel.label)}</div>`;
+        html += `<div class='${panel.css} rounded-2xl px-6 py-2 min-h-[40px] max-w-[95%]'>${item.html[panel.column]}</div></div>`;
+    });
+    document.getElementById('itemPanel').innerHTML = html + '</div>';
+}
+
+function renderRubric(annotation, suggestions) {
+    const rubric = document.getElementById('rubric');
+    rubric.innerHTML = '';
+    choices = {};
+    config.choices.forEach(choice => {
+        choices[choice.key] = annotation[choice.key] || '';
+        const block = document.createElement('div');
+        block.innerHTML = `<div class='mb-1 font-semibold'>${escapeHtml(choice.label)}: <span class='font-normal text-gray-600'>${escapeHtml(choice.description || '')}</span></div>`;
+        const row = document.createElement('div');
+        row.className = 'flex items-center gap-4 mb-2';
+        choice.options.forEach(option => {
+            const btn = document.createElement('button');
+            btn.type = 'button';
+            btn.className = 'px-4 py-1 rounded border bg-gray-100 border-gray-300';
+            btn.textContent = option.label;
+            btn.dataset.key = choice.key;
+            btn.dataset.value = option.value;
+            btn.addEventListener('click', () => {
+                choices[choice.key] = option.value;
+                updateRubric();
+            });
+            row.appendChild(btn);
+        });
+        block.appendChild(row);
+        rubric.appendChild(block);
+    });
+    if (config.flags.length) {
+        // Until the item is annotated, suggested flags are shown ticked
+        const annotated = Object.keys(annotation).length > 0;
+        const flags = document.createElement('div');
+        flags.className = 'flex flex-col gap-1';
+        config.flags.forEach(flag => {
+            const label = document.createElement('label');
+            label.className = 'flex items-center gap-2';
+            const suggested = !!suggestions[flag.key];
+            label.innerHTML = `<input type='checkbox' class='h-4 w-4' data-flag='${flag.key}'><span>${escapeHtml(flag.label)}${suggested ? " <span class='text-gray-500 text-xs'>(suggested)</span>" : ''}</span>`;
+            label.querySelector('input').checked = annotated ? !!annotation[flag.key] : suggested;
+            flags.appendChild(label);
+        });
+        rubric.appendChild(flags);
+    }
+    document.getElementById('Comments').value = annotation.Comments || '';
+    updateRubric();
+}
+
+function updateRubric() {
+    // Highlights selected options and enables 'Next' once every criterion has a value
+    document.querySelectorAll('#rubric button').forEach(btn => {
+        const selected = choices[btn.dataset.key] === btn.dataset.value;
+        btn.classList.toggle('ring-2', selected);
+        btn.classList.toggle('ring-green-500', selected);
+    });
+    const complete = config.choices.every(choice => choices[choice.key]);
+    const nextButton = document.getElementById('nextButton');
+    nextButton.disabled = !complete;
+    nextButton.classList.toggle('opacity-50', !complete);
+    nextButton.classList.toggle('cursor-not-allowed', !complete);
+}
+
+function collectAnnotation(skip) {
+    const annotation = { Comments: skip ? '' : document.getElementById('Comments').value };
+    config.choices.forEach(choice => annotation[choice.key] = skip ? '' : choices[choice.key]);
+    document.querySelectorAll('#rubric input[data-flag]').forEach(input => annotation[input.dataset.flag] = skip ? false : input.checked);
+    return annotation;
+}
+
+async function showItem(index) {
+    let item = await OfflineDB.getItem(index);
+    if (!item && navigator.onLine) {
+        await downloadBlock().catch(() => 0);
+        item = await OfflineDB.getItem(index);
+    }
+    if (!item) {
+        await setStatus(`item ${index + 1} is not downloaded yet`);
+        return false;
+    }
+    currentIndex = index;
+    currentItem = item;
+    await OfflineDB.setMeta('current_index', index);
+    const total = await OfflineDB.getMeta('total');
+    document.getElementById('itemTitle').textContent = `Question #${index + 1} of ${total}`;
+    renderPanels(item);
+    renderRubric(item.annotation || {}, item.suggestions || {});
+    window.scrollTo(0, 0);
+    return true;
+}
+
+async function saveAndMove(skip, step) {
+    await OfflineDB.saveAnnotation(currentIndex, collectAnnotation(skip));
+    await setStatus();
+    await showItem(currentIndex + step);
+    sync();
+}
+
+document.getElementById('nextButton').addEventListener('click', () => saveAndMove(false, 1));
+document.getElementById('skipButton').addEventListener('click', () => saveAndMove(true, 1));
+document.getElementById('previousButton').addEventListener('click', () => currentIndex > 0 && showItem(currentIndex - 1));
+document.getElementById('syncButton').addEventListener('click', sync);
+document.getElementById('downloadButton').addEventListener('click', async () => {
+    try {
+        const count = await downloadBlock();
+        await setStatus(count ? `downloaded ${count} items` : 'all items downloaded');
+    } catch (err) {
+        await setStatus('download failed');
+    }
+});
+window.addEventListener('online', sync);
+window.addEventListener('offline', () => setStatus());
+navigator.serviceWorker?.addEventListener('message', event => {
+    if (event.data === 'annotations-synced') setStatus();
+});
+
+document.addEventListener('DOMContentLoaded', async () => {
+    if ('serviceWorker' in navigator) navigator.serviceWorker.register('/sw.js').catch(() => {});
+    if (navigator.onLine && !(await OfflineDB.countItems())) await downloadBlock().catch(() => 0);
+    await showItem((await OfflineDB.getMeta('current_index')) || 0);
+    await setStatus();
+    sync();
+    setInterval(sync, SYNC_INTERVAL_MS);
+});
@@ -0,0 +1,145 @@
+// Overview grid: only the lines in view exist in the DOM, and lines are
+// fetched a page at a time as they scroll into view.
+const config = JSON.parse(document.getElementById('overview-config').textContent);
+const ROW_HEIGHT = 36;
+const PAGE_SIZE = 200;
+const OVERSCAN = 10;
+const STATUS_LABELS = {completed: 'Done', skipped: 'Skipped', todo: ''};
+const STATUS_CLASSES = {completed: 'text-green-800', skipped: 'text-yellow-600', todo: 'text-gray-500'};
+const COLUMNS = `5rem minmax(0,1fr) 5rem repeat(${config.choices.length}, 8rem) 5rem`;
+
+const viewport = document.getElementById('gridViewport');
+const spacer = document.getElementById('gridSpacer');
+const rowsElement = document.getElementById('gridRows');
+const filterSelect = document.getElementById('overviewFilter');
+
+let filter = 'all';
+let total = 0;
+let current = -1;
+let pages = new Map();
+let loading = new Set();
+// Bumped when the filter changes, so late responses for the old one are dropped
+let generation = 0;
+
+const optionLabels = {};
+for (const choice of config.choices) {
+    optionLabels[choice.key] = Object.fromEntries(choice.options.map(o => [o.value, o.label]));
+}
+
+// Escapes quotes too: questions and comments also go into title attributes
+const HTML_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+
+function escapeHtml(text) {
+    return String(text ?? '').replace(/[&<>"']/g, c => HTML_ESCAPES[c]);
+}
+
+function renderHeader() {
+    const header = document.getElementById('gridHeader');
+    header.style.gridTemplateColumns = COLUMNS;
+    const labels = ['#', 'Question', 'Status', ...config.choices.map(c => c.label), 'Comment'];
+    header.innerHTML = labels.map(label => `<div class="truncate" title="${escapeHtml(label)}">${escapeHtml(label)}</div>`).join('');
+}
+
+function updateTotals(totals) {
+    for (const option of filterSelect.options) {
+        option.textContent = `${config.filters[option.value]} (${totals[option.value]})`;
+    }
+    document.getElementById('overviewTotal').textContent = `${total} items`;
+}
+
+async function loadPage(page) {
+    if (pages.has(page) || loading.has(page)) return;
+    loading.add(page);
+    const requested = generation;
+    try {
+        const resp = await fetch(`/api/overview?show=${filter}&start=${page * PAGE_SIZE}&count=${PAGE_SIZE}`, {cache: 'no-store'});
+        if (!resp.ok) throw new Error(`Loading failed with status ${resp.status}`);
+        const data = await resp.json();
+        if (requested !== generation) return;
+        pages.set(page, data.rows);
+        total = data.total;
+        current = data.current;
+        spacer.style.height = `${total * ROW_HEIGHT}px`;
+        updateTotals(data.totals);
+        render();
+    } catch (err) {
+        document.getElementById('overviewTotal').textContent = err.message;
+    } finally {
+        loading.delete(page);
+    }
+}
+
+function renderRow(row) {
+    const choices = config.choices.map(choice => {
+        const value = row.choices[choice.key];
+        const label = value ? (optionLabels[choice.key][value] || value) : '';
+        return `<div class="truncate">${escapeHtml(label)}</div>`;
+    }).join('');
+    const highlight = row.index === current ? ' bg-blue-50' : '';
+    return `<div class="grid gap-2 px-4 items-center border-b text-sm cursor-pointer hover:bg-gray-100${highlight}" data-index="${row.index}" style="height: ${ROW_HEIGHT}px; grid-template-columns: ${COLUMNS}">
+        <div class="text-gray-500">${row.index + 1}</div>
+        <div class="truncate" title="${escapeHtml(row.question)}">${escapeHtml(row.question)}</div>
+        <div class="${STATUS_CLASSES[row.status]}">${STATUS_LABELS[row.status]}</div>
+        ${choices}
+        <div class="truncate text-gray-600" title="${escapeHtml(row.comment)}">${row.comment ? '💬' : ''}</div>
+    </div>`;
+}
+
+function render() {
+    // Draws the lines in view, plus OVERSCAN above and below, and requests
+    // the pages they are on
+    const first = Math.max(0, Math.floor(viewport.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const last = Math.min(total, Math.ceil((viewport.scrollTop + viewport.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+    let html = '';
+    for (let i = first; i < last; i++) {
+        const page = Math.floor(i / PAGE_SIZE);
+        const rows = pages.get(page);
+        const row = rows && rows[i - page * PAGE_SIZE];
+        if (row) {
+            html += renderRow(row);
+        } else {
+            if (!rows) loadPage(page);
+            html += `<div class="px-4 border-b text-sm text-gray-500" style="height: ${ROW_HEIGHT}px"></div>`;
+        }
+    }
+    rowsElement.style.transform = `translateY(${first * ROW_HEIGHT}px)`;
+    rowsElement.innerHTML = html;
+}
+
+function reload() {
+    generation++;
+    pages = new Map();
+    loading = new Set();
+    loadPage(Math.floor(viewport.scrollTop / ROW_HEIGHT / PAGE_SIZE));
+}
+
+let scheduled = false;
+viewport.addEventListener('scroll', () => {
+    if (scheduled) return;
+    scheduled = true;
+    requestAnimationFrame(() => {
+        scheduled = false;
+        render();
+    });
+});
+
+rowsElement.addEventListener('click', async event => {
+    const line = event.target.closest('[data-index]');
+    if (!line) return;
+    const resp = await fetch('/api/goto', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({index: Number(line.dataset.index)}),
+    });
+    if (resp.ok) window.location.href = '/annotate';
+});
+
+filterSelect.addEventListener('change', () => {
+    filter = filterSelect.value;
+    viewport.scrollTop = 0;
+    reload();
+});
+document.getElementById('refreshButton').addEventListener('click', reload);
+
+renderHeader();
+loadPage(0);
@@ -0,0 +1,156 @@
+// Criteria keys are passed from the backend for JS validation
+const config = JSON.parse(document.getElementById('annotation-config').textContent);
+const requiredCriteria = config.requiredCriteria;
+const allIssueKeys = config.allIssueKeys;
+
+function handlePairwiseClick(criterion, value) {
+    // Logic to handle button clicks for pairwise comparison and update UI
+    ['LLM_1', 'LLM_2', 'NO_PREF'].forEach(val => {
+        document.getElementById(`${criterion}_${val}`).classList.remove('ring-2', 'ring-green-500', 'ring-blue-500', 'ring-gray-400');
+    });
+    const ringColor = value === 'LLM_1' ? 'ring-green-500' : value === 'LLM_2' ? 'ring-blue-500' : 'ring-gray-400';
+    document.getElementById(`${criterion}_${value}`).classList.add('ring-2', ringColor);
+    document.getElementById(`${criterion}_winner`).value = value;
+    checkNextButton();
+}
+
+function checkNextButton() {
+    // Enable 'Next' button only when all required criteria are selected
+    const allSelected = requiredCriteria.every(crit => document.getElementById(`${crit}_winner`).value);
+    const nextButton = document.getElementById('nextButton');
+    if (allSelected) {
+        nextButton.disabled = false;
+        nextButton.classList.remove('opacity-50', 'cursor-not-allowed');
+    } else {
+        nextButton.disabled = true;
+        nextButton.classList.add('opacity-50', 'cursor-not-allowed');
+    }
+}
+
+// Run on page load to set initial button state
+document.addEventListener('DOMContentLoaded', checkNextButton);
+
+function getFormData() {
+    // Helper to gather all form data into a single payload object
+    const index = parseInt(document.getElementById('index').value);
+    let payload = { index: index, base_version: currentVersion(), Comments: document.getElementById('Comments').value };
+
+    // Get pairwise winners
+    requiredCriteria.forEach(crit => {
+        payload[`${crit}_winner`] = document.getElementById(`${crit}_winner`).value;
+    });
+
+    // Get common issues for both LLMs
+    [1, 2].forEach(llmNum => {
+        allIssueKeys.forEach(issueKey => {
+            payload[`LLM_${llmNum}_${issueKey}`] = document.getElementById(`llm${llmNum}_issue_${issueKey.toLowerCase()}`).checked;
+        });
+    });
+    return payload;
+}
+
+async function submitAnnotation() {
+    // Submit the current annotation and move to the next item
+    const payload = getFormData();
+    if (!(await postAnnotation(payload))) return;
+    navigate('next');
+}
+
+async function skipAnnotation() {
+    // Skip the current item by submitting an empty annotation
+    const index = parseInt(document.getElementById('index').value);
+    let payload = { index: index, base_version: currentVersion() };
+    requiredCriteria.forEach(crit => payload[`${crit}_winner`] = '');
+    [1, 2].forEach(llmNum => allIssueKeys.forEach(key => payload[`LLM_${llmNum}_${key}`] = false));
+    payload['Comments'] = '';
+    if (!(await postAnnotation(payload))) return;
+    navigate('next');
+}
+
+async function confirmFinishYes() {
+    // Save the current annotation and redirect to the finish page
+    document.getElementById('finishConfirmModal').classList.add('hidden');
+    const payload = getFormData();
+    if (!(await postAnnotation(payload))) return;
+    window.location.href = '/finish';
+}
+
+function confirmFinishNo() {
+    // Hide the confirmation modal
+    document.getElementById('finishConfirmModal').classList.add('hidden');
+}
+
+function showFinishConfirm() {
+    // Show the confirmation modal
+    document.getElementById('finishConfirmModal').classList.remove('hidden');
+}
+
+function currentVersion() {
+    // Version of the item this page was rendered with
+    return parseInt(document.getElementById('version').value);
+}
+
+async function postAnnotation(payload) {
+    // Central function to POST annotation data to the backend.
+    // Returns false (and tells the annotator) if the annotation was not saved.
+    try {
+        const resp = await fetch('/api/annotate', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(payload)
+        });
+        if (resp.ok) return true;
+        if (resp.status === 409) {
+            // Someone else saved this item since the page was loaded: show their version
+            alert('This item was changed in another tab or by another annotator. The page will reload with the latest annotation.');
+            window.location.reload();
+            return false;
+        }
+    } catch (err) {
+        // Network error, handled below
+    }
+    alert('Your annotation could not be saved. Check your connection and try again, or switch to Offline mode.');
+    return false;
+}
+
+async function navigate(direction) {
+    // Navigate between previous/next items
+    await fetch('/api/navigate', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({direction: direction, from_index: parseInt(document.getElementById('index').value)})
+    });
+    window.location.href = '/annotate';
+}
+
+async function showDiff(show) {
+    // Switch both answers between their formatted text and the highlighted differences
+    const toggle = document.getElementById('diffToggle');
+    if (show && toggle.dataset.ready !== '1') {
+        // Not precomputed yet: ask the server to diff this item now
+        try {
+            const resp = await fetch(`/api/diff/${parseInt(document.getElementById('index').value)}`);
+            const diff = await resp.json();
+            document.getElementById('diff1').innerHTML = diff.html1;
+            document.getElementById('diff2').innerHTML = diff.html2;
+            toggle.dataset.ready = '1';
+        } catch (err) {
+            toggle.checked = false;
+            return;
+        }
+    }
+    document.querySelectorAll('[data-view="markdown"]').forEach(el => el.classList.toggle('hidden', show));
+    document.querySelectorAll('[data-view="diff"]').forEach(el => el.classList.toggle('hidden', !show));
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    // Remember the annotator's choice across items
+    const toggle = document.getElementById('diffToggle');
+    if (!toggle) return;
+    toggle.checked = localStorage.getItem('showAnswerDiff') === '1';
+    if (toggle.checked) showDiff(true);
+    toggle.addEventListener('change', () => {
+        localStorage.setItem('showAnswerDiff', toggle.checked ? '1' : '0');
+        showDiff(toggle.checked);
+    });
+});
@@ -0,0 +1,13 @@
+// Enable the save button only once a filename has been entered
+document.getElementById('filename').addEventListener('input', function() {
+    const btn = document.getElementById('saveButton');
+    if (this.value.trim().length > 0) {
+        btn.disabled = false;
+        btn.classList.remove('bg-gray-400', 'cursor-not-allowed');
+        btn.classList.add('bg-blue-500', 'hover:bg-blue-600');
+    } else {
+        btn.disabled = true;
+        btn.classList.add('bg-gray-400', 'cursor-not-allowed');
+        btn.classList.remove('bg-blue-500', 'hover:bg-blue-600');
+    }
+});
@@ -0,0 +1,137 @@
+let ratings = {}
+function handleRatingClick(criterion, value) {
+    ratings[criterion] = value;
+    let options = ratingOptions[criterion];
+    for (let i = 0; i < options.length; i++) {
+        let v = options[i];
+        let btn = document.getElementById(criterion + '_' + v);
+        if (btn) btn.classList.remove('ring-2','ring-green-500','ring-gray-400','ring-red-500','text-green-800','text-gray-700','text-red-600');
+    }
+    // Add correct ring and font color to selected
+    let selectedIdx = ratingOptions[criterion].indexOf(value);
+    let btn = document.getElementById(criterion + '_' + value);
+    if (btn) {
+        if (selectedIdx === 0) {
+            btn.classList.add('ring-2','ring-green-500','text-green-800');
+        } else if (selectedIdx === 1) {
+            btn.classList.add('ring-2','ring-gray-400','text-gray-700');
+        } else if (selectedIdx === 2) {
+            btn.classList.add('ring-2','ring-red-500','text-red-600');
+        }
+    }
+    document.getElementById(criterion + '_rating').value = value;
+    checkNextButton();
+}
+const ratingOptions = {
+    'ContextualRelevance': ['Excellent','Good','Poor'],
+    'PedagogicalQuality': ['Effective','Acceptable','Ineffective'],
+    'Actionability': ['VeryActionable','SomewhatActionable','NotActionable'],
+    'CommunicationStyle': ['Supportive','Neutral','Condescending']
+};
+function checkNextButton() {
+    const cr = document.getElementById('ContextualRelevance_rating').value;
+    const pq = document.getElementById('PedagogicalQuality_rating').value;
+    const ac = document.getElementById('Actionability_rating').value;
+    const cs = document.getElementById('CommunicationStyle_rating').value;
+    const nextButton = document.getElementById('nextButton');
+    if (cr && pq && ac && cs) {
+        nextButton.disabled = false;
+        nextButton.classList.remove('opacity-50', 'cursor-not-allowed');
+        nextButton.classList.add('hover:bg-green-600');
+    } else {
+        nextButton.disabled = true;
+        nextButton.classList.add('opacity-50', 'cursor-not-allowed');
+        nextButton.classList.remove('hover:bg-green-600');
+    }
+}
+document.addEventListener('DOMContentLoaded', function() {
+    checkNextButton();
+});
+async function submitAnnotation() {
+    let index = parseInt(document.getElementById('index').value);
+    let payload = {
+        index: index,
+        base_version: parseInt(document.getElementById('version').value),
+        ContextualRelevance_rating: document.getElementById('ContextualRelevance_rating').value,
+        PedagogicalQuality_rating: document.getElementById('PedagogicalQuality_rating').value,
+        Actionability_rating: document.getElementById('Actionability_rating').value,
+        CommunicationStyle_rating: document.getElementById('CommunicationStyle_rating').value,
+        Comments: document.getElementById('Comments').value
+    };
+    if (await postAnnotation(payload)) {
+        navigate('next');
+    }
+}
+async function postAnnotation(payload) {
+    // Returns false (and tells the annotator) if the annotation was not saved
+    try {
+        let resp = await fetch('/api/annotate', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(payload)
+        });
+        let data = await resp.json();
+        if (data.status === 'success') return true;
+        if (data.status === 'conflict') {
+            // Saved elsewhere since this page was loaded: reload to show the latest annotation
+            alert('This item was changed in another tab or by another annotator. The page will reload with the latest annotation.');
+            window.location.reload();
+            return false;
+        }
+    } catch (err) {
+        // Network error, handled below
+    }
+    alert('Your annotation could not be saved. Check your connection and try again, or switch to Offline mode.');
+    return false;
+}
+async function navigate(direction) {
+    let resp = await fetch('/api/navigate', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({direction: direction, from_index: parseInt(document.getElementById('index').value)})
+    });
+    let data = await resp.json();
+    if (data.index !== undefined) {
+        window.location.href = '/annotate';
+    }
+}
+async function skipAnnotation() {
+    let index = parseInt(document.getElementById('index').value);
+    let payload = {
+        index: index,
+        base_version: parseInt(document.getElementById('version').value),
+        ContextualRelevance_rating: '',
+        PedagogicalQuality_rating: '',
+        Actionability_rating: '',
+        CommunicationStyle_rating: '',
+        Comments: ''
+    };
+    if (await postAnnotation(payload)) {
+        navigate('next');
+    }
+}
+// Show confirmation modal for Finish and Save
+function showFinishConfirm() {
+    document.getElementById('finishConfirmModal').classList.remove('hidden');
+}
+// If user confirms, proceed to finish
+async function confirmFinishYes() {
+    document.getElementById('finishConfirmModal').classList.add('hidden');
+    let index = parseInt(document.getElementById('index').value);
+    let payload = {
+        index: index,
+        base_version: parseInt(document.getElementById('version').value),
+        ContextualRelevance_rating: document.getElementById('ContextualRelevance_rating').value,
+        PedagogicalQuality_rating: document.getElementById('PedagogicalQuality_rating').value,
+        Actionability_rating: document.getElementById('Actionability_rating').value,
+        CommunicationStyle_rating: document.getElementById('CommunicationStyle_rating').value,
+        Comments: document.getElementById('Comments').value
+    };
+    if (await postAnnotation(payload)) {
+        window.location.href = '/finish';
+    }
+}
+// If user cancels, hide modal and stay on annotation
+function confirmFinishNo() {
+    document.getElementById('finishConfirmModal').classList.add('hidden');
+}
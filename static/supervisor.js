@@ -0,0 +1,95 @@
+// Supervisor dashboard: keeps a copy of the numbers from the snapshot and
+// delta events of /api/live and redraws the part that changed.
+const config = JSON.parse(document.getElementById('supervisor-config').textContent);
+let live = {dataset: null, progress: {total: 0, completed: 0, skipped: 0}, annotators: {}, results: {}};
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function ago(seconds) {
+    const elapsed = Math.max(0, Date.now() / 1000 - seconds);
+    if (elapsed < 60) return 'just now';
+    if (elapsed < 3600) return `${Math.floor(elapsed / 60)} min ago`;
+    return `${Math.floor(elapsed / 3600)} h ago`;
+}
+
+function renderProgress() {
+    const {total, completed, skipped} = live.progress;
+    const percentage = total ? completed / total * 100 : 0;
+    document.getElementById('datasetName').textContent = live.dataset || 'no file loaded';
+    document.getElementById('progressText').textContent = `Annotated ${completed} of ${total} (${percentage.toFixed(1)}% done)`;
+    document.getElementById('skippedText').textContent = `Skipped: ${skipped}`;
+    document.getElementById('progressBar').style.width = `${percentage}%`;
+}
+
+function renderAnnotators() {
+    const names = Object.keys(live.annotators).sort((a, b) => live.annotators[b].last_seen - live.annotators[a].last_seen);
+    if (!names.length) {
+        document.getElementById('annotators').innerHTML = '<div class="text-gray-500">Nobody has saved an annotation yet.</div>';
+        return;
+    }
+    const header = ['Annotator', 'Saved', 'Completed', 'Skipped', 'Per hour', 'Last save']
+        .map(label => `<div class="font-semibold text-gray-700">${label}</div>`).join('');
+    const rows = names.map(name => {
+        const a = live.annotators[name];
+        return `<div class="truncate">${escapeHtml(name)}</div><div>${a.saved}</div><div>${a.completed}</div>`
+            + `<div>${a.skipped}</div><div>${a.per_hour}</div><div class="text-gray-500">${ago(a.last_seen)}</div>`;
+    }).join('');
+    document.getElementById('annotators').innerHTML =
+        `<div class="grid gap-2" style="grid-template-columns: minmax(0,2fr) repeat(5, minmax(0,1fr))">${header}${rows}</div>`;
+}
+
+function renderResults() {
+    document.getElementById('results').innerHTML = config.choices.map(choice => {
+        const counts = live.results[choice.key] || {};
+        const total = Object.values(counts).reduce((sum, n) => sum + n, 0);
+        const options = choice.options.map(option => {
+            const n = counts[option.value] || 0;
+            const share = total ? n / total * 100 : 0;
+            return `<div class="flex items-center gap-2">
+                <div class="truncate" style="width: 12rem">${escapeHtml(option.label)}</div>
+                <div class="w-full bg-gray-200 rounded-full h-2"><div class="bg-blue-500 h-2 rounded-full" style="width: ${share}%"></div></div>
+                <div class="text-gray-600" style="width: 8rem">${n} (${share.toFixed(0)}%)</div>
+            </div>`;
+        }).join('');
+        return `<div><div class="font-medium mb-1">${escapeHtml(choice.label)}</div><div class="flex flex-col gap-1">${options}</div></div>`;
+    }).join('');
+}
+
+const source = new EventSource('/api/live');
+source.addEventListener('snapshot', event => {
+    live = JSON.parse(event.data);
+    renderProgress();
+    renderAnnotators();
+    renderResults();
+});
+source.addEventListener('delta', event => {
+    const delta = JSON.parse(event.data);
+    if (delta.reset) {
+        // Another file was loaded
+        live = {...delta, annotators: delta.annotators || {}};
+        renderProgress();
+        renderAnnotators();
+        renderResults();
+        return;
+    }
+    if (delta.progress) {
+        live.progress = delta.progress;
+        renderProgress();
+    }
+    if (delta.annotators) {
+        Object.assign(live.annotators, delta.annotators);
+        renderAnnotators();
+    }
+    if (delta.results) {
+        Object.assign(live.results, delta.results);
+        renderResults();
+    }
+});
+source.addEventListener('open', () => document.getElementById('liveStatus').textContent = 'Live');
+// EventSource reconnects by itself, and the server sends a new snapshot
+source.addEventListener('error', () => document.getElementById('liveStatus').textContent = 'Reconnecting...');
+setInterval(renderAnnotators, 30000);
@@ -0,0 +1,42 @@
+// Service worker for offline annotation. SHELL_URLS is prepended by the /sw.js endpoint.
+importScripts(SHELL_URLS.find(url => url.startsWith('/static/offline-db.js')));
+
+const CACHE_NAME = 'annotate-shell-' + SHELL_URLS.map(url => url.split('v=')[1] || '').join('-');
+
+self.addEventListener('install', event => {
+    event.waitUntil(caches.open(CACHE_NAME).then(cache => cache.addAll(SHELL_URLS)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    // Drop shells cached by previous deploys
+    event.waitUntil(caches.keys()
+        .then(keys => Promise.all(keys.filter(key => key.startsWith('annotate-shell-') && key !== CACHE_NAME).map(key => caches.delete(key))))
+        .then(() => self.clients.claim()));
+});
+
+self.addEventListener('fetch', event => {
+    const url = new URL(event.request.url);
+    if (event.request.method !== 'GET' || url.origin !== self.location.origin) return;
+    if (url.pathname.startsWith('/static/')) {
+        // Versioned assets never change: serve from cache first
+        event.respondWith(caches.match(event.request).then(hit => hit || fetch(event.request)));
+    } else if (url.pathname === '/offline') {
+        // Prefer a fresh page, fall back to the cached shell without a connection
+        event.respondWith(fetch(event.request)
+            .then(resp => {
+                if (resp.ok && !resp.redirected) {
+                    const copy = resp.clone();
+                    caches.open(CACHE_NAME).then(cache => cache.put('/offline', copy));
+                }
+                return resp;
+            })
+            .catch(() => caches.match('/offline')));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === 'sync-annotations') {
+        event.waitUntil(OfflineDB.syncPending().then(() => self.clients.matchAll())
+            .then(clients => clients.forEach(client => client.postMessage('annotations-synced'))));
+    }
+});
@@ -0,0 +1,61 @@
+// Sampling option of the upload form: once a CSV file is chosen, offers its
+// columns to balance the sample across, with the app's default columns
+// ticked when the file has them.
+const config = JSON.parse(document.getElementById('upload-config').textContent);
+const fileInput = document.querySelector("input[name='file']");
+const strataInput = document.querySelector("input[name='sample_strata']");
+const columnsElement = document.getElementById('strataColumns');
+
+function escapeHtml(text) {
+    return String(text ?? '').replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'})[c]);
+}
+
+function headerColumns(text) {
+    // Column names from the first record of a CSV file, which may be quoted
+    // and contain commas, doubled quotes or line breaks
+    const columns = [];
+    let field = '', quoted = false;
+    for (let i = text.charCodeAt(0) === 0xFEFF ? 1 : 0; i < text.length; i++) {
+        const c = text[i];
+        if (quoted) {
+            if (c === '"' && text[i + 1] === '"') { field += '"'; i++; }
+            else if (c === '"') quoted = false;
+            else field += c;
+        } else if (c === '"') {
+            quoted = true;
+        } else if (c === ',') {
+            columns.push(field); field = '';
+        } else if (c === '\n' || c === '\r') {
+            break;
+        } else {
+            field += c;
+        }
+    }
+    columns.push(field);
+    return columns.map(name => name.trim()).filter(name => name);
+}
+
+function selectedColumns() {
+    return [...columnsElement.querySelectorAll('input:checked')].map(box => box.value);
+}
+
+function showColumns(columns) {
+    const defaults = new Set(config.strata);
+    columnsElement.innerHTML = columns.map(name => `<label class='flex items-center gap-1'>
+        <input type='checkbox' class='h-4 w-4' value="${escapeHtml(name)}"${defaults.has(name) ? ' checked' : ''}>
+        <span>${escapeHtml(name)}</span></label>`).join('');
+    strataInput.value = selectedColumns().join(', ');
+}
+
+columnsElement.addEventListener('change', () => {
+    strataInput.value = selectedColumns().join(', ');
+});
+
+fileInput.addEventListener('change', async () => {
+    columnsElement.innerHTML = '';
+    strataInput.value = '';
+    const file = fileInput.files[0];
+    // Parquet headers cannot be read here; columns are typed in instead
+    if (!file || !file.name.toLowerCase().endsWith('.csv')) return;
+    showColumns(headerColumns(await file.slice(0, 256 * 1024).text()));
+});
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Minimal stand-in for an OpenAI-compatible chat completion endpoint.
+# Answers are deterministic for a given request, so runs against the stub are
+# reproducible. Set STUB_FAIL_RATE (0-1) to make a fraction of requests fail
+# with 503 and STUB_LATENCY (seconds) to simulate a slow backend.
+#
+# Requests with response_format {"type": "json_object"} (the LLM judge) get
+# a JSON object filling in the template on the last line of the system
+# prompt: one value picked from each list, and a number for other keys.
+#
+#   uvicorn stub_llm_server:app --port 8001
+
+app = FastAPI()
+
+FAIL_RATE = float(os.environ.get('STUB_FAIL_RATE', '0'))
+LATENCY = float(os.environ.get('STUB_LATENCY', '0'))
+
+
+def make_answer(system_prompt, user_message):
+    # Builds a short Markdown answer that mentions the prompt it was given.
+    digest = hashlib.sha256(f'{system_prompt}\n{user_message}'.encode('utf-8')).hexdigest()
+    persona = system_prompt.strip().splitlines()[0] if system_prompt.strip() else 'No system prompt.'
+    return (
+        f"**Stub answer {digest[:8]}**\n\n"
+        f"You asked: {user_message.strip()[:200]}\n\n"
+        f"- Persona: {persona[:120]}\n"
+        f"- Suggestion: try a short group activity.\n\n"
+        f"Would you like more ideas?"
+    )
+
+
+def make_judgement(system_prompt, user_message):
+    # Deterministic JSON reply following the template in the system prompt.
+    digest = hashlib.sha256(f'{system_prompt}\n{user_message}'.encode('utf-8')).digest()
+    try:
+        template = json.loads(system_prompt.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        template = {}
+    reply = {}
+    for i, (key, value) in enumerate(template.items()):
+        byte = digest[i % len(digest)]
+        reply[key] = value[byte % len(value)] if isinstance(value, list) and value else round(0.5 + byte / 510, 2)
+    return json.dumps(reply)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    if FAIL_RATE and random.random() < FAIL_RATE:
+        return JSONResponse({'error': {'message': 'Simulated overload'}}, status_code=503)
+
+    messages = body.get('messages', [])
+    system_prompt = next((m['content'] for m in messages if m.get('role') == 'system'), '')
+    user_message = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+    if (body.get('response_format') or {}).get('type') == 'json_object':
+        content = make_judgement(system_prompt, user_message)
+    else:
+        content = make_answer(system_prompt, user_message)
+    return {
+        'id': f'stub-{int(time.time() * 1000)}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'stub'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+    }
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=8001)
@@ -0,0 +1,10 @@
+/** @type {import('tailwindcss').Config} */
+module.exports = {
+  // Classes are written inline in the HTML templates of the Python modules
+  // and toggled from the scripts in static/.
+  content: ['./*.py', './static/*.js'],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+}
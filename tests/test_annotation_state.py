@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import annotation_state
+from annotation_state import apply_annotation, changes_since, checkpoint_token, reset_items
+from jobs import delta_export
+from rubrics import PAIRS_PAGE_CONFIG
+
+KEY = PAIRS_PAGE_CONFIG['choices'][0]['key']
+
+
+def make_state(n):
+    state = {}
+    rows = [{'UserQuestion': f'question {i}'} for i in range(n)]
+    reset_items(state, rows, PAIRS_PAGE_CONFIG, annotation_status=lambda ann: 'completed' if ann else None)
+    state['columns'] = ['UserQuestion']
+    return state
+
+
+def annotate(state, indices):
+    for idx in indices:
+        assert apply_annotation(state, idx, {KEY: 'LLM_1'})[0] == 'ok'
+
+
+def test_changes_since_a_checkpoint():
+    state = make_state(10)
+    annotate(state, [3, 1])
+    token = checkpoint_token(state)
+    annotate(state, [5, 1, 5])
+    changed, new_token = changes_since(state, token)
+    assert changed == [1, 5]
+    assert changes_since(state, new_token) == ([], new_token)
+    assert changes_since(state)[0] == [1, 3, 5]
+
+
+def test_change_log_is_bounded_and_old_checkpoints_expire(monkeypatch):
+    monkeypatch.setattr(annotation_state, 'CHANGE_LOG_LIMIT', 8)
+    state = make_state(10)
+    old_token = checkpoint_token(state)
+    annotate(state, [0, 1, 2, 3, 4, 5])
+    recent_token = checkpoint_token(state)
+    annotate(state, [6, 7, 8, 9])
+    assert len(state['change_log']) <= 8
+
+    for token in (old_token, None):
+        with pytest.raises(ValueError, match='expired; make a full export'):
+            changes_since(state, token)
+    # Checkpoints the log still reaches keep working, with absolute positions
+    changed, token = changes_since(state, recent_token)
+    assert changed == [6, 7, 8, 9]
+    assert token == f"{state['dataset_id']}-10"
+
+    # A full save gives a checkpoint that deltas default to again
+    state['last_save_checkpoint'] = old_token
+    with pytest.raises(ValueError, match='expired'):
+        delta_export(state, [KEY], ['UserQuestion'])
+    state['last_save_checkpoint'] = checkpoint_token(state)
+    annotate(state, [2])
+    path, count, _ = delta_export(state, [KEY], ['UserQuestion'])
+    os.remove(path)
+    assert count == 1
@@ -0,0 +1,104 @@
+import asyncio
+import csv
+
+import httpx
+
+import generate_pairs
+import stub_llm_server
+from llm_client import LLMClient
+
+
+class FlakyTransport(httpx.AsyncBaseTransport):
+    # Answers the first `failures` requests with 503, then passes requests on
+    # to the stub server.
+    def __init__(self, failures=0):
+        self.stub = httpx.ASGITransport(app=stub_llm_server.app)
+        self.failures = failures
+        self.requests = 0
+
+    async def handle_async_request(self, request):
+        self.requests += 1
+        if self.requests <= self.failures:
+            return httpx.Response(503, json={'error': {'message': 'Overloaded'}})
+        return await self.stub.handle_async_request(request)
+
+
+def write_inputs(tmp_path):
+    prompts_dir = tmp_path / 'prompts'
+    prompts_dir.mkdir()
+    for variant in ('usa_p1', 'usa_p2', 'ghana_p1'):
+        (prompts_dir / f'{variant}.txt').write_text(f'You are assistant {variant}.\nBe brief.', encoding='utf-8')
+    queries = tmp_path / 'queries.csv'
+    with open(queries, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['QueryID', 'UniqueUserReference', 'UserQuestion'])
+        writer.writerows([[1, 'u1', 'How do I teach fractions?'], [2, 'u2', ''], [3, 'u3', 'Ideas for a "quiet" class,\nplease']])
+    return prompts_dir, queries
+
+
+def run_generate(tmp_path, transport, max_retries=5):
+    prompts_dir, queries = write_inputs(tmp_path)
+    prompts = generate_pairs.load_prompts(str(prompts_dir))
+    pairs = generate_pairs.default_pairs(list(prompts))
+
+    async def run():
+        async with LLMClient('http://stub/v1', 'stub', max_retries=max_retries, cache_dir=str(tmp_path / 'cache')) as client:
+            await client.http.aclose()
+            client.http = httpx.AsyncClient(transport=transport)
+            written, failed = await generate_pairs.generate(client, prompts, pairs, generate_pairs.iter_queries(queries),
+                                                            str(tmp_path / 'out'))
+            return written, failed, client.stats
+    return pairs, asyncio.run(run())
+
+
+def read_csv(path):
+    # Rows are written as their answers arrive, so in no fixed order
+    with open(path, newline='', encoding='utf-8') as f:
+        return sorted(csv.DictReader(f), key=lambda row: row['QueryID'])
+
+
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(LLMClient, '_backoff', staticmethod(lambda attempt, retry_after=None: 0))
+
+
+def test_writes_one_row_per_question_to_each_pair_file(tmp_path):
+    pairs, (written, failed, stats) = run_generate(tmp_path, FlakyTransport())
+    assert pairs == [('usa_p1', 'usa_p2')]
+    assert (written, failed) == (2, 0)
+    assert stats == {'cached': 0, 'requested': 4, 'retries': 0}
+    rows = read_csv(tmp_path / 'out' / 'pairs_usa_p1__usa_p2.csv')
+    assert list(rows[0]) == generate_pairs.PAIR_COLUMNS
+    assert sorted(row['QueryID'] for row in rows) == ['1', '3']
+    for row in rows:
+        assert (row['Variant1'], row['Variant2'], row['AssignedCountry']) == ('usa_p1', 'usa_p2', 'usa')
+        assert row['UserQuestion'] in row['ModelAnswer1'] and row['ModelAnswer1'] != row['ModelAnswer2']
+
+
+def test_rerun_is_served_from_the_cache(tmp_path):
+    run_generate(tmp_path, FlakyTransport())
+    first = read_csv(tmp_path / 'out' / 'pairs_usa_p1__usa_p2.csv')
+    (tmp_path / 'prompts').rename(tmp_path / 'prompts_old')
+    (tmp_path / 'queries.csv').unlink()
+    transport = FlakyTransport()
+    _, (written, failed, stats) = run_generate(tmp_path, transport)
+    assert transport.requests == 0
+    assert stats == {'cached': 4, 'requested': 0, 'retries': 0}
+    assert read_csv(tmp_path / 'out' / 'pairs_usa_p1__usa_p2.csv') == first
+
+
+def test_failed_responses_are_retried(tmp_path, monkeypatch):
+    no_backoff(monkeypatch)
+    transport = FlakyTransport(failures=3)
+    _, (written, failed, stats) = run_generate(tmp_path, transport)
+    assert (written, failed) == (2, 0)
+    assert stats['retries'] == 3 and stats['requested'] == 4
+    assert transport.requests == 7
+
+
+def test_questions_whose_requests_keep_failing_are_left_out(tmp_path, monkeypatch):
+    no_backoff(monkeypatch)
+    monkeypatch.setattr(stub_llm_server, 'FAIL_RATE', 1.0)
+    _, (written, failed, stats) = run_generate(tmp_path, FlakyTransport(), max_retries=2)
+    assert (written, failed) == (0, 2)
+    assert stats['retries'] == 4 * 2
+    assert read_csv(tmp_path / 'out' / 'pairs_usa_p1__usa_p2.csv') == []
@@ -0,0 +1,152 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import judge
+import stub_llm_server
+from annotation_state import apply_annotation, navigate, reset_items
+from llm_client import LLMClient
+from rubrics import PAIRS_PAGE_CONFIG
+
+
+class StubTransport(httpx.AsyncBaseTransport):
+    # Passes requests on to the stub server, except that questions containing
+    # one of `garbled` get a reply that is not JSON.
+    def __init__(self, garbled=()):
+        self.stub = httpx.ASGITransport(app=stub_llm_server.app)
+        self.garbled = garbled
+        self.questions = []
+
+    async def handle_async_request(self, request):
+        user_message = json.loads(request.content)['messages'][-1]['content']
+        self.questions.append(user_message.split('\n')[1])
+        if any(word in user_message for word in self.garbled):
+            content = 'I would rather not answer in JSON.'
+            return httpx.Response(200, json={'choices': [{'message': {'role': 'assistant', 'content': content}}]})
+        return await self.stub.handle_async_request(request)
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    transport = StubTransport()
+
+    def make_client():
+        client = LLMClient('http://stub/v1', 'stub')
+        client.http = httpx.AsyncClient(transport=transport)
+        return client
+    monkeypatch.setattr(judge, 'make_client', make_client)
+    return transport
+
+
+def write_rows(path, n):
+    lines = ['UserQuestion,ModelAnswer1,ModelAnswer2'] + [f'question {i},first answer {i},second answer {i}' for i in range(n)]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_main_resumes_after_the_rows_already_judged(tmp_path, transport):
+    source, out = tmp_path / 'rows.csv', tmp_path / 'judgements.jsonl'
+    write_rows(source, 5)
+    transport.garbled = ('question 3',)
+    assert judge.main([str(source), '-o', str(out)]) == 0
+    records = read_output(out)
+    assert sorted(r['index'] for r in records) == [0, 1, 2, 3, 4]
+    assert [r['judgement'] for r in records if r['index'] == 3] == [None]
+
+    # Only the row whose reply could not be read is sent again
+    transport.garbled, transport.questions = (), []
+    assert judge.main([str(source), '-o', str(out)]) == 0
+    assert transport.questions == ['question 3']
+    latest = {r['index']: r['judgement'] for r in read_output(out)}
+    assert all(latest[idx] is not None for idx in range(5))
+
+
+def test_main_resumes_after_a_cut_off_line(tmp_path, transport):
+    source, out = tmp_path / 'rows.csv', tmp_path / 'judgements.jsonl'
+    write_rows(source, 3)
+    judge.main([str(source), '-o', str(out)])
+    lines = out.read_text(encoding='utf-8').splitlines()
+    cut = next(line for line in lines if json.loads(line)['index'] == 2)
+    out.write_text(''.join(line + '\n' for line in lines if line != cut) + cut[:20], encoding='utf-8')
+
+    transport.questions = []
+    assert judge.main([str(source), '-o', str(out)]) == 0
+    assert transport.questions == ['question 2']
+    # The new record starts on a line of its own, after the cut-off one
+    lines = out.read_text(encoding='utf-8').splitlines()
+    assert lines[-2] == cut[:20]
+    record = json.loads(lines[-1])
+    assert record['index'] == 2 and record['judgement'] is not None
+
+
+class Job:
+    def __init__(self):
+        self.progress = {}
+
+
+def annotation_status(ann):
+    return 'completed' if ann else None
+
+
+def make_state(n):
+    state = {}
+    rows = [{'UserQuestion': f'question {i}', 'ModelAnswer1': f'first answer {i}', 'ModelAnswer2': f'second answer {i}'}
+            for i in range(n)]
+    reset_items(state, rows, PAIRS_PAGE_CONFIG, annotation_status=annotation_status)
+    return state
+
+
+def test_judge_rows_records_unparseable_replies_as_none(transport):
+    transport.garbled = ('question 1',)
+    results = {}
+
+    async def run():
+        async with judge.make_client() as client:
+            rows = [(idx, {'UserQuestion': f'question {idx}'}) for idx in range(4)]
+            await judge.judge_rows(client, rows, PAIRS_PAGE_CONFIG, results.__setitem__, concurrency=2)
+    asyncio.run(run())
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[1] is None
+    keys = [choice['key'] for choice in PAIRS_PAGE_CONFIG['choices']]
+    for idx in (0, 2, 3):
+        assert sorted(results[idx]['choices']) == sorted(keys)
+        assert 0 <= results[idx]['confidence'] <= 1
+
+
+def test_judge_job_retries_only_failed_rows(transport):
+    state = make_state(6)
+    transport.garbled = ('question 4',)
+    job = Job()
+    assert judge.judge_job(job, state, PAIRS_PAGE_CONFIG) == {'redirect': '/annotate'}
+    assert job.progress == {'rows': 6, 'total_rows': 6, 'failed': 1}
+    assert state['suggestions'][4] is None
+
+    transport.garbled, transport.questions = (), []
+    job = Job()
+    judge.judge_job(job, state, PAIRS_PAGE_CONFIG)
+    assert transport.questions == ['question 4']
+    assert job.progress == {'rows': 1, 'total_rows': 1, 'failed': 0}
+    assert all(suggestion is not None for suggestion in state['suggestions'])
+
+
+def test_judge_job_orders_the_queue_by_confidence(transport):
+    state = make_state(8)
+    transport.garbled = ('question 6',)
+    annotation = {PAIRS_PAGE_CONFIG['choices'][0]['key']: 'LLM_1'}
+    assert apply_annotation(state, 2, annotation)[0] == 'ok'
+    judge.judge_job(Job(), state, PAIRS_PAGE_CONFIG, order_by_confidence=True)
+
+    queue = state['queue']
+    assert sorted(queue) == list(range(8))
+    # Unannotated rows first, the one the judge could not rate leading,
+    # then the least confident; annotated rows last
+    assert queue[0] == 6 and queue[-1] == 2
+    confidences = [state['suggestions'][idx]['confidence'] for idx in queue[1:-1]]
+    assert confidences == sorted(confidences)
+    assert state['current_index'] == 6
+    assert navigate(state, 'next') == queue[1]
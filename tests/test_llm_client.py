@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+from llm_client import RateLimiter
+
+
+def test_rate_limiter_below_one_request_per_second():
+    limiter = RateLimiter(0.5)
+
+    async def two_requests():
+        await asyncio.wait_for(limiter.acquire(), 1)
+        started = time.monotonic()
+        await asyncio.wait_for(limiter.acquire(), 5)
+        return time.monotonic() - started
+
+    # The first request goes through at once, the second after 1 / rate seconds
+    assert 1.8 < asyncio.run(two_requests()) < 3
+
+
+def test_rate_limiter_allows_a_burst_up_to_the_rate():
+    limiter = RateLimiter(10)
+
+    async def burst():
+        started = time.monotonic()
+        for _ in range(10):
+            await limiter.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(burst()) < 0.5
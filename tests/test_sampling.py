@@ -0,0 +1,62 @@
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from sampling import allocate, balanced_limit, row_priorities, stratified_sample
+
+
+def make_rows(n, seed):
+    # Strata of very different sizes, some of which only appear late
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        country = rng.choices(['usa', 'ghana', 'india', 'kenya'], weights=[60, 25, 10, 5])[0]
+        if i > n * 3 // 4 and rng.random() < 0.2:
+            country = 'late'
+        rows.append({'id': str(i), 'country': country, 'variant': rng.choice(['p1', 'p2'])})
+    return rows
+
+
+def chunked(rows, size):
+    for start in range(0, len(rows), size):
+        yield ['id', 'country', 'variant'], rows[start:start + size]
+
+
+def reference_sample(rows, sample_size, strata, seed, allocation):
+    # Whole file in memory: each stratum's quota of lowest-priority rows
+    priorities = row_priorities(np.arange(len(rows)), seed).tolist()
+    keys = [tuple(row[col] for col in strata) for row in rows]
+    quota = allocate(Counter(keys), sample_size, allocation)
+    by_priority = sorted(range(len(rows)), key=lambda i: priorities[i])
+    picked, taken = [], Counter()
+    for i in by_priority:
+        if taken[keys[i]] < quota[keys[i]]:
+            taken[keys[i]] += 1
+            picked.append(i)
+    return [rows[i] for i in sorted(picked)]
+
+
+@pytest.mark.parametrize('allocation', ['balanced', 'proportional'])
+@pytest.mark.parametrize('strata', [(), ('country',), ('country', 'variant')])
+def test_matches_sampling_the_whole_file(allocation, strata):
+    rows = make_rows(3000, seed=1)
+    for sample_size, chunk_size in [(40, 97), (500, 250), (2999, 1000)]:
+        _, sample, summary = stratified_sample(chunked(rows, chunk_size), sample_size, strata, seed=3, allocation=allocation)
+        assert sample == reference_sample(rows, sample_size, strata, 3, allocation)
+        assert sum(sampled for _, sampled in summary.values()) == min(sample_size, len(rows))
+
+
+def test_balanced_limit_bounds_every_later_share():
+    rng = random.Random(5)
+    for _ in range(200):
+        sample_size = rng.randint(1, 60)
+        population = Counter()
+        limits = []
+        for _ in range(rng.randint(1, 30)):
+            population[rng.randint(0, 8)] += rng.randint(1, 20)
+            limits.append(balanced_limit(population, sample_size))
+        final = max(allocate(population, sample_size).values())
+        assert all(final <= limit for limit in limits)
+        assert limits == sorted(limits, reverse=True)
@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use, so that starting either app stays fast
+HEAVY_MODULES = ('pandas', 'numpy', 'httpx', 'pyarrow')
+
+
+def test_apps_import_without_heavy_modules(tmp_path):
+    code = ('import sys, main_pairs, main_single\n'
+            f'print(",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules))')
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
+    # Importing does not create the data folders or start any work
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,257 @@
+import argparse
+import math
+import sys
+from itertools import repeat
+from operator import itemgetter
+
+from dataset_io import DatasetError, iter_chunks, write_records
+from rubrics import PAIRWISE_CRITERIA
+
+# Ranks models and prompt variants across any number of pairwise exports of
+# main_pairs.py, with a Bradley-Terry model fitted per criterion.
+#
+#   python tournament.py campaign1.csv campaign2.csv -o rankings.csv
+#   python tournament.py usa_p1:ghana_p1=old_export.csv campaign2.csv --bootstrap 500
+#
+# The model shown on each side is read from the Variant1/Variant2 columns
+# (written by build_pairs.py and generate_pairs.py), or given for a whole
+# file as VARIANT1:VARIANT2=PATH. For each criterion, "LLM_1" is a win for
+# the first model, "LLM_2" a win for the second and "NO_PREF" half a win for
+# each; rows without a winner are left out.
+#
+# Comparisons are only kept as counts per pair of models and outcome, a
+# sparse matrix with one entry per pair that was actually compared, so the
+# fit costs the same for a thousand or ten million rows. Log-strengths are
+# fitted by Newton's method: gradient and Hessian are accumulated from the
+# pairs with np.bincount and the step is one dense solve over the models.
+# The usual minorization-maximization iteration crawls on sparse comparison
+# graphs (a chain of prompt variants compared to their neighbours only),
+# while Newton's method converges in a few steps. Every model also plays
+# PRIOR_GAMES virtual games against a reference model, so that a model that
+# never lost still gets a finite score. Scores are given on the Elo scale.
+#
+# Rank intervals come from a bootstrap over comparisons: each replicate
+# draws the per-pair outcome counts from a multinomial and is fitted from
+# the point estimate, as many replicates at a time as fit in
+# BOOTSTRAP_BLOCK_CELLS Hessian entries, with one batched solve per step.
+
+PRIOR_GAMES = 1.0
+ELO_BASE = 1000
+ELO_SCALE = 400 / math.log(10)
+BOOTSTRAP_ROUNDS = 200
+CONFIDENCE = 0.95
+TOLERANCE = 1e-8
+BOOTSTRAP_TOLERANCE = 1e-6
+MAX_ITERATIONS = 100
+MAX_STEP = 2.0
+# Bound on the Hessian entries of the replicates fitted together
+BOOTSTRAP_BLOCK_CELLS = 2 ** 23
+
+# Winner values, as outcome codes: the first model wins, tie, the second wins
+OUTCOMES = {'LLM_1': 0, 'NO_PREF': 1, 'LLM_2': 2}
+
+
+def parse_source(value):
+    # Accepts PATH, or VARIANT1:VARIANT2=PATH for a file without the variant
+    # columns. Returns (path, (variant1, variant2) or None).
+    sides, sep, path = value.partition('=')
+    if not sep:
+        return value, None
+    left, colon, right = sides.partition(':')
+    if not colon or not left or not right:
+        raise argparse.ArgumentTypeError(f'Expected VARIANT1:VARIANT2=PATH, got {value!r}')
+    return path, (left, right)
+
+
+def model_codes(names, models):
+    # Code of each model name, adding new names to the models dict; empty
+    # names get -1.
+    import numpy as np
+    unique, inverse = np.unique(np.asarray(names, dtype=str), return_inverse=True)
+    codes = np.array([models.setdefault(name, len(models)) if name else -1 for name in unique.tolist()], dtype=np.int64)
+    return codes[inverse]
+
+
+def load_comparisons(sources, criteria_keys, left_col='Variant1', right_col='Variant2'):
+    # Reads (path, sides) sources. Returns (model names, first model codes,
+    # second model codes, {criterion key: outcome codes, -1 where missing},
+    # number of rows without two different models).
+    import numpy as np
+    models = {}
+    lefts, rights = [], []
+    outcomes = {key: [] for key in criteria_keys}
+    dropped = 0
+    for path, sides in sources:
+        for columns, rows in iter_chunks(path):
+            if sides is None and (left_col not in columns or right_col not in columns):
+                raise DatasetError(f'{path} has no {left_col}/{right_col} columns; give the models as VARIANT1:VARIANT2={path}.')
+            missing = [f'{key}_winner' for key in criteria_keys if f'{key}_winner' not in columns]
+            if missing:
+                raise DatasetError(f'{path} is not a pairwise export: missing {", ".join(missing)}.')
+            if sides is None:
+                left, right = (model_codes(list(map(itemgetter(col), rows)), models) for col in (left_col, right_col))
+            else:
+                left, right = (np.full(len(rows), model_codes([name], models)[0]) for name in sides)
+            keep = (left >= 0) & (right >= 0) & (left != right)
+            dropped += int((~keep).sum())
+            lefts.append(left[keep])
+            rights.append(right[keep])
+            for key in criteria_keys:
+                values = map(itemgetter(f'{key}_winner'), rows)
+                codes = np.fromiter(map(OUTCOMES.get, values, repeat(-1)), dtype=np.int8, count=len(rows))
+                outcomes[key].append(codes[keep])
+    join = lambda parts, dtype: np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+    return (list(models), join(lefts, np.int64), join(rights, np.int64),
+            {key: join(parts, np.int8) for key, parts in outcomes.items()}, dropped)
+
+
+def comparison_cells(left, right, outcome, n_models):
+    # Counts the comparisons with an outcome per pair of models. Returns
+    # (first model of each pair, second model, counts of shape (pairs, 3)
+    # for a win of the first model, a tie and a win of the second), pairs
+    # being ordered so that the first model has the lower code.
+    import numpy as np
+    mask = outcome >= 0
+    left, right, outcome = left[mask], right[mask], outcome[mask].astype(np.int64)
+    flip = left > right
+    low, high = np.where(flip, right, left), np.where(flip, left, right)
+    outcome = np.where(flip, 2 - outcome, outcome)
+    pair_ids, pair_of = np.unique(low * n_models + high, return_inverse=True)
+    counts = np.bincount(pair_of * 3 + outcome, minlength=3 * len(pair_ids)).reshape(-1, 3)
+    return pair_ids // n_models, pair_ids % n_models, counts
+
+
+def fit_bradley_terry(first, second, wins, games, n_models, start=None, prior=PRIOR_GAMES, tol=TOLERANCE,
+                      max_iter=MAX_ITERATIONS):
+    # Log-strengths of shape (fits, n_models) for independent fits sharing
+    # the same pairs: wins (of first over second) and games have shape
+    # (fits, pairs). Every model also plays prior wins and prior losses
+    # against a reference of log-strength 0, which fixes the scale.
+    import numpy as np
+    wins, games = np.atleast_2d(wins).astype(float), np.atleast_2d(games).astype(float)
+    n_fits = len(wins)
+    fits = np.arange(n_fits)[:, None]
+    # Positions of each pair in the flattened gradients and Hessians
+    first_at, second_at = fits * n_models + first, fits * n_models + second
+    square = fits * n_models * n_models
+    hessian_at = np.concatenate([(square + first * n_models + first).ravel(), (square + second * n_models + second).ravel(),
+                                 (square + first * n_models + second).ravel(), (square + second * n_models + first).ravel()])
+    diagonal = np.arange(n_models)
+    scores = np.zeros((n_fits, n_models)) if start is None else np.tile(start, (n_fits, 1))
+    for _ in range(max_iter):
+        p_first = 1 / (1 + np.exp(scores.ravel()[second_at] - scores.ravel()[first_at]))
+        surplus = (wins - games * p_first).ravel()
+        gradient = (np.bincount(first_at.ravel(), surplus, n_fits * n_models)
+                    - np.bincount(second_at.ravel(), surplus, n_fits * n_models)).reshape(n_fits, n_models)
+        gradient -= prior * np.tanh(scores / 2)
+        weight = (games * p_first * (1 - p_first)).ravel()
+        hessian = np.bincount(hessian_at, np.concatenate([weight, weight, -weight, -weight]),
+                              n_fits * n_models * n_models).reshape(n_fits, n_models, n_models)
+        p_reference = 1 / (1 + np.exp(-scores))
+        hessian[:, diagonal, diagonal] += 2 * prior * p_reference * (1 - p_reference)
+        step = np.linalg.solve(hessian, gradient[..., None])[..., 0]
+        # Damped so that a poor starting point cannot overshoot
+        largest = np.abs(step).max(axis=1, keepdims=True)
+        scores += step / np.maximum(1, largest / MAX_STEP)
+        if largest.max() < tol:
+            break
+    return scores
+
+
+def ranks_of(scores):
+    # Rank of each model in each row of scores, 1 for the highest score.
+    import numpy as np
+    return np.argsort(np.argsort(-scores, axis=-1), axis=-1) + 1
+
+
+def rank_criterion(first, second, counts, n_models, rounds=BOOTSTRAP_ROUNDS, confidence=CONFIDENCE, seed=0):
+    # Point estimate and bootstrap intervals for one criterion. Returns a
+    # dict of per-model arrays; models without any comparison have 0 games.
+    import numpy as np
+    wins, games = counts[:, 0] + 0.5 * counts[:, 1], counts.sum(axis=1)
+    scores = fit_bradley_terry(first, second, wins, games, n_models)[0]
+    played = np.bincount(first, games, n_models) + np.bincount(second, games, n_models)
+    won = np.bincount(first, wins, n_models) + np.bincount(second, games - wins, n_models)
+    # Models left out of this criterion are ranked last
+    unplayed = played == 0
+    result = {'score': scores, 'rank': ranks_of(np.where(unplayed, -np.inf, scores)[None])[0], 'games': played, 'wins': won}
+    if rounds:
+        rng = np.random.default_rng(seed)
+        cells = counts.ravel()
+        samples = []
+        block = max(1, BOOTSTRAP_BLOCK_CELLS // n_models ** 2)
+        for start in range(0, rounds, block):
+            drawn = rng.multinomial(cells.sum(), cells / cells.sum(), size=min(block, rounds - start))
+            drawn = drawn.reshape(len(drawn), -1, 3)
+            samples.append(fit_bradley_terry(first, second, drawn[..., 0] + 0.5 * drawn[..., 1], drawn.sum(axis=2),
+                                             n_models, start=scores, tol=BOOTSTRAP_TOLERANCE))
+        samples = np.concatenate(samples)
+        samples[:, unplayed] = -np.inf
+        tails = [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100]
+        result['score_low'], result['score_high'] = np.percentile(samples, tails, axis=0)
+        result['rank_low'], result['rank_high'] = np.percentile(ranks_of(samples), tails, axis=0, method='nearest')
+    return result
+
+
+def rank_models(models, left, right, outcomes, rounds=BOOTSTRAP_ROUNDS, confidence=CONFIDENCE, seed=0):
+    # Returns one record per criterion and compared model, best first.
+    records = []
+    for key, outcome in outcomes.items():
+        first, second, counts = comparison_cells(left, right, outcome, len(models))
+        if not len(counts):
+            continue
+        result = rank_criterion(first, second, counts, len(models), rounds, confidence, seed)
+        for m in sorted(range(len(models)), key=lambda m: -result['score'][m]):
+            if not result['games'][m]:
+                continue
+            record = {'Criterion': key, 'Model': models[m], 'Rank': int(result['rank'][m]),
+                      'Score': round(float(ELO_BASE + ELO_SCALE * result['score'][m]), 1),
+                      'Comparisons': int(result['games'][m]), 'WinRate': round(float(result['wins'][m] / result['games'][m]), 4)}
+            if rounds:
+                record.update({
+                    'ScoreLow': round(float(ELO_BASE + ELO_SCALE * result['score_low'][m]), 1),
+                    'ScoreHigh': round(float(ELO_BASE + ELO_SCALE * result['score_high'][m]), 1),
+                    'RankLow': int(result['rank_low'][m]), 'RankHigh': int(result['rank_high'][m]),
+                })
+            records.append(record)
+    return records
+
+
+def print_rankings(records, labels):
+    criterion = None
+    for record in records:
+        if record['Criterion'] != criterion:
+            criterion = record['Criterion']
+            print(f'\n{labels.get(criterion, criterion)}')
+        interval = f"  rank {record['RankLow']}-{record['RankHigh']}" if 'RankLow' in record else ''
+        print(f"{record['Rank']:>4}  {record['Model']:<30} {record['Score']:>7.1f}  "
+              f"{record['WinRate']:>6.1%} of {record['Comparisons']}{interval}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rank models across pairwise annotation exports (Bradley-Terry).')
+    parser.add_argument('sources', nargs='+', type=parse_source, help='Export CSV or Parquet file, or VARIANT1:VARIANT2=PATH')
+    parser.add_argument('-o', '--out', help='Output CSV with one line per criterion and model')
+    parser.add_argument('--left-col', default='Variant1', help='Column naming the model shown as LLM 1')
+    parser.add_argument('--right-col', default='Variant2', help='Column naming the model shown as LLM 2')
+    parser.add_argument('--bootstrap', type=int, default=BOOTSTRAP_ROUNDS, help='Bootstrap replicates, 0 for none (default: %(default)s)')
+    parser.add_argument('--confidence', type=float, default=CONFIDENCE, help='Interval coverage (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    labels = {key: label for key, label, _ in PAIRWISE_CRITERIA}
+    try:
+        models, left, right, outcomes, dropped = load_comparisons(args.sources, list(labels), args.left_col, args.right_col)
+    except DatasetError as e:
+        raise SystemExit(str(e))
+    print(f'{len(left)} comparisons of {len(models)} models' + (f' ({dropped} rows without two different models skipped)' if dropped else ''))
+    records = rank_models(models, left, right, outcomes, args.bootstrap, args.confidence, args.seed)
+    print_rankings(records, labels)
+    if args.out:
+        write_records(args.out, list(records[0]) if records else ['Criterion', 'Model'], records)
+        print(f'\nWrote {args.out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())